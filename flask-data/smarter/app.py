@@ -6,7 +6,6 @@ Created on Fri May 21 17:50:23 2021
 @author: Paolo Cozzi <paolo.cozzi@ibba.cnr.it>
 """
 
-from bson import ObjectId
 import logging
 from logging.config import dictConfig
 from logging.handlers import SMTPHandler
@@ -15,13 +14,14 @@ from decouple import config
 from flask import Flask, redirect, url_for, has_request_context, request
 from flask.logging import default_handler
 from flask_restful import Api
-from flask.json import JSONEncoder
 from flask_cors import CORS
 from flasgger import Swagger
 
 from database.db import initialize_db, DB_ALIAS
 from resources.errors import errors
 from resources.routes import initialize_routes
+from commands import initialize_commands
+from common.encoders import get_json_encoder
 
 __version__ = "0.3.0"
 
@@ -80,15 +80,6 @@ mail_handler.setFormatter(formatter)
 default_handler.setFormatter(formatter)
 
 
-class CustomJSONEncoder(JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, ObjectId):
-            return {
-                "$oid": str(obj)
-            }
-        return JSONEncoder.default(self, obj)
-
-
 # https://stackoverflow.com/a/56474420/4385116
 def create_app():
     """This function create Flask app. Is required by wsgi because it need to
@@ -112,7 +103,8 @@ def create_app():
         app.debug = True
 
     # deal with ObjectId in json responses
-    app.json_encoder = CustomJSONEncoder
+    app.json_encoder = get_json_encoder(
+        config('SMARTER_JSON_ENCODER', default='stdlib'))
 
     # Swagger stuff
     swagger_template = {
@@ -172,6 +164,9 @@ def create_app():
 
     app.logger.debug("Routes initialized")
 
+    # add management commands
+    initialize_commands(app)
+
     if not app.debug:
         app.logger.addHandler(mail_handler)
 
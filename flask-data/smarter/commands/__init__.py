@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 15:31:09 2026
+
+@author: Paolo Cozzi <bunop@libero.it>
+
+Management commands, callable with ``flask <command>`` once ``FLASK_APP``
+points to the ``wsgi`` module
+"""
+
+from .info import info_cli
+from .cache import cache_cli
+from .indexes import indexes_cli
+from .variants import variants_cli
+
+
+def initialize_commands(app):
+    app.cli.add_command(info_cli)
+    app.cli.add_command(cache_cli)
+    app.cli.add_command(indexes_cli)
+    app.cli.add_command(variants_cli)
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 10:14:52 2026
+
+@author: Paolo Cozzi <bunop@libero.it>
+
+Inspect the response cache configured with ``SMARTER_RESPONSE_CACHE``
+"""
+
+import click
+
+from flask.cli import AppGroup
+
+from common import views
+
+cache_cli = AppGroup('cache', help="Manage the response cache")
+
+
+@cache_cli.command('stats')
+def stats():
+    """Print the hits, the misses and the size of the response cache shared
+    by all the workers"""
+
+    cache = views.response_cache
+
+    if cache is None:
+        raise click.ClickException("The response cache is disabled")
+
+    if cache.name == "memory":
+        raise click.ClickException(
+            "Each worker has its own memory cache, which can't be read from "
+            "here: use the 'sqlite' or 'redis' response cache")
+
+    for key, value in cache.stats().items():
+        click.echo(f"{key}: {value}")
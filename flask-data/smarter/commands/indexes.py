@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 16:48:20 2026
+
+@author: Paolo Cozzi <bunop@libero.it>
+
+Manage the indexes declared in :py:mod:`database.models`
+"""
+
+import re
+import json
+import time
+import inspect
+
+import click
+
+from bson import json_util
+from bson.regex import Regex
+from flask.cli import AppGroup
+from pymongo.errors import OperationFailure
+
+import database.models
+
+from database.db import db
+from common.info import smarter_info
+from common.views import QUERY_LOG_PREFIX
+
+from .variants import VARIANT_MODELS
+
+indexes_cli = AppGroup('indexes', help="Manage database indexes")
+
+# query operators which select a range of values
+RANGE_OPERATORS = {
+    '$gt', '$gte', '$lt', '$lte', '$ne', '$nin', '$exists', '$regex'}
+
+# query operators which can't be used by a B-tree index
+GEO_OPERATORS = {'$geoWithin', '$geoIntersects', '$near', '$nearSphere'}
+
+
+def get_models(collection: str = None) -> list:
+    """Return all the documents declared in database.models (or the one
+    bound to collection)"""
+
+    models = []
+
+    for _, model in inspect.getmembers(database.models, inspect.isclass):
+        if (not issubclass(model, db.Document) or
+                model._meta.get('abstract') or
+                'collection' not in model._meta):
+            continue
+
+        if collection and model._meta['collection'] != collection:
+            continue
+
+        models.append(model)
+
+    if collection and not models:
+        raise click.BadParameter(f"Unknown collection '{collection}'")
+
+    return models
+
+
+def get_index_builds(model) -> list:
+    """Return the index builds in progress on a document collection"""
+
+    collection = model._get_collection()
+
+    try:
+        result = collection.database.client.admin.command({
+            "currentOp": True,
+            "command.createIndexes": collection.name
+        })
+
+    except OperationFailure as exc:
+        click.echo(f"Can't read index builds: {exc}", err=True)
+        return []
+
+    return result.get("inprog", [])
+
+
+@indexes_cli.command('list')
+@click.option('--collection', help="Report only this collection")
+def list_indexes(collection):
+    """Report existing, missing and in progress indexes"""
+
+    for model in get_models(collection):
+        click.echo(f"{model._meta['collection']}:")
+
+        for name, info in model._get_collection().index_information().items():
+            click.echo(f"  {name}: {info['key']}")
+
+        for index in model.compare_indexes()["missing"]:
+            click.echo(f"  MISSING: {index}")
+
+        for operation in get_index_builds(model):
+            click.echo(
+                f"  BUILDING: {operation['command'].get('indexes')} "
+                f"({operation.get('msg', 'started')})")
+
+
+@indexes_cli.command('create')
+@click.option('--collection', help="Create indexes only for this collection")
+def create_indexes(collection):
+    """Create the missing indexes. Indexes are built in background and
+    don't lock the collection, however this command waits until all the
+    indexes are built"""
+
+    for model in get_models(collection):
+        missing = model.compare_indexes()["missing"]
+
+        if not missing:
+            continue
+
+        click.echo(f"Creating {missing} on {model._meta['collection']}")
+        model.ensure_indexes()
+
+    click.echo("Done")
+
+
+def time_query(queryset, repeat: int) -> float:
+    """Return the best execution time of a query"""
+
+    timings = []
+
+    for i in range(repeat):
+        start = time.perf_counter()
+        list(queryset.no_cache())
+        timings.append(time.perf_counter() - start)
+
+    return min(timings)
+
+
+@indexes_cli.command('benchmark-region')
+@click.argument('species', type=click.Choice(list(VARIANT_MODELS.keys())))
+@click.argument('assembly')
+@click.argument('region')
+@click.option('--repeat', default=5, help="Repeat each query this times")
+def benchmark_region(species, assembly, region, repeat):
+    """Compare the latency of a variant region query (ex. 1:1-10000000)
+    using the chrom/position index or the assembly aware index"""
+
+    model = VARIANT_MODELS[species]
+
+    if assembly not in smarter_info.working_assemblies:
+        raise click.BadParameter(f"Unknown assembly '{assembly}'")
+
+    version, imported_from = smarter_info.working_assemblies[assembly]
+
+    chrom, interval = region.split(":")
+    start, end = [int(value) for value in interval.split("-")]
+
+    queryset = model.objects.filter(locations__match={
+        'version': version,
+        'imported_from': imported_from,
+        'chrom': chrom,
+        'position__gte': start,
+        'position__lte': end
+    }).fields(elemMatch__locations={
+        'version': version,
+        'imported_from': imported_from
+    })
+
+    hints = {
+        'planner': None,
+        'chrom_position': [
+            ("locations.chrom", 1), ("locations.position", 1)],
+        'assembly_position': "locations_assembly_position"
+    }
+
+    for label, hint in hints.items():
+        current = queryset.hint(hint) if hint else queryset
+
+        stats = current.explain()["executionStats"]
+        elapsed = time_query(current, repeat)
+
+        click.echo(
+            f"{label}: {elapsed * 1000:.1f} ms, "
+            f"{stats['nReturned']} variants, "
+            f"{stats['totalKeysExamined']} keys and "
+            f"{stats['totalDocsExamined']} documents examined")
+
+
+def get_query_shape(value):
+    """Replace the values of a query with 1, keeping fields and
+    operators"""
+
+    if isinstance(value, dict):
+        return {key: get_query_shape(val) for key, val in value.items()}
+
+    if isinstance(value, list) and value and isinstance(value[0], dict):
+        # the conditions of $or, $and and $nor
+        return [get_query_shape(item) for item in value]
+
+    return 1
+
+
+def read_queries(lines, collection: str = None) -> list:
+    """Group the queries logged by list views by shape
+
+    Args:
+        lines (Iterable[str]): the lines of the API logs
+        collection (str): read only the queries of this collection
+
+    Returns:
+        list: a dictionary for each shape, with the collection, the
+        filter, the sort and the collation of the last query having this
+        shape and the number of queries (sorted by number)
+    """
+
+    shapes = {}
+
+    for line in lines:
+        if QUERY_LOG_PREFIX not in line:
+            continue
+
+        query = json_util.loads(line.split(QUERY_LOG_PREFIX, 1)[1])
+
+        # queries logged before collations were
+        query.setdefault('collation', None)
+
+        if collection and query['collection'] != collection:
+            continue
+
+        shape = json.dumps([
+            query['collection'],
+            get_query_shape(query['filter']),
+            query['sort'],
+            query['collation']
+        ], sort_keys=True)
+
+        count = shapes.get(shape, {}).get('count', 0)
+        shapes[shape] = {**query, 'count': count + 1}
+
+    return sorted(shapes.values(), key=lambda query: -query['count'])
+
+
+def suggest_index(query: dict, sort: list) -> list:
+    """Return the index keys of a query following the Equality, Sort, Range
+    rule (conditions of $or and geospatial operators are ignored)"""
+
+    equality = []
+    ranges = []
+
+    for field, value in query.items():
+        if field.startswith('$'):
+            continue
+
+        operators = set(value) if isinstance(value, dict) else set()
+
+        if operators & GEO_OPERATORS:
+            continue
+
+        # $in selects many values: it's a range when results are sorted
+        if operators & RANGE_OPERATORS or ('$in' in operators and sort) or \
+                isinstance(value, (Regex, re.Pattern)):
+            ranges.append(field)
+
+        else:
+            equality.append(field)
+
+    keys = [(field, 1) for field in equality]
+    keys += [
+        (field, direction) for field, direction in sort
+        if field not in equality]
+    keys += [(field, 1) for field in ranges if field not in dict(keys)]
+
+    return keys
+
+
+def get_plan_stages(plan: dict) -> list:
+    """Return the (stage, index name) pairs of a query plan"""
+
+    # the slot based engine nests the plan of classic stages
+    plan = plan.get('queryPlan', plan)
+    stages = [(plan.get('stage'), plan.get('indexName'))]
+
+    if 'inputStage' in plan:
+        stages += get_plan_stages(plan['inputStage'])
+
+    for stage in plan.get('inputStages', []):
+        stages += get_plan_stages(stage)
+
+    return stages
+
+
+def explain_query(model, query: dict) -> dict:
+    """Return the winning plan of a logged query"""
+
+    cursor = model._get_collection().find(query['filter'])
+
+    if query['sort']:
+        cursor = cursor.sort([tuple(key) for key in query['sort']])
+
+    # string comparisons use an index only with the same collation
+    if query['collation']:
+        cursor = cursor.collation(query['collation'])
+
+    return cursor.explain()['queryPlanner']['winningPlan']
+
+
+def same_collation(index: dict, query: dict) -> bool:
+    """True if an index collation (as reported by the server, with all the
+    defaults) matches the collation of a query"""
+
+    index = index or {'locale': 'simple'}
+    query = query or {'locale': 'simple'}
+
+    return all(index.get(key) == value for key, value in query.items())
+
+
+def has_prefix(indexes: list, keys: list, collation: dict = None) -> bool:
+    """True if keys are the prefix of one of indexes (pairs of a list of
+    (field, direction) pairs and a collation) having the same collation"""
+
+    for index, index_collation in indexes:
+        if not same_collation(index_collation, collation):
+            continue
+
+        fields = [
+            (field, int(direction) if isinstance(direction, float)
+             else direction)
+            for field, direction in index
+        ]
+
+        if fields[:len(keys)] == keys:
+            return True
+
+    return False
+
+
+@indexes_cli.command('advise')
+@click.argument('logfiles', nargs=-1, required=True, type=click.File())
+@click.option('--collection', help="Check only the queries of a collection")
+def advise_indexes(logfiles, collection):
+    """Replay the queries of list views found in API logs (use '-' to read
+    from standard input) and report the ones scanning a whole collection or
+    sorting results in memory, with the index they need"""
+
+    models = {
+        model._meta['collection']: model for model in get_models(collection)}
+
+    queries = []
+
+    for logfile in logfiles:
+        queries += read_queries(logfile, collection)
+
+    for query in queries:
+        model = models.get(query['collection'])
+
+        if model is None:
+            continue
+
+        stages = get_plan_stages(explain_query(model, query))
+        names = [stage for stage, _ in stages]
+        problems = [
+            problem for problem, stage in [
+                ("COLLSCAN", "COLLSCAN"), ("in-memory SORT", "SORT")]
+            if stage in names
+        ]
+
+        click.echo(
+            f"{query['collection']}: {json_util.dumps(query['filter'])} "
+            f"sort {query['sort']} ({query['count']} queries)")
+
+        if query['collation']:
+            click.echo(f"  collation {json_util.dumps(query['collation'])}")
+
+        if not problems:
+            indexes = [name for _, name in stages if name]
+            click.echo(f"  OK: {', '.join(indexes)}")
+            continue
+
+        keys = suggest_index(query['filter'], query['sort'])
+        existing = [
+            (info['key'], info.get('collation'))
+            for info in model._get_collection().index_information().values()
+        ]
+        declared = [
+            (spec['fields'], spec.get('collation'))
+            for spec in model._meta['index_specs']
+        ]
+        collation = query['collation']
+
+        if collation:
+            keys_msg = f"{keys} with collation {json_util.dumps(collation)}"
+
+        else:
+            keys_msg = f"{keys}"
+
+        if not keys:
+            click.echo(f"  {', '.join(problems)}: no index can help")
+
+        elif has_prefix(existing, keys, collation):
+            click.echo(
+                f"  {', '.join(problems)}: index {keys_msg} exists but wasn't "
+                f"chosen by the query planner")
+
+        elif has_prefix(declared, keys, collation):
+            click.echo(
+                f"  {', '.join(problems)}: index {keys_msg} is declared but "
+                f"missing, run 'flask indexes create'")
+
+        else:
+            click.echo(
+                f"  {', '.join(problems)}: MISSING index {keys_msg}")
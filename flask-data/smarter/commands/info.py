@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 15:33:52 2026
+
+@author: Paolo Cozzi <bunop@libero.it>
+"""
+
+import click
+
+from flask.cli import AppGroup
+
+from common.info import smarter_info, touch_stamp
+
+info_cli = AppGroup('smarter-info', help="Manage SMARTER database status")
+
+
+@info_cli.command('show')
+def show():
+    """Print the current database status"""
+
+    info = smarter_info.refresh()
+
+    if info is None:
+        raise click.ClickException("There's no database status")
+
+    click.echo(f"version: {info.version}")
+    click.echo(f"last_updated: {info.last_updated}")
+
+    for assembly, values in info.working_assemblies.items():
+        click.echo(f"{assembly}: {values}")
+
+
+@info_cli.command('refresh')
+def refresh():
+    """Force all the workers to read again the database status (ex. after a
+    data import)"""
+
+    if not smarter_info.stamp:
+        raise click.ClickException("SMARTER_INFO_STAMP is not configured")
+
+    touch_stamp(smarter_info.stamp)
+
+    click.echo(f"Touched '{smarter_info.stamp}'")
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 18:05:37 2026
+
+@author: Paolo Cozzi <bunop@libero.it>
+
+Manage the variant derived collections
+"""
+
+import click
+
+from flask.cli import AppGroup
+
+from database.models import (
+    VariantSheep, VariantGoat, VariantSheepFlat, VariantGoatFlat,
+    FlatVariantsInfo, get_illumina_top)
+from common.info import smarter_info
+
+variants_cli = AppGroup('variants', help="Manage variant collections")
+
+# the species supported by variant endpoints
+VARIANT_MODELS = {
+    'sheep': VariantSheep,
+    'goat': VariantGoat
+}
+
+FLAT_MODELS = {
+    'sheep': VariantSheepFlat,
+    'goat': VariantGoatFlat
+}
+
+# the variant attributes copied in flat documents
+VARIANT_FIELDS = [
+    'name', 'rs_id', 'chip_name', 'probesets', 'affy_snp_id', 'sequence',
+    'cust_id'
+]
+
+# insert flat documents in batches of this size
+FLAT_BATCH_SIZE = 1000
+
+
+def get_assembly_location(variant: dict, version: str, imported_from: str):
+    """Return the first location of a raw variant on an assembly"""
+
+    for location in variant.get('locations', []):
+        if (location.get('version') == version and
+                location.get('imported_from') == imported_from):
+            return location
+
+    return None
+
+
+def iter_flat_documents(model, assemblies: dict):
+    """Yield a flat document for each variant location on a working
+    assembly"""
+
+    for variant in model.objects.as_pymongo().no_cache().batch_size(
+            FLAT_BATCH_SIZE):
+        for assembly, (version, imported_from) in assemblies.items():
+            location = get_assembly_location(variant, version, imported_from)
+
+            if location is None:
+                continue
+
+            location = dict(location)
+            illumina_top = get_illumina_top(
+                location.get('illumina'), location.get('illumina_strand'))
+            location['illumina_top'] = illumina_top
+
+            document = {
+                'variant_id': variant['_id'],
+                'assembly': assembly,
+                'chrom': location['chrom'],
+                'position': location['position'],
+                'illumina_top': illumina_top,
+                'location': location
+            }
+
+            for key in VARIANT_FIELDS:
+                if key in variant:
+                    document[key] = variant[key]
+
+            yield document
+
+
+def create_flat_indexes(flat_model, collection):
+    """Create the indexes declared by a flat model on a collection (ex. the
+    temporary one, before it replaces the flat collection)"""
+
+    for spec in flat_model._meta['index_specs']:
+        options = dict(spec)
+        fields = options.pop('fields')
+
+        collection.create_index(fields, **options)
+
+
+def rebuild_flat(model, flat_model) -> int:
+    """Fill a temporary collection with flat documents and index it, then
+    replace the flat collection with it. Flat documents remain readable (and
+    indexed) while rebuilding. Record the data import they were derived
+    from"""
+
+    info = smarter_info.refresh()
+
+    if info is None:
+        raise click.ClickException("There's no database status")
+
+    assemblies = info.working_assemblies
+
+    collection = flat_model._get_collection()
+    tmp = collection.database[f"{collection.name}_tmp"]
+    tmp.drop()
+
+    count = 0
+    batch = []
+
+    for document in iter_flat_documents(model, assemblies):
+        batch.append(document)
+
+        if len(batch) >= FLAT_BATCH_SIZE:
+            tmp.insert_many(batch, ordered=False)
+            count += len(batch)
+            batch = []
+
+    if batch:
+        tmp.insert_many(batch, ordered=False)
+        count += len(batch)
+
+    if count > 0:
+        # indexes are faster to build after inserting documents. Build them
+        # before renaming, or queries would scan the new flat collection
+        create_flat_indexes(flat_model, tmp)
+        tmp.rename(collection.name, dropTarget=True)
+
+    else:
+        collection.drop()
+        flat_model.ensure_indexes()
+
+    FlatVariantsInfo(
+        id=collection.name, last_updated=info.last_updated).save()
+
+    return count
+
+
+@variants_cli.command('rebuild-flat')
+@click.option(
+    '--species',
+    type=click.Choice(list(VARIANT_MODELS.keys())),
+    help="Rebuild only the collection of this species")
+def rebuild_flat_command(species):
+    """Derive the flat variant collections (one document per variant and
+    assembly) from variants. Need to be called after each data import"""
+
+    for key in VARIANT_MODELS.keys():
+        if species and key != species:
+            continue
+
+        count = rebuild_flat(VARIANT_MODELS[key], FLAT_MODELS[key])
+
+        click.echo(
+            f"Wrote {count} documents in "
+            f"{FLAT_MODELS[key]._meta['collection']}")
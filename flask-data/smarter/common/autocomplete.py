@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 22:20:33 2026
+
+@author: Paolo Cozzi <bunop@libero.it>
+
+An in-memory index of breed names, codes and aliases used to suggest breeds
+while typing. Breeds are few and change only after a data import, so the
+index is built once per data version and searched without querying the
+database
+"""
+
+import re
+import bisect
+import logging
+import threading
+import unicodedata
+
+# Get an instance of a logger
+logger = logging.getLogger(__name__)
+
+# the minimum trigram similarity of a fuzzy match
+FUZZY_THRESHOLD = 0.3
+
+# scores of the different matches (lower is better)
+EXACT_MATCH = 0
+PREFIX_MATCH = 1
+WORD_MATCH = 2
+ALIAS_MATCH = 3
+FUZZY_MATCH = 4
+
+
+def normalize(text: str) -> str:
+    """Lowercase a text, remove accents and punctuation"""
+
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(char for char in text if not unicodedata.combining(char))
+
+    return " ".join(re.split(r"[\W_]+", text.lower())).strip()
+
+
+def get_trigrams(text: str) -> set:
+    """Return the trigrams of a normalized text"""
+
+    text = f"  {text} "
+
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class BreedIndex():
+    """Suggest breeds by name, code or alias prefix or by similar names"""
+
+    def __init__(self):
+        self.version = None
+
+        # breeds, sorted terms and the trigram index are replaced together
+        self._data = ([], [], {})
+        self._lock = threading.Lock()
+        self._built = False
+
+    def clear(self):
+        with self._lock:
+            self._built = False
+            self.version = None
+
+    def build(self, breeds, version=None):
+        """Index breeds
+
+        Args:
+            breeds (Iterable[dict]): raw breeds (as returned by
+                ``as_pymongo()``)
+            version (object): the data version of breeds
+        """
+
+        entries = []
+        terms = []
+        trigrams = {}
+
+        def add_term(text, breed_idx, score, fuzzy=True):
+            term = normalize(text or "")
+
+            if not term:
+                return
+
+            terms.append((term, breed_idx, score, text))
+
+            if fuzzy:
+                for trigram in get_trigrams(term):
+                    trigrams.setdefault(trigram, set()).add(len(terms) - 1)
+
+        for breed in breeds:
+            breed_idx = len(entries)
+            entries.append({
+                "_id": breed["_id"],
+                "species": breed["species"],
+                "name": breed["name"],
+                "code": breed["code"]
+            })
+
+            add_term(breed["name"], breed_idx, PREFIX_MATCH)
+            add_term(breed["code"], breed_idx, PREFIX_MATCH, fuzzy=False)
+
+            # the other words of a name (ex. 'Merino' in 'Australian Merino')
+            for match in re.finditer(r"[\W_]+(\w)", breed["name"]):
+                add_term(
+                    breed["name"][match.start(1):], breed_idx, WORD_MATCH,
+                    fuzzy=False)
+
+            for alias in breed.get("aliases", []):
+                add_term(alias.get("fid"), breed_idx, ALIAS_MATCH)
+
+        # sort terms keeping trigram references valid
+        order = sorted(range(len(terms)), key=lambda i: terms[i])
+        position = {old: new for new, old in enumerate(order)}
+
+        data = (
+            entries,
+            [terms[i] for i in order],
+            {
+                trigram: {position[i] for i in indexes}
+                for trigram, indexes in trigrams.items()
+            }
+        )
+
+        with self._lock:
+            self._data = data
+            self.version = version
+            self._built = True
+
+        logger.debug(f"Indexed {len(entries)} breeds ({len(terms)} terms)")
+
+    def is_valid(self, version) -> bool:
+        return self._built and self.version == version
+
+    def iter_prefix_matches(self, terms: list, query: str):
+        """Yield (score, term index) for terms starting with query"""
+
+        start = bisect.bisect_left(terms, (query, ))
+
+        for i in range(start, len(terms)):
+            term, _, score, _ = terms[i]
+
+            if not term.startswith(query):
+                break
+
+            yield (EXACT_MATCH if term == query else score), i
+
+    def iter_fuzzy_matches(self, terms: list, trigrams: dict, query: str):
+        """Yield (score, term index) for terms similar to query"""
+
+        query_trigrams = get_trigrams(query)
+        shared = {}
+
+        for trigram in query_trigrams:
+            for i in trigrams.get(trigram, []):
+                shared[i] = shared.get(i, 0) + 1
+
+        for i, count in shared.items():
+            term_trigrams = len(get_trigrams(terms[i][0]))
+            similarity = count / (
+                len(query_trigrams) + term_trigrams - count)
+
+            if similarity >= FUZZY_THRESHOLD:
+                yield FUZZY_MATCH + 1 - similarity, i
+
+    def search(self, query: str, species: str = None, limit: int = 10,
+               fuzzy: bool = True) -> list:
+        """Return the best breeds matching a query
+
+        Args:
+            query (str): the text typed by user
+            species (str): return only breeds of this species
+            limit (int): the maximum number of breeds to return
+            fuzzy (bool): search similar names if there aren't enough
+                prefix matches
+
+        Returns:
+            list: breed objects with the matched text and the score (lower
+            is better)
+        """
+
+        query = normalize(query)
+
+        if not query:
+            return []
+
+        breeds, terms, trigrams = self._data
+        best = {}
+
+        def collect(matches):
+            for score, i in matches:
+                _, breed_idx, _, text = terms[i]
+                breed = breeds[breed_idx]
+
+                if species and breed["species"].lower() != species.lower():
+                    continue
+
+                if breed_idx not in best or score < best[breed_idx][0]:
+                    best[breed_idx] = (score, text)
+
+        collect(self.iter_prefix_matches(terms, query))
+
+        if fuzzy and len(best) < limit:
+            collect(self.iter_fuzzy_matches(terms, trigrams, query))
+
+        ranked = sorted(
+            best.items(),
+            key=lambda item: (
+                item[1][0],
+                len(breeds[item[0]]["name"]),
+                breeds[item[0]]["name"]
+            )
+        )
+
+        results = []
+
+        for breed_idx, (score, text) in ranked[:limit]:
+            result = dict(breeds[breed_idx])
+            result["match"] = text
+            result["score"] = round(score, 3)
+            results.append(result)
+
+        return results
+
+
+breed_index = BreedIndex()
@@ -0,0 +1,715 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 20:31:08 2026
+
+@author: Paolo Cozzi <bunop@libero.it>
+
+Caches for values computed from database data. Data change only after an
+import, so values are valid until the :py:class:`database.models.SmarterInfo`
+``last_updated`` attribute changes
+"""
+
+import os
+import time
+import shutil
+import sqlite3
+import hashlib
+import logging
+import pathlib
+import tempfile
+import threading
+
+from collections import OrderedDict
+
+try:
+    import redis
+
+except ImportError:
+    redis = None
+
+# Get an instance of a logger
+logger = logging.getLogger(__name__)
+
+
+class VersionedCache():
+    """A bounded LRU cache of computed values, cleared when the data
+    version changes
+
+    Args:
+        maxsize (int): the maximum number of values to store
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.version = None
+
+    def get(self, key, version, function):
+        """Return the value stored with key or compute it
+
+        Args:
+            key (Hashable): the cache key
+            version (object): the current data version (the
+                ``last_updated`` value). Cached values of different versions
+                are discarded
+            function (Callable): called without arguments to compute the
+                value if missing
+
+        Returns:
+            object: the cached or computed value
+        """
+
+        with self._lock:
+            if version != self.version:
+                self._data.clear()
+                self.version = version
+
+            if key in self._data:
+                self.hits += 1
+                self._data.move_to_end(key)
+                return self._data[key]
+
+            self.misses += 1
+
+        value = function()
+
+        with self._lock:
+            # data could be changed while computing
+            if version == self.version:
+                self._data[key] = value
+
+                if len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+
+        return value
+
+
+class DiskCache():
+    """Store binary values in files, shared by all the workers. Values of
+    each data version are stored in a different directory: directories of
+    the other versions are removed when a new version is seen. When the
+    stored values exceed max_bytes, the least recently used ones are
+    removed
+
+    Args:
+        path (str): the cache directory
+        max_bytes (int): the maximum size of the stored values (None means
+            unlimited)
+    """
+
+    # check the size of the cache directory after this number of stores
+    check_every = 100
+
+    def __init__(self, path: str, max_bytes: int = None):
+        self.path = pathlib.Path(path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        # the bytes stored since the last check, by this worker
+        self._bytes = None
+        self._stores = 0
+
+        # counters are shared by the threads of a worker
+        self._stats_lock = threading.Lock()
+
+    def get_version_dir(self, version) -> pathlib.Path:
+        digest = hashlib.sha1(str(version).encode()).hexdigest()
+        return self.path / digest[:16]
+
+    def get_path(self, key: str, version) -> pathlib.Path:
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return self.get_version_dir(version) / digest[:2] / digest
+
+    def clear(self, keep: pathlib.Path = None):
+        """Remove all the cached values (except the ones in keep
+        directory)"""
+
+        if not self.path.exists():
+            return
+
+        for directory in self.path.iterdir():
+            if directory != keep:
+                shutil.rmtree(directory, ignore_errors=True)
+
+    def lookup(self, key: str, version) -> bytes:
+        """Return the value stored with key (or None)"""
+
+        path = self.get_path(key, version)
+
+        try:
+            value = path.read_bytes()
+
+        except FileNotFoundError:
+            with self._stats_lock:
+                self.misses += 1
+
+            return None
+
+        with self._stats_lock:
+            self.hits += 1
+
+        try:
+            # the modification time tracks the last use
+            os.utime(path)
+
+        except OSError:
+            pass
+
+        return value
+
+    def store(self, key: str, version, value: bytes):
+        path = self.get_path(key, version)
+
+        try:
+            version_dir = self.get_version_dir(version)
+
+            if not version_dir.exists():
+                # forget values of the previous data versions
+                self.clear(keep=version_dir)
+
+            path.parent.mkdir(parents=True, exist_ok=True)
+
+            # write a temporary file, then move it: other workers can't read
+            # a partial value
+            with tempfile.NamedTemporaryFile(
+                    dir=path.parent, delete=False) as handle:
+                handle.write(value)
+
+            os.replace(handle.name, path)
+
+        except OSError as exc:
+            logger.warning(f"Can't cache {key}: {exc}")
+            return
+
+        if self.max_bytes is not None:
+            self.check_size(version_dir, len(value))
+
+    def check_size(self, version_dir: pathlib.Path, size: int):
+        """Count the bytes of a new value and remove the least recently used
+        values if the cache is too big. The size of the directory is read
+        again every check_every stores, since other workers store values
+        too"""
+
+        with self._stats_lock:
+            self._stores += 1
+
+            if self._bytes is not None and \
+                    self._stores % self.check_every != 0:
+                self._bytes += size
+
+                if self._bytes <= self.max_bytes:
+                    return
+
+        total = self.evict(version_dir)
+
+        with self._stats_lock:
+            self._bytes = total
+
+    def evict(self, version_dir: pathlib.Path) -> int:
+        """Remove the least recently used values if the values of
+        version_dir exceed max_bytes. Return the size of the values left"""
+
+        files = []
+
+        for path in version_dir.glob("*/*"):
+            try:
+                stat = path.stat()
+
+            except FileNotFoundError:
+                # removed by another worker
+                continue
+
+            files.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+
+        if total > self.max_bytes:
+            # free some space, to not evict values at each store
+            target = self.max_bytes * 0.8
+
+            for _, size, path in sorted(files, key=lambda item: item[0]):
+                if total <= target:
+                    break
+
+                try:
+                    path.unlink()
+                    total -= size
+
+                except FileNotFoundError:
+                    pass
+
+        return total
+
+    def get(self, key: str, version, function) -> bytes:
+        """Return the value stored with key or compute it
+
+        Args:
+            key (str): the cache key
+            version (object): the current data version
+            function (Callable): called without arguments to compute the
+                value (bytes) if missing
+
+        Returns:
+            bytes: the cached or computed value
+        """
+
+        value = self.lookup(key, version)
+
+        if value is None:
+            value = function()
+            self.store(key, version, value)
+
+        return value
+
+
+class ResponseCache():
+    """Base class of response caches: store the serialized responses of a
+    data version by key. Values of other data versions are never returned.
+    Hits and misses are counted in the memory of each process, unless the
+    backend is shared by all the workers
+
+    Args:
+        max_item_bytes (int): values bigger than this are not stored
+    """
+
+    name = None
+
+    def __init__(self, max_item_bytes: int = 8 * 1024 ** 2):
+        self.max_item_bytes = max_item_bytes
+        self.hits = 0
+        self.misses = 0
+
+        # counters are shared by the threads of a worker
+        self._stats_lock = threading.Lock()
+
+    def _read(self, key: str, version: str):
+        raise NotImplementedError
+
+    def _write(self, key: str, version: str, value: bytes):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def _count(self, name: str):
+        """Add a lookup to the 'hits' or 'misses' counter"""
+
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _read_counters(self) -> tuple:
+        """Return the hits and the misses counters"""
+
+        return self.hits, self.misses
+
+    def lookup(self, key: str, version) -> bytes:
+        """Return the value stored with key or None"""
+
+        value = self._read(key, str(version))
+        self._count("misses" if value is None else "hits")
+
+        return value
+
+    def store(self, key: str, version, value: bytes):
+        if len(value) > self.max_item_bytes:
+            logger.debug(f"Not caching {key}: value too big")
+            return
+
+        self._write(key, str(version), value)
+
+    def stats(self) -> dict:
+        hits, misses = self._read_counters()
+        lookups = hits + misses
+
+        return {
+            "backend": self.name,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / lookups if lookups else None
+        }
+
+
+class MemoryResponseCache(ResponseCache):
+    """A per-process LRU response cache with a memory budget
+
+    Args:
+        max_bytes (int): the maximum size of stored values
+        max_item_bytes (int): values bigger than this are not stored
+    """
+
+    name = "memory"
+
+    def __init__(self, max_bytes: int = 64 * 1024 ** 2, **kwargs):
+        super().__init__(**kwargs)
+
+        self.max_bytes = max_bytes
+        self.version = None
+        self.size = 0
+
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.version = None
+            self.size = 0
+
+    def _read(self, key, version):
+        with self._lock:
+            if version != self.version or key not in self._data:
+                return None
+
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def _write(self, key, version, value):
+        if len(value) > self.max_bytes:
+            return
+
+        with self._lock:
+            if version != self.version:
+                self._data.clear()
+                self.version = version
+                self.size = 0
+
+            if key in self._data:
+                self.size -= len(self._data.pop(key))
+
+            self._data[key] = value
+            self.size += len(value)
+
+            # evict the least recently used values
+            while self.size > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self.size -= len(evicted)
+
+    def stats(self):
+        stats = super().stats()
+        stats.update(items=len(self._data), bytes=self.size)
+
+        return stats
+
+
+class SQLiteResponseCache(ResponseCache):
+    """A response cache stored in a SQLite database, shared by all the
+    workers. Values of other data versions are removed when the first value
+    of a new version is stored. The current version, the size of values and
+    the hits and misses of all the workers are kept in the ``meta`` table
+
+    Args:
+        path (str): the database file
+        max_bytes (int): the maximum size of stored values
+        max_item_bytes (int): values bigger than this are not stored
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 ** 2,
+                 **kwargs):
+        super().__init__(**kwargs)
+
+        self.path = path
+        self.max_bytes = max_bytes
+
+        # sqlite connections can't be shared by threads
+        self._local = threading.local()
+
+    def get_connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+
+        if connection is None:
+            pathlib.Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+
+            connection = sqlite3.connect(
+                self.path, timeout=10, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, version TEXT, value BLOB, "
+                "size INTEGER, accessed REAL)")
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed "
+                "ON responses (accessed)")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS meta ("
+                "name TEXT PRIMARY KEY, value)")
+            connection.execute(
+                "INSERT OR IGNORE INTO meta VALUES "
+                "('version', NULL), ('size', 0), ('hits', 0), ('misses', 0)")
+
+            self._local.connection = connection
+
+        return connection
+
+    def clear(self):
+        try:
+            connection = self.get_connection()
+
+            with connection:
+                connection.execute("BEGIN IMMEDIATE")
+                connection.execute("DELETE FROM responses")
+                connection.execute(
+                    "UPDATE meta SET value = 0 WHERE name = 'size'")
+
+        except sqlite3.Error as exc:
+            logger.warning(f"Can't clear {self.path}: {exc}")
+
+    def _count(self, name):
+        try:
+            self.get_connection().execute(
+                "UPDATE meta SET value = value + 1 WHERE name = ?", (name, ))
+
+        except sqlite3.Error as exc:
+            logger.warning(f"Can't count {name}: {exc}")
+
+    def _read_counters(self):
+        try:
+            counters = dict(self.get_connection().execute(
+                "SELECT name, value FROM meta "
+                "WHERE name IN ('hits', 'misses')"))
+
+            return counters['hits'], counters['misses']
+
+        except sqlite3.Error as exc:
+            logger.warning(f"Can't read {self.path}: {exc}")
+            return 0, 0
+
+    def _read(self, key, version):
+        try:
+            connection = self.get_connection()
+            row = connection.execute(
+                "SELECT value FROM responses WHERE key = ? AND version = ?",
+                (key, version)).fetchone()
+
+            if row is None:
+                return None
+
+            connection.execute(
+                "UPDATE responses SET accessed = ? WHERE key = ?",
+                (time.time(), key))
+
+            return row[0]
+
+        except sqlite3.Error as exc:
+            logger.warning(f"Can't read {key}: {exc}")
+            return None
+
+    def _write(self, key, version, value):
+        try:
+            connection = self.get_connection()
+
+            with connection:
+                connection.execute("BEGIN IMMEDIATE")
+
+                current, size = connection.execute(
+                    "SELECT (SELECT value FROM meta WHERE name = 'version'), "
+                    "(SELECT value FROM meta WHERE name = 'size')"
+                ).fetchone()
+
+                # forget values of the previous data versions
+                if current != version:
+                    connection.execute("DELETE FROM responses")
+                    connection.execute(
+                        "UPDATE meta SET value = ? WHERE name = 'version'",
+                        (version, ))
+                    size = 0
+
+                # the replaced value (if any)
+                row = connection.execute(
+                    "SELECT size FROM responses WHERE key = ?",
+                    (key, )).fetchone()
+
+                if row is not None:
+                    size -= row[0]
+
+                connection.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                    (key, version, value, len(value), time.time()))
+                size += len(value)
+
+                if size > self.max_bytes:
+                    size = self.evict(connection, size)
+
+                connection.execute(
+                    "UPDATE meta SET value = ? WHERE name = 'size'", (size, ))
+
+        except sqlite3.Error as exc:
+            logger.warning(f"Can't cache {key}: {exc}")
+
+    def evict(self, connection: sqlite3.Connection, size: int) -> int:
+        """Remove the least recently used values until their size is in the
+        budget and return the new size"""
+
+        rows = connection.execute(
+            "SELECT key, size FROM responses ORDER BY accessed")
+
+        evicted = []
+
+        for evicted_key, evicted_size in rows:
+            if size <= self.max_bytes:
+                break
+
+            evicted.append((evicted_key, ))
+            size -= evicted_size
+
+        connection.executemany(
+            "DELETE FROM responses WHERE key = ?", evicted)
+
+        return size
+
+    def stats(self):
+        stats = super().stats()
+
+        try:
+            items, size = self.get_connection().execute(
+                "SELECT (SELECT COUNT(*) FROM responses), "
+                "(SELECT value FROM meta WHERE name = 'size')").fetchone()
+            stats.update(items=items, bytes=size)
+
+        except sqlite3.Error as exc:
+            logger.warning(f"Can't read {self.path}: {exc}")
+
+        return stats
+
+
+class RedisResponseCache(ResponseCache):
+    """A response cache stored in Redis, shared by all the workers (and
+    servers). Data versions are part of the keys, so values of previous
+    versions are never read and expire after ttl seconds. The memory budget
+    is managed by Redis (ex. with ``maxmemory-policy allkeys-lru``). Hits and
+    misses of all the workers are counted in Redis
+
+    Args:
+        client (redis.Redis): a redis client (or an object with the same
+            ``get``, ``set``, ``scan_iter``, ``delete``, ``incr`` and
+            ``mget`` methods)
+        prefix (str): the prefix of the keys
+        ttl (int): seconds after which values are removed
+        max_item_bytes (int): values bigger than this are not stored
+    """
+
+    name = "redis"
+
+    def __init__(self, client, prefix: str = "smarter-responses",
+                 ttl: int = 7 * 24 * 3600, **kwargs):
+        super().__init__(**kwargs)
+
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def get_key(self, key: str, version: str) -> str:
+        version = hashlib.sha1(version.encode()).hexdigest()[:16]
+        key = hashlib.sha256(key.encode()).hexdigest()
+
+        return f"{self.prefix}:{version}:{key}"
+
+    def get_counter_key(self, name: str) -> str:
+        # counters are not removed by clear()
+        return f"{self.prefix}-stats:{name}"
+
+    def clear(self):
+        try:
+            keys = list(self.client.scan_iter(match=f"{self.prefix}:*"))
+
+            if keys:
+                self.client.delete(*keys)
+
+        # a cache failure shouldn't break responses
+        except Exception as exc:
+            logger.warning(f"Can't clear {self.prefix}: {exc}")
+
+    def _count(self, name):
+        try:
+            self.client.incr(self.get_counter_key(name))
+
+        except Exception as exc:
+            logger.warning(f"Can't count {name}: {exc}")
+
+    def _read_counters(self):
+        try:
+            hits, misses = self.client.mget(
+                [self.get_counter_key("hits"),
+                 self.get_counter_key("misses")])
+
+            return int(hits or 0), int(misses or 0)
+
+        except Exception as exc:
+            logger.warning(f"Can't read {self.prefix} counters: {exc}")
+            return 0, 0
+
+    def _read(self, key, version):
+        try:
+            return self.client.get(self.get_key(key, version))
+
+        except Exception as exc:
+            logger.warning(f"Can't read {key}: {exc}")
+            return None
+
+    def _write(self, key, version, value):
+        try:
+            self.client.set(self.get_key(key, version), value, ex=self.ttl)
+
+        except Exception as exc:
+            logger.warning(f"Can't cache {key}: {exc}")
+
+
+def create_response_cache(
+        backend: str, max_bytes: int = 64 * 1024 ** 2,
+        max_item_bytes: int = 8 * 1024 ** 2,
+        path: str = "/tmp/smarter-responses.sqlite3",
+        url: str = "redis://localhost:6379/0") -> ResponseCache:
+    """Return a response cache
+
+    Args:
+        backend (str): ``none``, ``memory``, ``sqlite`` or ``redis``
+        max_bytes (int): the maximum size of stored values (``memory`` and
+            ``sqlite`` backends)
+        max_item_bytes (int): values bigger than this are not stored
+        path (str): the database file of the ``sqlite`` backend
+        url (str): the server url of the ``redis`` backend
+
+    Returns:
+        ResponseCache: the response cache or None if backend is ``none``
+    """
+
+    if backend == "none":
+        return None
+
+    if backend == "memory":
+        return MemoryResponseCache(
+            max_bytes=max_bytes, max_item_bytes=max_item_bytes)
+
+    if backend == "sqlite":
+        return SQLiteResponseCache(
+            path, max_bytes=max_bytes, max_item_bytes=max_item_bytes)
+
+    if backend == "redis":
+        if redis is None:
+            raise ValueError(
+                "The 'redis' response cache requires the redis package")
+
+        return RedisResponseCache(
+            redis.Redis.from_url(url), max_item_bytes=max_item_bytes)
+
+    raise ValueError(
+        f"Unknown response cache '{backend}' "
+        "(choose between 'none', 'memory', 'sqlite' and 'redis')")
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 11:40:02 2026
+
+@author: Paolo Cozzi <bunop@libero.it>
+
+Count objects in paginated responses. Data change only after an import, so
+the number of objects matching a query can be remembered until the
+:py:class:`database.models.SmarterInfo` ``last_updated`` attribute changes
+"""
+
+from bson import json_util
+
+from common.cache import VersionedCache
+
+# the supported count modes
+COUNT_NONE = 'none'
+COUNT_ESTIMATED = 'estimated'
+COUNT_EXACT = 'exact'
+
+COUNT_MODES = (COUNT_NONE, COUNT_ESTIMATED, COUNT_EXACT)
+
+
+def get_query_key(queryset) -> tuple:
+    """Return a key describing the collection, the normalized filter and
+    the collation of a queryset
+
+    Args:
+        queryset (QuerySet): a mongoengine queryset
+
+    Returns:
+        tuple: the collection name and the filter and collation as sorted
+        JSON strings
+    """
+
+    return (
+        queryset._document._get_collection_name(),
+        json_util.dumps(queryset._query, sort_keys=True),
+        json_util.dumps(queryset._collation, sort_keys=True)
+    )
+
+
+class CountCache(VersionedCache):
+    """A bounded cache of ``count_documents`` results, cleared when the data
+    version changes"""
+
+    def get_count(self, queryset, version=None) -> int:
+        """Count the objects of a queryset or return the stored value
+
+        Args:
+            queryset (QuerySet): a mongoengine queryset
+            version (object): the current data version (the
+                ``last_updated`` value). Cached values of different versions
+                are discarded
+
+        Returns:
+            int: the number of objects matching the queryset filter
+        """
+
+        return self.get(get_query_key(queryset), version, queryset.count)
+
+
+count_cache = CountCache()
+
+
+def count_objects(queryset, mode: str = COUNT_EXACT, version=None):
+    """Count the objects of a queryset relying on the count mode
+
+    Args:
+        queryset (QuerySet): a mongoengine queryset
+        mode (str): one of :py:const:`COUNT_MODES`
+        version (object): the current data version
+
+    Returns:
+        int: the number of objects or None if mode is ``none``
+    """
+
+    if mode == COUNT_NONE:
+        return None
+
+    if mode == COUNT_ESTIMATED and not queryset._query:
+        # read the count from collection metadata
+        return queryset._collection.estimated_document_count()
+
+    return count_cache.get_count(queryset, version)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 19:21:14 2026
+
+@author: Paolo Cozzi <bunop@libero.it>
+
+JSON encoders used by the application. The encoder is chosen with the
+``SMARTER_JSON_ENCODER`` variable: ``stdlib`` (the default) or ``orjson``,
+which requires the `orjson <https://github.com/ijl/orjson>`_ package
+"""
+
+from enum import Enum
+
+from bson import ObjectId, json_util
+from flask.json import JSONEncoder
+from mongoengine.base import BaseDocument
+from mongoengine.queryset import QuerySet
+
+try:
+    import orjson
+
+except ImportError:
+    orjson = None
+
+
+class CustomJSONEncoder(JSONEncoder):
+    """Deal with ObjectId, enums and mongoengine objects in json
+    responses"""
+
+    def default(self, obj):
+        if isinstance(obj, ObjectId):
+            return {
+                "$oid": str(obj)
+            }
+
+        if isinstance(obj, Enum):
+            return obj.value
+
+        if isinstance(obj, BaseDocument):
+            return json_util._json_convert(obj.to_mongo())
+
+        if isinstance(obj, QuerySet):
+            return json_util._json_convert(obj.as_pymongo())
+
+        return JSONEncoder.default(self, obj)
+
+
+class OrjsonJSONEncoder(CustomJSONEncoder):
+    """Serialize objects with orjson. Objects which orjson doesn't support
+    natively are converted by :py:meth:`CustomJSONEncoder.default`, so
+    the returned data are the same of :py:class:`CustomJSONEncoder`. Only
+    compact or 2 spaces indented output is supported: other formats
+    are serialized with the standard encoder"""
+
+    def get_options(self) -> int:
+        # dates are serialized like flask does
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+
+        if self.indent == 2:
+            option |= orjson.OPT_INDENT_2
+
+        return option
+
+    def encode(self, obj) -> str:
+        if self.indent not in (None, 2):
+            return super().encode(obj)
+
+        try:
+            return orjson.dumps(
+                obj, default=self.default, option=self.get_options()
+            ).decode()
+
+        except orjson.JSONEncodeError:
+            # ex. integers bigger than 64 bit
+            return super().encode(obj)
+
+
+JSON_ENCODERS = {
+    'stdlib': CustomJSONEncoder,
+    'orjson': OrjsonJSONEncoder
+}
+
+
+def get_json_encoder(name: str):
+    """Return the JSON encoder class by name
+
+    Args:
+        name (str): one of :py:const:`JSON_ENCODERS` keys
+
+    Raises:
+        ValueError: if the encoder is unknown or its dependencies are not
+            installed
+
+    Returns:
+        JSONEncoder: the encoder class
+    """
+
+    if name not in JSON_ENCODERS:
+        raise ValueError(
+            f"Unknown JSON encoder '{name}': choose one of "
+            f"{list(JSON_ENCODERS.keys())}")
+
+    if name == 'orjson' and orjson is None:
+        raise ValueError("orjson encoder requires the orjson package")
+
+    return JSON_ENCODERS[name]
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 15:02:47 2026
+
+@author: Paolo Cozzi <bunop@libero.it>
+
+A per-process cache of :py:class:`database.models.SmarterInfo`. Database
+status is read at most once every ``SMARTER_INFO_TTL`` seconds, or when the
+``SMARTER_INFO_STAMP`` file is touched (ex. after a data import), instead of
+once per request
+"""
+
+import os
+import time
+import logging
+import pathlib
+import threading
+
+from decouple import config
+
+from database.models import SmarterInfo
+
+# Get an instance of a logger
+logger = logging.getLogger(__name__)
+
+
+class SmarterInfoCache():
+    """Track the ``smarter`` :py:class:`database.models.SmarterInfo` object
+    shared by all the resources of a worker
+
+    Args:
+        ttl (int): seconds after which database status is read again
+        stamp (str): the path of a file which forces a refresh when its
+            modification time changes
+    """
+
+    def __init__(self, ttl: int = 60, stamp: str = None):
+        self.ttl = ttl
+        self.stamp = stamp
+
+        self._info = None
+        self._expires = 0
+        self._stamp_mtime = None
+        self._lock = threading.Lock()
+
+    def _get_stamp_mtime(self):
+        if not self.stamp:
+            return None
+
+        try:
+            return os.stat(self.stamp).st_mtime
+
+        except FileNotFoundError:
+            return None
+
+    def _is_expired(self, info) -> bool:
+        if info is None or time.monotonic() >= self._expires:
+            return True
+
+        return self._get_stamp_mtime() != self._stamp_mtime
+
+    def refresh(self) -> SmarterInfo:
+        """Read database status from database"""
+
+        with self._lock:
+            self._stamp_mtime = self._get_stamp_mtime()
+            self._info = SmarterInfo.objects.filter(pk="smarter").first()
+            self._expires = time.monotonic() + self.ttl
+
+            logger.debug(f"Got database status: {self._info}")
+
+            return self._info
+
+    def invalidate(self):
+        """Forget about database status: it will be read again on the next
+        request"""
+
+        with self._lock:
+            self._info = None
+            self._expires = 0
+
+    def get(self) -> SmarterInfo:
+        """Return the database status object (or None if there's no status
+        in database)"""
+
+        # another thread could invalidate the object while checking
+        info = self._info
+
+        if self._is_expired(info):
+            return self.refresh()
+
+        return info
+
+    @property
+    def version(self) -> str:
+        info = self.get()
+        return info.version if info else None
+
+    @property
+    def working_assemblies(self) -> dict:
+        info = self.get()
+        return info.working_assemblies if info else {}
+
+    @property
+    def plink_specie_opt(self) -> dict:
+        info = self.get()
+        return info.plink_specie_opt if info else {}
+
+    @property
+    def last_updated(self):
+        """The date of the last data import. Could be used to invalidate
+        data computed on the previous data version"""
+
+        info = self.get()
+        return info.last_updated if info else None
+
+
+def touch_stamp(stamp: str):
+    """Update the modification time of a stamp file: all the workers will
+    read again the database status on the next request"""
+
+    path = pathlib.Path(stamp)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.touch()
+
+
+smarter_info = SmarterInfoCache(
+    ttl=config('SMARTER_INFO_TTL', cast=int, default=60),
+    stamp=config('SMARTER_INFO_STAMP', default='/tmp/smarter-info.stamp')
+)
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 21:05:44 2026
+
+@author: Paolo Cozzi <bunop@libero.it>
+
+A minimal `Mapbox Vector Tile <https://github.com/mapbox/vector-tile-spec>`_
+encoder for point features. Tiles are protocol buffers messages, which are
+written here without additional dependencies
+"""
+
+import math
+import struct
+
+# the tile coordinates extent
+EXTENT = 4096
+
+# the latitude limit of the web mercator projection
+MAX_LATITUDE = 85.0511287798
+
+# protocol buffers wire types
+VARINT = 0
+FIXED64 = 1
+LENGTH_DELIMITED = 2
+
+# geometry types and commands
+POINT = 1
+MOVE_TO = 1
+
+
+def encode_varint(value: int) -> bytes:
+    """Encode an unsigned integer as a protobuf varint"""
+
+    result = bytearray()
+
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+
+        if value:
+            result.append(byte | 0x80)
+
+        else:
+            result.append(byte)
+            return bytes(result)
+
+
+def zigzag(value: int) -> int:
+    """Encode a signed integer as an unsigned one"""
+
+    return (value << 1) ^ (value >> 63)
+
+
+def encode_key(field: int, wire_type: int) -> bytes:
+    return encode_varint((field << 3) | wire_type)
+
+
+def encode_bytes(field: int, value: bytes) -> bytes:
+    """Encode a length delimited field (strings, messages, packed
+    values)"""
+
+    return encode_key(field, LENGTH_DELIMITED) + encode_varint(len(value)) + \
+        value
+
+
+def encode_packed(field: int, values: list) -> bytes:
+    return encode_bytes(
+        field, b"".join(encode_varint(value) for value in values))
+
+
+def encode_value(value) -> bytes:
+    """Encode a feature property value as a Value message"""
+
+    if isinstance(value, bool):
+        return encode_key(7, VARINT) + encode_varint(int(value))
+
+    if isinstance(value, int):
+        return encode_key(6, VARINT) + encode_varint(zigzag(value))
+
+    if isinstance(value, float):
+        return encode_key(3, FIXED64) + struct.pack("<d", value)
+
+    return encode_bytes(1, str(value).encode())
+
+
+def lonlat_to_tile(lon: float, lat: float, zoom: int) -> tuple:
+    """Project a WGS84 coordinate in the tile space (web mercator) of a zoom
+    level. The integer part of the result is the tile number"""
+
+    lat = max(min(lat, MAX_LATITUDE), -MAX_LATITUDE)
+    n = 2 ** zoom
+
+    x = (lon + 180) / 360 * n
+    y = (1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n
+
+    return x, y
+
+
+def tile_bounds(zoom: int, x: int, y: int) -> list:
+    """Return the bounding box of a tile as [west, south, east, north]"""
+
+    n = 2 ** zoom
+
+    def get_lat(y):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+
+    return [
+        x / n * 360 - 180,
+        get_lat(y + 1),
+        (x + 1) / n * 360 - 180,
+        get_lat(y)
+    ]
+
+
+def encode_points(points: list) -> list:
+    """Encode tile coordinates as a point geometry"""
+
+    geometry = [MOVE_TO | (len(points) << 3)]
+    last_x, last_y = 0, 0
+
+    for x, y in points:
+        geometry += [zigzag(x - last_x), zigzag(y - last_y)]
+        last_x, last_y = x, y
+
+    return geometry
+
+
+class Layer():
+    """Collect the point features of a tile layer
+
+    Args:
+        name (str): the layer name
+        zoom (int): tile zoom level
+        x (int): tile column
+        y (int): tile row
+        extent (int): the size of the tile in tile coordinates
+    """
+
+    def __init__(self, name: str, zoom: int, x: int, y: int,
+                 extent: int = EXTENT):
+        self.name = name
+        self.zoom = zoom
+        self.x = x
+        self.y = y
+        self.extent = extent
+
+        self.keys = {}
+        self.values = {}
+        self.features = []
+
+    def __len__(self):
+        return len(self.features)
+
+    def get_index(self, data: dict, value) -> int:
+        if value not in data:
+            data[value] = len(data)
+
+        return data[value]
+
+    def add_feature(self, coordinates: list, properties: dict) -> bool:
+        """Add a point (or multipoint) feature. Coordinates are
+        [lon, lat] pairs: the ones outside the tile are ignored
+
+        Returns:
+            bool: True if the feature has points inside the tile
+        """
+
+        points = []
+
+        for lon, lat in coordinates:
+            x, y = lonlat_to_tile(lon, lat, self.zoom)
+            x = int((x - self.x) * self.extent)
+            y = int((y - self.y) * self.extent)
+
+            if 0 <= x < self.extent and 0 <= y < self.extent:
+                points.append((x, y))
+
+        if not points:
+            return False
+
+        tags = []
+
+        for key, value in properties.items():
+            if value is None:
+                continue
+
+            tags.append(self.get_index(self.keys, key))
+            tags.append(self.get_index(self.values, (type(value), value)))
+
+        self.features.append((tags, encode_points(points)))
+
+        return True
+
+    def encode(self) -> bytes:
+        features = b"".join(
+            encode_bytes(
+                2,
+                encode_packed(2, tags) +
+                encode_key(3, VARINT) + encode_varint(POINT) +
+                encode_packed(4, geometry)
+            )
+            for tags, geometry in self.features
+        )
+
+        keys = b"".join(encode_bytes(3, key.encode()) for key in self.keys)
+        values = b"".join(
+            encode_bytes(4, encode_value(value)) for _, value in self.values)
+
+        return (
+            encode_key(15, VARINT) + encode_varint(2) +
+            encode_bytes(1, self.name.encode()) +
+            features + keys + values +
+            encode_key(5, VARINT) + encode_varint(self.extent)
+        )
+
+
+def encode_tile(layers: list) -> bytes:
+    """Encode layers in a vector tile"""
+
+    return b"".join(encode_bytes(3, layer.encode()) for layer in layers)
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 10:12:31 2026
+
+@author: Paolo Cozzi <bunop@libero.it>
+
+Keyset (cursor) pagination helpers. A cursor is an opaque token which
+encodes the sort key and the values of the last returned object, so the
+next page can be selected with a range query on an index instead of
+skipping all the previous documents
+"""
+
+import json
+import base64
+import binascii
+
+from enum import Enum
+
+from bson import json_util
+from bson.errors import BSONError
+from mongoengine.queryset import Q
+
+from resources.errors import InvalidCursorError
+
+# the special value used to start a keyset pagination
+CURSOR_START = '*'
+
+
+def _default(obj):
+    """Serialize enums (ex. sample type) like mongoengine does"""
+
+    if isinstance(obj, Enum):
+        return obj.value
+
+    return json_util.default(obj)
+
+
+def encode_cursor(order_by: str, values: list) -> str:
+    """Encode the sort key and the last values in an opaque token
+
+    Args:
+        order_by (str): the sort key (as received by ListView)
+        values (list): the sort key value and the object id
+
+    Returns:
+        str: an url safe token
+    """
+
+    data = json.dumps({"s": order_by, "v": values}, default=_default)
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def decode_cursor(token: str, order_by: str) -> list:
+    """Decode a token created with :py:func:`encode_cursor`
+
+    Args:
+        token (str): the token received from client
+        order_by (str): the current sort key
+
+    Raises:
+        InvalidCursorError: if the token can't be decoded or was
+            generated with a different sort key
+
+    Returns:
+        list: the sort key value and the object id
+    """
+
+    try:
+        data = json_util.loads(base64.urlsafe_b64decode(token.encode()))
+
+    # tampered tokens can hold invalid extended JSON (ex. a bad $oid)
+    except (binascii.Error, ValueError, TypeError, BSONError):
+        raise InvalidCursorError
+
+    if not isinstance(data, dict) or data.get("s") != order_by:
+        raise InvalidCursorError
+
+    values = data.get("v")
+
+    if not isinstance(values, list) or not values:
+        raise InvalidCursorError
+
+    return values
+
+
+def get_sort_keys(order_by: str) -> list:
+    """Return the mongoengine keys used to sort a keyset paginated query.
+    The object id is always added to break ties
+
+    Args:
+        order_by (str): a sort key like 'name' or '-name' or None
+
+    Returns:
+        list: the sort keys (ex. ['-name', '-id'])
+    """
+
+    if not order_by:
+        return ['id']
+
+    descending = order_by.startswith('-')
+    field = order_by.lstrip('-')
+
+    if field in ['id', 'pk']:
+        return [order_by]
+
+    return [order_by, '-id' if descending else 'id']
+
+
+def get_sort_values(obj, keys: list, document=None) -> list:
+    """Read sort key values from an object or from a raw document (in this
+    case the document class is required to get database field names)"""
+
+    values = []
+
+    for key in keys:
+        value = obj
+        field = key.lstrip('-')
+
+        if isinstance(obj, dict):
+            # raw documents have database field names
+            field = document._translate_field_name(field, sep='__')
+
+            for attr in field.split('.'):
+                value = value.get(attr) if isinstance(value, dict) else None
+
+        else:
+            for attr in field.split('__'):
+                value = getattr(value, attr, None)
+
+        values.append(value)
+
+    return values
+
+
+def get_cursor_filter(keys: list, values: list) -> Q:
+    """Build a query selecting all the objects after the last seen
+
+    Args:
+        keys (list): the sort keys returned by :py:func:`get_sort_keys`
+        values (list): the values decoded by :py:func:`decode_cursor`
+
+    Raises:
+        InvalidCursorError: if keys and values don't match
+
+    Returns:
+        Q: a query to be applied to the paginated queryset
+    """
+
+    if len(keys) != len(values):
+        raise InvalidCursorError
+
+    conditions = []
+    equals = {}
+
+    for key, value in zip(keys, values):
+        descending = key.startswith('-')
+        field = key.lstrip('-')
+
+        # null (or missing) values sort before any other value, while
+        # range operators never match them
+        if value is None:
+            if not descending:
+                conditions.append(Q(**equals, **{f"{field}__ne": None}))
+
+        elif descending:
+            conditions.append(
+                Q(**equals, **{f"{field}__lt": value}) |
+                Q(**equals, **{field: None}))
+
+        else:
+            conditions.append(Q(**equals, **{f"{field}__gt": value}))
+
+        equals[field] = value
+
+    query = conditions[0]
+
+    for condition in conditions[1:]:
+        query |= condition
+
+    return query
+
+
+def paginate_by_cursor(queryset, order_by: str, cursor: str, size: int):
+    """Return a page of objects after the cursor position
+
+    Args:
+        queryset (QuerySet): the queryset to paginate
+        order_by (str): the sort key or None
+        cursor (str): the token received from client or
+            :py:const:`CURSOR_START`
+        size (int): the number of objects to return
+
+    Returns:
+        tuple: the list of objects and the token for the next page (or None
+        if there are no more objects)
+    """
+
+    keys = get_sort_keys(order_by)
+    queryset = queryset.order_by(*keys)
+
+    if cursor != CURSOR_START:
+        values = decode_cursor(cursor, order_by or "")
+        queryset = queryset.filter(get_cursor_filter(keys, values))
+
+    # get one more object to know if there's a next page
+    items = list(queryset.limit(size + 1))
+
+    next_cursor = None
+
+    if len(items) > size:
+        items = items[:size]
+        next_cursor = encode_cursor(
+            order_by or "",
+            get_sort_values(items[-1], keys, queryset._document))
+
+    return items, next_cursor
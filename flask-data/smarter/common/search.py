@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 23:05:12 2026
+
+@author: Paolo Cozzi <bunop@libero.it>
+
+An in-memory inverted index of dataset file names and archive contents.
+Datasets change only after a data import, so the index is built once per
+data version and searched by tokens instead of scanning every content with
+a regular expression
+"""
+
+import re
+import bisect
+import logging
+import threading
+
+# Get an instance of a logger
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+
+def tokenize(text: str) -> list:
+    """Split a text in lowercase alphanumeric tokens (ex.
+    'archive/test.map' -> ['archive', 'test', 'map'])"""
+
+    return TOKEN_PATTERN.findall((text or "").lower())
+
+
+class DatasetIndex():
+    """Search datasets by the tokens of their file names and contents"""
+
+    def __init__(self):
+        self.version = None
+
+        # datasets, sorted tokens and postings are replaced together
+        self._data = ([], [], {})
+        self._lock = threading.Lock()
+        self._built = False
+
+    def clear(self):
+        with self._lock:
+            self._built = False
+            self.version = None
+
+    def build(self, datasets, version=None):
+        """Index datasets
+
+        Args:
+            datasets (Iterable[dict]): raw datasets (as returned by
+                ``as_pymongo()``)
+            version (object): the data version of datasets
+        """
+
+        entries = []
+        postings = {}
+
+        for dataset in datasets:
+            dataset_idx = len(entries)
+
+            # the file name is the first entry, then the archive contents
+            texts = [dataset.get("file")] + dataset.get("contents", [])
+            entries.append((dataset["_id"], texts))
+
+            for entry_idx, text in enumerate(texts):
+                for token in tokenize(text):
+                    postings.setdefault(token, set()).add(
+                        (dataset_idx, entry_idx))
+
+        data = (entries, sorted(postings), postings)
+
+        with self._lock:
+            self._data = data
+            self.version = version
+            self._built = True
+
+        logger.debug(
+            f"Indexed {len(entries)} datasets ({len(postings)} tokens)")
+
+    def is_valid(self, version) -> bool:
+        return self._built and self.version == version
+
+    def get_postings(self, tokens: list, postings: dict, token: str) -> set:
+        """Return the (dataset, entry) pairs having a token starting with
+        token"""
+
+        hits = set()
+        start = bisect.bisect_left(tokens, token)
+
+        for i in range(start, len(tokens)):
+            if not tokens[i].startswith(token):
+                break
+
+            hits |= postings[tokens[i]]
+
+        return hits
+
+    def search(self, query: str) -> dict:
+        """Return the datasets matching all the terms of a query. Every
+        token of a term needs to match the beginning of a token of the same
+        file name or content, so 'test.map' matches 'archive/test.map' and
+        'final' matches 'finalreport.txt'
+
+        Args:
+            query (str): the search terms, separated by spaces
+
+        Returns:
+            dict: the matched contents by dataset ObjectId. Contents are
+            empty when only the file name matched
+        """
+
+        entries, tokens, postings = self._data
+        matches = None
+
+        for term in set(query.split()):
+            hits = None
+
+            for token in set(tokenize(term)):
+                found = self.get_postings(tokens, postings, token)
+                hits = found if hits is None else hits & found
+
+            if hits is None:
+                # a term without tokens (ex. punctuation)
+                continue
+
+            # group matched entries by dataset
+            grouped = {}
+
+            for dataset_idx, entry_idx in hits:
+                grouped.setdefault(dataset_idx, set()).add(entry_idx)
+
+            if matches is None:
+                matches = grouped
+
+            else:
+                matches = {
+                    dataset_idx: matches[dataset_idx] | entry_idxs
+                    for dataset_idx, entry_idxs in grouped.items()
+                    if dataset_idx in matches
+                }
+
+            if not matches:
+                return {}
+
+        results = {}
+
+        for dataset_idx, entry_idxs in (matches or {}).items():
+            id_, texts = entries[dataset_idx]
+            results[id_] = [texts[i] for i in sorted(entry_idxs) if i > 0]
+
+        return results
+
+
+dataset_index = DatasetIndex()
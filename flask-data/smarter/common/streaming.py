@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 20:02:36 2026
+
+@author: Paolo Cozzi <bunop@libero.it>
+
+Helpers to stream big responses
+"""
+
+# the minimum size of a streamed response chunk
+CHUNK_SIZE = 64 * 1024
+
+
+def iter_chunks(lines, size=CHUNK_SIZE):
+    """Join lines in chunks of at least size characters"""
+
+    chunk = []
+    length = 0
+
+    for line in lines:
+        chunk.append(line)
+        length += len(line)
+
+        if length >= size:
+            yield "".join(chunk)
+            chunk = []
+            length = 0
+
+    if chunk:
+        yield "".join(chunk)
@@ -8,23 +8,409 @@ Created on Mon May 24 16:34:05 2021
 This module is an attempt to define class based views like the django ones
 """
 
+import json
+import math
+import hashlib
+import datetime
+
 from mongoengine.errors import ValidationError, DoesNotExist
-from flask import request, url_for, current_app
+from flask import request, url_for, current_app, abort, Response
 from flask_restful import Resource, reqparse
 from flask_mongoengine import QuerySet
 from werkzeug.urls import url_encode
+from bson import json_util
+from decouple import config
 
+from database.models import bulk_to_mongo
 from resources.errors import MongoEngineValidationError, ObjectsNotExistsError
+from common.cache import create_response_cache
+from common.counts import COUNT_MODES, COUNT_NONE, COUNT_EXACT, count_objects
+from common.info import smarter_info
+from common.pagination import paginate_by_cursor
+
+
+# the headers stored with cached responses
+CACHED_HEADERS = ('Content-Type', 'Content-Disposition')
+
+# the prefix of the log messages with the queries of list views (see
+# 'flask indexes advise')
+QUERY_LOG_PREFIX = "List query: "
+
+response_cache = create_response_cache(
+    config('SMARTER_RESPONSE_CACHE', default='none'),
+    max_bytes=config(
+        'SMARTER_RESPONSE_CACHE_SIZE', cast=int, default=64 * 1024 ** 2),
+    max_item_bytes=config(
+        'SMARTER_RESPONSE_CACHE_ITEM_SIZE', cast=int, default=8 * 1024 ** 2),
+    path=config(
+        'SMARTER_RESPONSE_CACHE_PATH',
+        default='/tmp/smarter-responses.sqlite3'),
+    url=config(
+        'SMARTER_RESPONSE_CACHE_URL', default='redis://redis:6379/0')
+)
 
 
 class ImproperlyConfigured(Exception):
     pass
 
 
-class ModelView(Resource):
+def check_size(value) -> int:
+    value = int(value)
+
+    if value < 1:
+        raise ValueError("size must be a positive integer")
+
+    return value
+
+
+# the sort and pagination arguments of all the list views
+LIST_ARGUMENTS = (
+    reqparse.Argument('sort', help="Sort results by this key"),
+    reqparse.Argument(
+        'order',
+        choices=('asc', 'desc'),
+        help="Sort key order: {error_msg}"),
+    reqparse.Argument('page', type=int, help="Results page number"),
+    reqparse.Argument(
+        'size',
+        type=check_size,
+        help="Number of results per page: {error_msg}"),
+    reqparse.Argument(
+        'cursor',
+        help="Pagination cursor (use '*' to start a keyset pagination)"),
+    reqparse.Argument(
+        'count',
+        choices=COUNT_MODES,
+        help="How to count total results: {error_msg}")
+)
+
+
+def compile_parser(parser: reqparse.RequestParser,
+                   arguments) -> reqparse.RequestParser:
+    """Return a copy of parser with the arguments it doesn't define yet
+
+    Args:
+        parser (reqparse.RequestParser): a view parser
+        arguments (Iterable): the reqparse.Argument instances to add
+
+    Returns:
+        reqparse.RequestParser: a new parser
+    """
+
+    parser = parser.copy()
+    names = {argument.name for argument in parser.args}
+
+    for argument in arguments:
+        if argument.name not in names:
+            parser.add_argument(argument)
+
+    return parser
+
+
+def get_fields_arguments(selectable_fields: tuple) -> tuple:
+    """Return the 'fields' and 'exclude' arguments of a view. Both accept
+    comma separated field names, which need to be in selectable_fields
+
+    Args:
+        selectable_fields (tuple): the (database) names of the fields which
+            can be selected
+
+    Returns:
+        tuple: the reqparse.Argument instances
+    """
+
+    def check_fields(value) -> list:
+        fields = [field.strip() for field in value.split(",") if field.strip()]
+
+        for field in fields:
+            if field not in selectable_fields:
+                raise ValueError(
+                    f"'{field}' is not a selectable field (choose between "
+                    f"{', '.join(selectable_fields)})")
+
+        return fields
+
+    return (
+        reqparse.Argument(
+            'fields',
+            type=check_fields,
+            action='append',
+            help="Return only these fields (comma separated): {error_msg}"),
+        reqparse.Argument(
+            'exclude',
+            type=check_fields,
+            action='append',
+            help="Don't return these fields (comma separated): {error_msg}")
+    )
+
+
+class SparseFieldsMixin():
+    """Return only the fields selected with the 'fields' or 'exclude'
+    request arguments. The fields which can be selected are declared by the
+    ``selectable_fields`` attribute of the view model: selected fields
+    become a MongoDB projection, so the other fields are neither read nor
+    serialized"""
+
+    # the names of the fields selected by a request (None means all)
+    selected_fields = None
+
+    @classmethod
+    def get_selectable_fields(cls) -> tuple:
+        return getattr(cls.model, 'selectable_fields', ())
+
+    def get_default_fields(self) -> tuple:
+        """Return the fields returned when no field is selected"""
+
+        return self.get_selectable_fields()
+
+    def set_selected_fields(self, kwargs: dict):
+        """Read (and remove) 'fields' and 'exclude' from the parsed request
+        arguments"""
+
+        fields = kwargs.pop('fields', None)
+        exclude = kwargs.pop('exclude', None)
+
+        if not fields and not exclude:
+            return
+
+        selectable = self.get_selectable_fields()
+        selected = set(self.get_default_fields())
+
+        # each argument value is a list of fields
+        if fields:
+            selected = {field for values in fields for field in values}
+
+        if exclude:
+            selected -= {field for values in exclude for field in values}
+
+        self.selected_fields = [
+            field for field in selectable if field in selected]
+
+    def select_fields(self, queryset, extra: list = None):
+        """Add the projection of the selected fields to a queryset
+
+        Args:
+            queryset (QuerySet): a mongoengine queryset
+            extra (list): other fields (mongoengine names) required by the
+                view (ex. sort keys)
+
+        Returns:
+            QuerySet: the queryset with the projection
+        """
+
+        if self.selected_fields is None:
+            return queryset
+
+        names = queryset._document._reverse_db_field_map
+        fields = [names[field] for field in self.selected_fields]
+        fields += extra or []
+
+        # return only the object ids if no field is selected
+        return queryset.only(*(fields or ['id']))
+
+    def filter_fields(self, data: dict) -> dict:
+        """Remove from a serialized object the fields which weren't
+        selected"""
+
+        if self.selected_fields is None:
+            return data
+
+        return {
+            key: value for key, value in data.items()
+            if key == '_id' or key in self.selected_fields
+        }
+
+
+def dump_response(headers: dict, body: bytes) -> bytes:
+    """Serialize the headers and the body of a response"""
+
+    return json.dumps(headers).encode() + b"\n" + body
+
+
+def load_response(value: bytes) -> Response:
+    """Create a response from the value returned by dump_response"""
+
+    headers, body = value.split(b"\n", 1)
+
+    return Response(body, headers=json.loads(headers))
+
+
+def serialize_raw(document_class, documents) -> list:
+    """Serialize raw documents (ex. from ``as_pymongo()``) like the
+    flask-mongoengine JSON encoder serializes document instances
+
+    Args:
+        document_class (Document): the class of the raw documents
+        documents (Iterable[dict]): raw documents
+
+    Returns:
+        list: JSON serializable objects
+    """
+
+    return [
+        json_util._json_convert(data)
+        for data in bulk_to_mongo(document_class, documents)]
+
+
+class ConditionalView(Resource):
+    """Validate and cache responses of read requests. Data change only after
+    an import, so responses are tagged with the data version and the
+    normalized request: clients sending the same tag (or a date after the
+    last import) get a *304 Not Modified* response without querying the
+    database. Responses are also stored in the ``SMARTER_RESPONSE_CACHE``
+    cache (if any) until the next data import"""
+
+    # set to False to disable response validation
+    conditional = True
+
+    # the methods of requests whose responses are cached
+    cache_methods = ('GET', 'HEAD')
+
+    def get_data_version(self):
+        """Return the date of the last data import"""
+
+        return smarter_info.last_updated
+
+    def get_etag(self, version) -> str:
+        """Derive a (weak) ETag from the data version and the requested
+        path with its sorted query arguments"""
+
+        args = url_encode(sorted(request.args.items(multi=True)))
+
+        return hashlib.sha1(
+            f"{version.isoformat()}|{request.path}?{args}".encode()
+        ).hexdigest()
+
+    def is_not_modified(self, etag: str, last_modified) -> bool:
+        if request.if_none_match:
+            return request.if_none_match.contains_weak(etag)
+
+        if request.if_modified_since:
+            return last_modified <= request.if_modified_since
+
+        return False
+
+    def get_cache_key(self) -> str:
+        """Identify a request by method, path, sorted query arguments and
+        body"""
+
+        # HEAD requests are GET requests without a body in response
+        method = 'GET' if request.method == 'HEAD' else request.method
+        args = url_encode(sorted(request.args.items(multi=True)))
+        body = hashlib.sha256(request.get_data()).hexdigest()
+
+        return f"{method} {request.path}?{args} {body}"
+
+    def get_response(self, version, *args, **kwargs):
+        """Return the cached response of a request or dispatch the request
+        and store its response"""
+
+        cache = response_cache
+
+        if cache is None or version is None or \
+                request.method not in self.cache_methods:
+            return super().dispatch_request(*args, **kwargs)
+
+        key = self.get_cache_key()
+        value = cache.lookup(key, version)
+
+        if value is not None:
+            current_app.logger.debug(f"Got '{key}' from {cache.name} cache")
+            response = load_response(value)
+            response.headers['X-Cache'] = 'HIT'
+
+            return response
+
+        response = super().dispatch_request(*args, **kwargs)
+
+        if not isinstance(response, Response) or response.status_code != 200:
+            return response
+
+        headers = {
+            header: response.headers[header]
+            for header in CACHED_HEADERS if header in response.headers
+        }
+
+        if response.is_streamed:
+            # store the response once sent, if not too big
+            def iter_stored(chunks):
+                body, size = [], 0
+
+                for chunk in chunks:
+                    if body is not None:
+                        body.append(chunk)
+                        size += len(chunk)
+
+                        if size > cache.max_item_bytes:
+                            body = None
+
+                    yield chunk
+
+                if body is not None:
+                    cache.store(
+                        key, version, dump_response(headers, b"".join(body)))
+
+            response.response = iter_stored(response.iter_encoded())
+
+        else:
+            cache.store(
+                key, version, dump_response(headers, response.get_data()))
+
+        response.headers['X-Cache'] = 'MISS'
+
+        return response
+
+    def dispatch_request(self, *args, **kwargs):
+        version = self.get_data_version()
+
+        if not self.conditional or version is None or \
+                request.method not in ('GET', 'HEAD'):
+            return self.get_response(version, *args, **kwargs)
+
+        etag = self.get_etag(version)
+
+        # HTTP dates are in UTC and have no microseconds
+        last_modified = version.replace(microsecond=0)
+
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(
+                tzinfo=datetime.timezone.utc)
+
+        if self.is_not_modified(etag, last_modified):
+            response = Response(status=304)
+
+        else:
+            response = self.get_response(version, *args, **kwargs)
+
+            if not isinstance(response, Response) or \
+                    response.status_code != 200:
+                return response
+
+        response.set_etag(etag, weak=True)
+        response.last_modified = last_modified
+
+        # clients can store responses but need to validate them
+        response.cache_control.no_cache = True
+
+        return response
+
+
+class ModelView(SparseFieldsMixin, ConditionalView):
     queryset = None
     model = None
 
+    # return raw documents instead of document instances
+    raw = False
+
+    parser = reqparse.RequestParser()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+
+        if cls.get_selectable_fields():
+            cls.parser = compile_parser(
+                cls.parser, get_fields_arguments(cls.get_selectable_fields()))
+
     def get_object(self, pk, queryset=None):
         """
         Return the object the view is displaying.
@@ -37,6 +423,14 @@ class ModelView(Resource):
         if queryset is None:
             queryset = self.get_queryset()
 
+        if self.get_selectable_fields():
+            # other request arguments are ignored
+            self.set_selected_fields(self.parser.parse_args())
+            queryset = self.select_fields(queryset)
+
+        if self.raw:
+            queryset = queryset.as_pymongo()
+
         if pk is not None:
             try:
                 obj = queryset.get(pk=pk)
@@ -50,6 +444,10 @@ class ModelView(Resource):
                 current_app.logger.error(e)
                 raise MongoEngineValidationError
 
+        if self.raw:
+            obj = self.filter_fields(
+                serialize_raw(queryset._document, [obj])[0])
+
         return obj
 
     def get_queryset(self):
@@ -72,7 +470,12 @@ class ModelView(Resource):
         return self.queryset
 
 
-class ListView(Resource):
+class ListView(SparseFieldsMixin, ConditionalView):
+    """A paginated list of objects. Views are instantiated for each request
+    and could be used by many threads at the same time: request state (the
+    parsed arguments and the object list) is stored only in the instance,
+    class attributes are read-only defaults"""
+
     queryset = None
     model = None
     object_list = None
@@ -80,23 +483,40 @@ class ListView(Resource):
     order_by = None
     page = 1
     size = 10
+    cursor = None
+    count = None
+
+    # return raw documents instead of document instances: items are read
+    # with as_pymongo() and serialized without creating documents
+    raw = False
 
     parser = reqparse.RequestParser()
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+
+        # flask-restful creates a view instance for each request: add the
+        # list arguments once, when the view class is defined
+        arguments = LIST_ARGUMENTS
+
+        if cls.get_selectable_fields():
+            arguments += get_fields_arguments(cls.get_selectable_fields())
+
+        cls.parser = compile_parser(cls.parser, arguments)
+
     def __init__(self) -> None:
         super().__init__()
 
-        # add sort arguments
-        self.parser.add_argument('sort', help="Sort results by this key")
-        self.parser.add_argument('order', help="Sort key order")
+        # request state starts from class defaults
+        cls = type(self)
 
-        # add pagination arguments
-        self.parser.add_argument('page', type=int, help="Results page number")
-        self.parser.add_argument(
-            'size',
-            type=int,
-            help="Number of results per page"
-        )
+        self.object_list = None
+        self.order_by = cls.order_by
+        self.page = cls.page
+        self.size = cls.size
+        self.cursor = cls.cursor
+        self.count = cls.count
+        self.selected_fields = None
 
     def parse_args(self) -> list:
         # reading request parameters
@@ -106,6 +526,8 @@ class ListView(Resource):
         # filter args
         kwargs = {key: val for key, val in kwargs.items() if val}
 
+        self.set_selected_fields(kwargs)
+
         # deal with ordering stuff
         self.order_by = None
 
@@ -125,6 +547,12 @@ class ListView(Resource):
         if 'size' in kwargs:
             self.size = kwargs.pop('size')
 
+        if 'cursor' in kwargs:
+            self.cursor = kwargs.pop('cursor')
+
+        if 'count' in kwargs:
+            self.count = kwargs.pop('count')
+
         return args, kwargs
 
     def get_queryset(self):
@@ -151,35 +579,146 @@ class ListView(Resource):
 
         return queryset
 
+    def get_object_list(self):
+        """Return the paginated queryset (reading raw documents in raw
+        mode)"""
+
+        queryset = self.object_list
+
+        # sort keys are required by keyset pagination
+        extra = []
+
+        if self.cursor and self.order_by:
+            field = self.order_by.lstrip('-').split('__')[0]
+
+            if field not in ['id', 'pk']:
+                extra.append(field)
+
+        queryset = self.select_fields(queryset, extra)
+
+        if self.raw:
+            return queryset.as_pymongo()
+
+        return queryset
+
+    def get_items(self, items) -> list:
+        """Return the objects of a page. Raw documents are serialized like
+        document instances"""
+
+        if self.raw:
+            return [
+                self.filter_fields(item)
+                for item in serialize_raw(self.object_list._document, items)
+            ]
+
+        return items
+
+    def log_query(self, queryset):
+        """Log the collection, the filter, the sort and the collation of a
+        list query"""
+
+        current_app.logger.info(QUERY_LOG_PREFIX + json_util.dumps({
+            "collection": queryset._document._get_collection_name(),
+            "filter": queryset._query,
+            "sort": queryset._ordering or [],
+            "collation": queryset._collation
+        }))
+
     def get_context_data(self):
-        qs = self.object_list
+        qs = self.get_object_list()
 
         current_app.logger.debug(f"Got {qs}")
+        self.log_query(qs)
+
+        if self.cursor:
+            return self.get_cursor_context_data()
 
         # get a shallow copy of an immutable dict
         params = request.args.copy()
 
-        paginated = qs.paginate(page=self.page, per_page=self.size)
+        if self.page < 1:
+            abort(404)
+
+        total = self.get_count(qs, self.count or COUNT_EXACT)
+        offset = (self.page - 1) * self.size
+
+        if total is None:
+            # get one more object to know if there's a next page
+            items = list(qs.skip(offset).limit(self.size + 1))
+            has_next = len(items) > self.size
+            items = items[:self.size]
+            pages = None
+
+        else:
+            items = list(qs.skip(offset).limit(self.size))
+            pages = int(math.ceil(total / float(self.size)))
+            has_next = self.page < pages
+
+        if not items and self.page != 1:
+            abort(404)
 
         next_ = None
         prev = None
 
-        if paginated.has_next:
+        if has_next:
             params['size'] = self.size
             params['page'] = self.page + 1
             next_ = url_for(self.endpoint) + '?' + url_encode(params)
 
-        if paginated.has_prev:
+        if self.page > 1:
             params['size'] = self.size
             params['page'] = self.page - 1
             prev = url_for(self.endpoint) + '?' + url_encode(params)
 
         return {
-            'items': paginated.items,
-            'total': paginated.total,
-            'pages': paginated.pages,
-            'page': paginated.page,
-            'size': paginated.per_page,
+            'items': self.get_items(items),
+            'total': total,
+            'pages': pages,
+            'page': self.page,
+            'size': self.size,
             'next': next_,
             'prev': prev
         }
+
+    def get_count(self, queryset, mode: str):
+        """Count the objects of a queryset. Exact counts are cached until
+        the next data import"""
+
+        if mode == COUNT_NONE:
+            return None
+
+        return count_objects(queryset, mode, self.get_data_version())
+
+    def get_cursor_context_data(self):
+        """Paginate results relying on the last seen object (keyset
+        pagination) instead of skipping documents. Query time doesn't depend
+        on the page number, however it's not possible to jump to a page"""
+
+        queryset = self.get_object_list()
+
+        items, cursor = paginate_by_cursor(
+            queryset, self.order_by, self.cursor, self.size)
+
+        # don't count objects unless explicitly requested
+        total = self.get_count(queryset, self.count or COUNT_NONE)
+
+        next_ = None
+
+        if cursor:
+            # get a shallow copy of an immutable dict
+            params = request.args.copy()
+            params.pop('page', None)
+            params['size'] = self.size
+            params['cursor'] = cursor
+            next_ = url_for(self.endpoint) + '?' + url_encode(params)
+
+        return {
+            'items': self.get_items(items),
+            'total': total,
+            'pages': None,
+            'page': None,
+            'size': self.size,
+            'next': next_,
+            'prev': None,
+            'cursor': cursor
+        }
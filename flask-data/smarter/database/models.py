@@ -7,6 +7,7 @@ Created on Fri May 21 18:09:30 2021
 """
 
 import logging
+import functools
 
 from enum import Enum
 
@@ -16,23 +17,106 @@ from .db import db, DB_ALIAS
 logger = logging.getLogger(__name__)
 
 
-def complement(genotype: str):
-    bases = {
-        "A": "T",
-        "T": "A",
-        "C": "G",
-        "G": "C",
-        "/": "/"
-    }
+# complement table for the genotype alphabet
+COMPLEMENT = str.maketrans("ATCG/", "TAGC/")
+
+# the collation of breed indexes: names and codes are compared ignoring case
+# (and accents). Queries need the same collation to use these indexes
+BREED_COLLATION = {'locale': 'en', 'strength': 1}
 
-    result = ""
+
+@functools.lru_cache(maxsize=1024)
+def complement(genotype: str):
+    """Return the complement of a genotype (ex. 'A/G' -> 'T/C'). Genotypes
+    are few, so complements are cached"""
 
     for base in genotype:
-        result += bases[base]
+        if base not in "ATCG/":
+            raise KeyError(base)
+
+    return genotype.translate(COMPLEMENT)
+
+
+def get_illumina_top(illumina: str, illumina_strand: str):
+    """Return an illumina genotype in illumina top format"""
+
+    if illumina_strand in ['BOT', 'bottom']:
+        return complement(illumina)
+
+    elif (not illumina_strand or
+          illumina_strand in ['TOP', 'top']):
+        return illumina
+
+    else:
+        raise SmarterDBException(
+            f"{illumina_strand} not managed")
+
+
+def normalize_son(document_class, data: dict) -> dict:
+    """Return a raw document (ex. from ``as_pymongo()``) like
+    ``document_class._from_son(data).to_mongo()`` does, without creating
+    the document instance: missing fields are set to their defaults and
+    fields with ``None`` values are removed"""
+
+    result = {}
+
+    for field in document_class._fields.values():
+        if field.db_field in data:
+            value = data[field.db_field]
+
+        else:
+            value = field.default() if callable(field.default) else \
+                field.default
+
+        if value is None:
+            continue
+
+        if isinstance(field, db.EmbeddedDocumentField):
+            value = normalize_son(field.document_type, value)
+
+        elif (isinstance(field, db.ListField) and
+                isinstance(field.field, db.EmbeddedDocumentField)):
+            value = [
+                normalize_son(field.field.document_type, item)
+                for item in value]
+
+        result[field.db_field] = value
+
+    if document_class._dynamic:
+        # to_mongo returns also the attributes not declared in class
+        for key, value in data.items():
+            if key not in result and value is not None:
+                result[key] = value
 
     return result
 
 
+def bulk_to_mongo(document_class, documents):
+    """Serialize raw documents (ex. from ``as_pymongo()``) like
+    :py:meth:`to_mongo` does, without creating a document instance for each
+    of them. The attributes computed by ``to_mongo`` need to be declared as
+    functions in the ``post_processors`` list of ``document_class``: they
+    receive the serialized document and return it
+
+    Args:
+        document_class (Document): the class of the raw documents
+        documents (Iterable[dict]): raw documents
+
+    Yields:
+        dict: the serialized document
+    """
+
+    post_processors = getattr(document_class, 'post_processors', [])
+
+    for document in documents:
+        data = normalize_son(document_class, document)
+
+        for post_processor in post_processors:
+            data = post_processor(data)
+
+        yield data
+
+
 class SmarterDBException(Exception):
     pass
 
@@ -122,7 +206,7 @@ class Breed(db.Document):
                     "code"
                 ],
                 'unique': True,
-                'collation': {'locale': 'en', 'strength': 1}
+                'collation': BREED_COLLATION
             },
             {
                 'fields': [
@@ -130,7 +214,7 @@ class Breed(db.Document):
                     "name"
                 ],
                 'unique': True,
-                'collation': {'locale': 'en', 'strength': 1}
+                'collation': BREED_COLLATION
             }
         ]
     }
@@ -257,10 +341,65 @@ class SampleSpecies(db.Document):
     # for phenotypes
     phenotype = db.EmbeddedDocumentField(Phenotype, default=None)
 
+    # the fields which can be selected in API responses (database names)
+    selectable_fields = (
+        'original_id', 'smarter_id', 'country', 'species', 'breed',
+        'breed_code', 'alias', 'dataset_id', 'type', 'chip_name', 'sex',
+        'locations', 'metadata', 'phenotype', 'father_id', 'mother_id'
+    )
+
     meta = {
         'abstract': True,
         'indexes': [
-            [("locations", "2dsphere")]
+            [("locations", "2dsphere")],
+            # the filters of sample lists and stats: the most selective
+            # equality field first, then the field filtered or sorted with
+            # it more often
+            {
+                'fields': ["breed", "country"]
+            },
+            {
+                'fields': ["breed_code", "country"]
+            },
+            {
+                'fields': ["country", "breed"]
+            },
+            {
+                'fields': ["dataset", "breed"]
+            },
+            {
+                'fields': ["chip_name", "breed"]
+            },
+            {
+                'fields': ["type_", "breed"]
+            },
+            # used to resolve lists of sample names
+            "original_id",
+            {
+                'fields': ["alias"],
+                'partialFilterExpression': {
+                    "alias": {
+                        "$exists": True
+                    }
+                }
+            },
+            {
+                # used to traverse the pedigree of samples
+                'fields': ["father_id"],
+                'partialFilterExpression': {
+                    "father_id": {
+                        "$exists": True
+                    }
+                }
+            },
+            {
+                'fields': ["mother_id"],
+                'partialFilterExpression': {
+                    "mother_id": {
+                        "$exists": True
+                    }
+                }
+            }
         ]
     }
 
@@ -359,16 +498,7 @@ class Location(db.EmbeddedDocument):
     def illumina_top(self):
         """Return genotype in illumina top format"""
 
-        if self.illumina_strand in ['BOT', 'bottom']:
-            return complement(self.illumina)
-
-        elif (not self.illumina_strand or
-              self.illumina_strand in ['TOP', 'top']):
-            return self.illumina
-
-        else:
-            raise SmarterDBException(
-                f"{self.illumina_strand} not managed")
+        return get_illumina_top(self.illumina, self.illumina_strand)
 
     @illumina_top.setter
     def illumina_top(self, genotype: str):
@@ -402,6 +532,32 @@ class Probeset(db.EmbeddedDocument):
         )
 
 
+def add_illumina_top(data: dict) -> dict:
+    """Add the illumina_top attribute to the locations of a serialized
+    variant"""
+
+    for location in data['locations']:
+        location['illumina_top'] = get_illumina_top(
+            location.get('illumina'), location.get('illumina_strand'))
+
+    return data
+
+
+def flat_to_variant(data: dict) -> dict:
+    """Reshape a serialized flat variant like a variant with a single
+    location"""
+
+    # the variant id is the object id
+    data['_id'] = data.pop('variant_id')
+
+    for key in ['assembly', 'chrom', 'position', 'illumina_top']:
+        data.pop(key, None)
+
+    data['locations'] = [data.pop('location', {})]
+
+    return data
+
+
 class VariantSpecies(db.Document):
     rs_id = db.ListField(db.StringField(), default=None)
     chip_name = db.ListField(db.StringField())
@@ -426,10 +582,23 @@ class VariantSpecies(db.Document):
     affy_snp_id = db.StringField()
     cust_id = db.StringField()
 
-    # abstract class with custom indexes
-    # TODO: need a index for position (chrom, position, version)
+    # computed attributes of raw variants (see bulk_to_mongo)
+    post_processors = [add_illumina_top]
+
+    # the fields which can be selected in API responses (database names)
+    selectable_fields = (
+        'rs_id', 'chip_name', 'name', 'sequence', 'illumina_top',
+        'locations', 'sender', 'probesets', 'affy_snp_id', 'cust_id'
+    )
+
+    # abstract class with custom indexes. Variant collections are big:
+    # indexes are not created when a collection is accessed the first time
+    # (this will block a request until index is built) but by calling
+    # 'flask indexes create'
     meta = {
         'abstract': True,
+        'auto_create_index': False,
+        'index_background': True,
         'indexes': [
             {
                 'fields': [
@@ -437,6 +606,17 @@ class VariantSpecies(db.Document):
                     "locations.position"
                 ],
             },
+            {
+                # this index is aligned with the $elemMatch used to select
+                # the variants on an assembly (equality fields before range)
+                'fields': [
+                    "locations.version",
+                    "locations.imported_from",
+                    "locations.chrom",
+                    "locations.position"
+                ],
+                'name': "locations_assembly_position"
+            },
             {
                 'fields': ["affy_snp_id"],
                 'partialFilterExpression': {
@@ -485,3 +665,94 @@ class VariantGoat(VariantSpecies):
         'db_alias': DB_ALIAS,
         'collection': 'variantGoat'
     }
+
+
+class VariantFlat(db.Document):
+    """A variant on a single assembly, with scalar coordinates. Those
+    documents are derived from variants (and updated after each data import)
+    with ``flask variants rebuild-flat``: they can be queried with a range
+    scan on a compact index instead of an ``$elemMatch`` on locations"""
+
+    # the original variant and the assembly of this location
+    variant_id = db.ObjectIdField(required=True)
+    assembly = db.StringField(required=True)
+
+    rs_id = db.ListField(db.StringField(), default=None)
+    chip_name = db.ListField(db.StringField())
+    name = db.StringField()
+    sequence = db.DictField()
+    probesets = db.ListField(
+        db.EmbeddedDocumentField(Probeset), default=None)
+    affy_snp_id = db.StringField()
+    cust_id = db.StringField()
+
+    # the location attributes used to search variants
+    chrom = db.StringField(required=True)
+    position = db.IntField(required=True)
+    illumina_top = db.StringField()
+
+    # the location on this assembly (with illumina_top)
+    location = db.DictField()
+
+    # return raw flat documents like variants (see bulk_to_mongo)
+    post_processors = [flat_to_variant]
+
+    meta = {
+        'abstract': True,
+        'auto_create_index': False,
+        'index_background': True,
+        'indexes': [
+            ["assembly", "chrom", "position"],
+            ["assembly", "name"],
+            ["assembly", "rs_id"],
+            ["assembly", "probesets.probeset_id"],
+            "variant_id"
+        ]
+    }
+
+    def __str__(self):
+        return (
+            f"({self.assembly}) name='{self.name}', "
+            f"{self.chrom}:{self.position} [{self.illumina_top}]")
+
+    def to_mongo(self, *args, **kwargs):
+        """Override flask-mongoengine method: return the same object
+        returned by the variant assembly endpoints"""
+
+        data = super().to_mongo(*args, **kwargs)
+
+        return flat_to_variant(data)
+
+
+class VariantSheepFlat(VariantFlat):
+    meta = {
+        'db_alias': DB_ALIAS,
+        'collection': 'variantSheepFlat'
+    }
+
+
+class VariantGoatFlat(VariantFlat):
+    meta = {
+        'db_alias': DB_ALIAS,
+        'collection': 'variantGoatFlat'
+    }
+
+
+class FlatVariantsInfo(db.Document):
+    """Track the data import a flat variant collection was derived from:
+    flat variants are stale when the database status ``last_updated``
+    changes"""
+
+    # the name of the flat collection
+    id = db.StringField(primary_key=True)
+
+    # the last_updated value of database status when rebuilding
+    last_updated = db.DateTimeField()
+
+    meta = {
+        'db_alias': DB_ALIAS,
+        'collection': 'flatVariantsInfo'
+    }
+
+    def __str__(self):
+        return f"{self.id}: {self.last_updated}"
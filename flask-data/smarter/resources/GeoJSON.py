@@ -6,14 +6,43 @@ Created on Thu Dec 16 12:40:09 2021
 @author: Paolo Cozzi <bunop@libero.it>
 """
 
-from bson import ObjectId
+import math
+
+from bson import ObjectId, json_util
 from bson.errors import InvalidId
 
-from flask import jsonify, current_app, request
-from flask_restful import Resource, reqparse
+from flask import (
+    jsonify, current_app, request, json, Response, stream_with_context)
+from flask_restful import reqparse
 
 from database.models import SampleSheep, SampleGoat
 from resources.errors import MongoEngineValidationError, ObjectsNotExistsError
+from common.streaming import iter_chunks
+from common.cache import VersionedCache
+from common.info import smarter_info
+from common.views import ConditionalView
+
+# read features from database in batches of this size
+FEATURES_BATCH_SIZE = 1000
+
+# the cells of the cluster grid for each side of a map tile
+CELLS_PER_TILE = 8
+
+# the maximum zoom level of the cluster endpoints
+MAX_ZOOM = 20
+
+# the polygons selecting a bounding box need to be smaller than an
+# hemisphere: wider boxes are split in polygons of this width (degrees)
+BBOX_MAX_WIDTH = 120
+
+# the maximum length (degrees) of the polygon edges of a bounding box
+BBOX_EDGE_STEP = 1
+
+# extend bounding box polygons by this margin (degrees)
+BBOX_MARGIN = 0.01
+
+# clusters are the same until the next data import
+cluster_cache = VersionedCache(maxsize=256)
 
 geojson = {
     "$project": {
@@ -64,7 +93,7 @@ class GeoJSONMixin():
         return jsonify(result)
 
 
-class GeoJSONListMixin(Resource):
+class GeoJSONListMixin(ConditionalView):
     model = None
 
     parser = reqparse.RequestParser()
@@ -149,7 +178,9 @@ class GeoJSONListMixin(Resource):
 
         return args, kwargs
 
-    def get_context_data(self):
+    def get_matches(self) -> dict:
+        """Return the $match stage filter from request arguments"""
+
         # parse request arguments and deal with generic arguments
         args, kwargs = self.parse_args()
 
@@ -172,36 +203,293 @@ class GeoJSONListMixin(Resource):
 
         current_app.logger.debug(f"Got matches: '{matches}'")
 
-        collection = self.model.objects().aggregate([
+        return matches
+
+    def iter_features(self, features):
+        """Write a FeatureCollection one feature at a time"""
+
+        yield '{"features": ['
+
+        for i, feature in enumerate(features):
+            if i > 0:
+                yield ", "
+
+            yield json.dumps(feature)
+
+        yield '], "type": "FeatureCollection"}\n'
+
+    def get_context_data(self):
+        matches = self.get_matches()
+
+        # features are read from a cursor and sent while reading: memory
+        # doesn't depend on the number of samples
+        features = self.model.objects().aggregate([
             {"$match": matches},
-            geojson,
-            {"$group": {
-                "_id": None,
-                "features": {
-                    "$push": "$$ROOT"
-                }
-            }},
+            geojson
+        ], batchSize=FEATURES_BATCH_SIZE)
+
+        return Response(
+            stream_with_context(iter_chunks(self.iter_features(features))),
+            mimetype="application/json"
+        )
+
+
+def check_bbox(value: str) -> list:
+    """Parse a bounding box like 'west,south,east,north'"""
+
+    try:
+        west, south, east, north = [float(coord) for coord in value.split(",")]
+
+    except ValueError:
+        raise ValueError(
+            f"'{value}' is not a valid bounding box "
+            "(expected 'west,south,east,north')")
+
+    if not (-180 <= west < east <= 180 and -90 <= south < north <= 90):
+        raise ValueError(f"'{value}' is not a valid bounding box")
+
+    return [west, south, east, north]
+
+
+def check_zoom(value) -> int:
+    """Parse a zoom level"""
+
+    value = int(value)
+
+    if not 0 <= value <= MAX_ZOOM:
+        raise ValueError(f"zoom must be between 0 and {MAX_ZOOM}")
+
+    return value
+
+
+def get_cell_size(zoom: int) -> float:
+    """Return the size in degrees of a cluster grid cell. A map tile of
+    this zoom level is split in CELLS_PER_TILE cells per side"""
+
+    return 360 / 2 ** zoom / CELLS_PER_TILE
+
+
+def snap_bbox(bbox: list, cell: float) -> list:
+    """Extend a bounding box to the borders of the grid cells, so that
+    clusters aren't truncated and close requests share the same cells"""
+
+    west, south, east, north = bbox
+
+    return [
+        max(math.floor((west + 180) / cell) * cell - 180, -180),
+        max(math.floor((south + 90) / cell) * cell - 90, -90),
+        min(math.ceil((east + 180) / cell) * cell - 180, 180),
+        min(math.ceil((north + 90) / cell) * cell - 90, 90)
+    ]
+
+
+def bbox_to_polygons(bbox: list) -> list:
+    """Return GeoJSON Polygons containing a bounding box. MongoDB joins
+    polygon vertices with great circle arcs, which bow towards the poles
+    (so a south edge north of the equator cuts the box): edges are split in
+    short arcs and polygons are extended by a margin. Polygons could select
+    locations outside the box, which need to be filtered by coordinates"""
+
+    west, south, east, north = bbox
+
+    parts = math.ceil((east - west) / BBOX_MAX_WIDTH)
+    width = (east - west) / parts
+
+    south = max(south - BBOX_MARGIN, -90)
+    north = min(north + BBOX_MARGIN, 90)
+    middle = (south + north) / 2
+
+    polygons = []
+
+    for i in range(parts):
+        left = max(west + i * width - BBOX_MARGIN, -180)
+        right = min(west + (i + 1) * width + BBOX_MARGIN, 180)
+
+        steps = math.ceil((right - left) / BBOX_EDGE_STEP)
+        lons = [left + (right - left) * j / steps for j in range(steps + 1)]
+
+        # an edge on a pole is a single vertex
+        bottom = [[lon, south] for lon in lons] if south > -90 else \
+            [[left, -90]]
+        top = [[lon, north] for lon in reversed(lons)] if north < 90 else \
+            [[right, 90]]
+
+        # meridian edges are split in two, since they could join the poles
+        ring = bottom + [[right, middle]] + top + [[left, middle]] + \
+            [bottom[0]]
+
+        polygons.append({"type": "Polygon", "coordinates": [ring]})
+
+    return polygons
+
+
+def add_bbox_filter(matches: dict, bbox: list) -> dict:
+    """Select the samples with a location in the polygons containing a
+    bounding box, using the 2dsphere index"""
+
+    if list(bbox) == [-180, -90, 180, 90]:
+        # every location is in the world
+        return matches
+
+    conditions = [
+        {"locations": {"$geoWithin": {"$geometry": polygon}}}
+        for polygon in bbox_to_polygons(bbox)
+    ]
+
+    if len(conditions) == 1:
+        matches.update(conditions[0])
+
+    else:
+        matches["$or"] = conditions
+
+    return matches
+
+
+class GeoJSONClusterMixin(GeoJSONListMixin):
+    """Aggregate sample locations in the cells of a degree grid. The grid
+    size depends on zoom level"""
+
+    parser = GeoJSONListMixin.parser.copy()
+    parser.add_argument(
+        'bbox',
+        type=check_bbox,
+        help="Bounding box as 'west,south,east,north': {error_msg}")
+    parser.add_argument(
+        'zoom',
+        type=check_zoom,
+        default=0,
+        help="Map zoom level: {error_msg}")
+
+    def parse_args(self) -> list:
+        args, kwargs = super().parse_args()
+
+        self.zoom = kwargs.pop('zoom', 0)
+        self.bbox = kwargs.pop('bbox', None)
+
+        return args, kwargs
+
+    def get_pipeline(self, matches: dict, cell: float, bbox: list) -> list:
+        pipeline = [
+            {"$match": matches},
+            {"$unwind": "$locations.coordinates"},
             {"$project": {
-                "_id": 0,
-                "type": "FeatureCollection",
-                "features": "$features"
+                "breed": 1,
+                "country": 1,
+                "lon": {"$arrayElemAt": ["$locations.coordinates", 0]},
+                "lat": {"$arrayElemAt": ["$locations.coordinates", 1]}
             }}
-        ])
+        ]
 
-        try:
-            result = next(collection)
+        if bbox:
+            # a sample could have other locations outside the bounding box
+            west, south, east, north = bbox
 
-        except StopIteration as exc:
-            current_app.logger.debug(f"No results for {matches}: {exc}")
-            result = {
-                "type": "FeatureCollection",
-                "features": []
-            }
+            pipeline.append({"$match": {
+                "lon": {"$gte": west, "$lte": east},
+                "lat": {"$gte": south, "$lte": north}
+            }})
+
+        pipeline += [
+            {"$project": {
+                "breed": 1,
+                "country": 1,
+                "lon": 1,
+                "lat": 1,
+                "x": {"$floor": {
+                    "$divide": [{"$add": ["$lon", 180]}, cell]}},
+                "y": {"$floor": {
+                    "$divide": [{"$add": ["$lat", 90]}, cell]}}
+            }},
+            {"$group": {
+                "_id": {
+                    "x": "$x",
+                    "y": "$y",
+                    "breed": "$breed",
+                    "country": "$country"
+                },
+                "count": {"$sum": 1},
+                "lon": {"$sum": "$lon"},
+                "lat": {"$sum": "$lat"}
+            }},
+            {"$group": {
+                "_id": {"x": "$_id.x", "y": "$_id.y"},
+                "count": {"$sum": "$count"},
+                "lon": {"$sum": "$lon"},
+                "lat": {"$sum": "$lat"},
+                "groups": {"$push": {
+                    "breed": "$_id.breed",
+                    "country": "$_id.country",
+                    "count": "$count"
+                }}
+            }},
+            {"$sort": {"_id.x": 1, "_id.y": 1}}
+        ]
+
+        return pipeline
+
+    def get_clusters(self, matches: dict, cell: float, bbox: list) -> dict:
+        features = []
+
+        for cluster in self.model.objects().aggregate(
+                self.get_pipeline(matches, cell, bbox)):
+            breeds = {}
+            countries = {}
+
+            for group in cluster["groups"]:
+                breed, country = group["breed"], group["country"]
+                breeds[breed] = breeds.get(breed, 0) + group["count"]
+                countries[country] = countries.get(country, 0) + \
+                    group["count"]
+
+            features.append({
+                "type": "Feature",
+                "geometry": {
+                    "type": "Point",
+                    "coordinates": [
+                        cluster["lon"] / cluster["count"],
+                        cluster["lat"] / cluster["count"]
+                    ]
+                },
+                "properties": {
+                    "count": cluster["count"],
+                    "cell": [
+                        int(cluster["_id"]["x"]), int(cluster["_id"]["y"])],
+                    "breeds": breeds,
+                    "countries": countries
+                }
+            })
+
+        return {
+            "type": "FeatureCollection",
+            "features": features
+        }
+
+    def get_context_data(self):
+        matches = self.get_matches()
+
+        cell = get_cell_size(self.zoom)
+        bbox = snap_bbox(self.bbox, cell) if self.bbox else None
+
+        if bbox and "$geoWithin" not in matches["locations"]:
+            # locations are filtered again by coordinates in the pipeline
+            matches = add_bbox_filter(matches, bbox)
+
+        key = (
+            self.model._get_collection_name(),
+            json_util.dumps(matches, sort_keys=True),
+            self.zoom,
+            tuple(bbox) if bbox else None
+        )
+
+        result = cluster_cache.get(
+            key,
+            smarter_info.last_updated,
+            lambda: self.get_clusters(matches, cell, bbox))
 
         return jsonify(result)
 
 
-class SampleSheepGeoJSONApi(GeoJSONMixin, Resource):
+class SampleSheepGeoJSONApi(GeoJSONMixin, ConditionalView):
     model = SampleSheep
 
     def get(self, id_):
@@ -228,7 +516,7 @@ class SampleSheepGeoJSONApi(GeoJSONMixin, Resource):
         return super().get(id_)
 
 
-class SampleGoatGeoJSONApi(GeoJSONMixin, Resource):
+class SampleGoatGeoJSONApi(GeoJSONMixin, ConditionalView):
     model = SampleGoat
 
     def get(self, id_):
@@ -255,7 +543,7 @@ class SampleGoatGeoJSONApi(GeoJSONMixin, Resource):
         return super().get(id_)
 
 
-class SampleSheepGeoJSONListApi(GeoJSONListMixin, Resource):
+class SampleSheepGeoJSONListApi(GeoJSONListMixin, ConditionalView):
     model = SampleSheep
 
     def get(self):
@@ -361,7 +649,7 @@ class SampleSheepGeoJSONListApi(GeoJSONListMixin, Resource):
         return self.get_context_data()
 
 
-class SampleGoatGeoJSONListApi(GeoJSONListMixin, Resource):
+class SampleGoatGeoJSONListApi(GeoJSONListMixin, ConditionalView):
     model = SampleGoat
 
     def get(self):
@@ -467,3 +755,155 @@ class SampleGoatGeoJSONListApi(GeoJSONListMixin, Resource):
         current_app.logger.debug(f"Got a POST request: {request.json}")
 
         return self.get_context_data()
+
+
+class SampleSheepGeoJSONClusterApi(GeoJSONClusterMixin, ConditionalView):
+    model = SampleSheep
+
+    def get(self):
+        """
+        Get clustered Sheep sample locations
+        ---
+        tags:
+          - GeoJSON
+        description: >
+          Aggregate sheep sample locations in the cells of a grid. Each
+          cluster is a Point (the mean of the locations) with the number of
+          locations by breed and country
+        parameters:
+          - name: bbox
+            in: query
+            type: string
+            description: Bounding box as 'west,south,east,north'
+          - name: zoom
+            in: query
+            type: integer
+            minimum: 0
+            maximum: 20
+            description: Map zoom level (grid size depends on it)
+          - name: breed
+            in: query
+            type: array
+            items:
+              type: string
+            collectionFormat: multi
+            description: Breed name
+          - name: breed_code
+            in: query
+            type: array
+            items:
+              type: string
+            collectionFormat: multi
+            description: Breed code
+          - name: chip_name
+            in: query
+            type: array
+            items:
+              type: string
+            collectionFormat: multi
+            description: Chip name
+          - name: country
+            in: query
+            type: array
+            items:
+              type: string
+            collectionFormat: multi
+            description: Country where sample was collected
+          - name: dataset
+            in: query
+            type: array
+            items:
+              type: string
+            collectionFormat: multi
+            description: The dataset ObjectID
+          - name: type
+            in: query
+            type: string
+            enum: ['foreground', 'background']
+            description: Dataset type
+        responses:
+            '200':
+              description: GeoJSON FeatureCollection of clusters
+              content:
+                application/json:
+                  schema:
+                    type: object
+        """
+
+        return self.get_context_data()
+
+
+class SampleGoatGeoJSONClusterApi(GeoJSONClusterMixin, ConditionalView):
+    model = SampleGoat
+
+    def get(self):
+        """
+        Get clustered Goat sample locations
+        ---
+        tags:
+          - GeoJSON
+        description: >
+          Aggregate goat sample locations in the cells of a grid. Each
+          cluster is a Point (the mean of the locations) with the number of
+          locations by breed and country
+        parameters:
+          - name: bbox
+            in: query
+            type: string
+            description: Bounding box as 'west,south,east,north'
+          - name: zoom
+            in: query
+            type: integer
+            minimum: 0
+            maximum: 20
+            description: Map zoom level (grid size depends on it)
+          - name: breed
+            in: query
+            type: array
+            items:
+              type: string
+            collectionFormat: multi
+            description: Breed name
+          - name: breed_code
+            in: query
+            type: array
+            items:
+              type: string
+            collectionFormat: multi
+            description: Breed code
+          - name: chip_name
+            in: query
+            type: array
+            items:
+              type: string
+            collectionFormat: multi
+            description: Chip name
+          - name: country
+            in: query
+            type: array
+            items:
+              type: string
+            collectionFormat: multi
+            description: Country where sample was collected
+          - name: dataset
+            in: query
+            type: array
+            items:
+              type: string
+            collectionFormat: multi
+            description: The dataset ObjectID
+          - name: type
+            in: query
+            type: string
+            enum: ['foreground', 'background']
+            description: Dataset type
+        responses:
+            '200':
+              description: GeoJSON FeatureCollection of clusters
+              content:
+                application/json:
+                  schema:
+                    type: object
+        """
+
+        return self.get_context_data()
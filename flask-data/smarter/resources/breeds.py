@@ -10,15 +10,21 @@ import re
 
 from mongoengine.queryset import Q
 from flask import jsonify, current_app
-from flask_restful import reqparse
+from flask_restful import reqparse, inputs
 
-from database.models import Breed
-from common.views import ListView, ModelView
+from database.models import Breed, BREED_COLLATION
+from common.autocomplete import breed_index
+from common.info import smarter_info
+from common.views import ListView, ModelView, ConditionalView
+
+# the maximum number of breed suggestions
+AUTOCOMPLETE_MAX_LIMIT = 50
 
 
 class BreedListApi(ListView):
     endpoint = 'breedlistapi'
     model = Breed
+    raw = True
 
     parser = reqparse.RequestParser()
     parser.add_argument('species', help="Species name")
@@ -57,6 +63,10 @@ class BreedListApi(ListView):
         else:
             queryset = self.model.objects.all()
 
+        # species, name and code lookups are case insensitive and can use
+        # the breed indexes only with their collation
+        queryset = queryset.collation(BREED_COLLATION)
+
         if self.order_by:
             queryset = queryset.order_by(self.order_by)
 
@@ -81,14 +91,14 @@ class BreedListApi(ListView):
             items:
               type: string
             collectionFormat: multi
-            description: Breed name
+            description: Breed name (case insensitive)
           - name: code
             in: query
             type: array
             items:
               type: string
             collectionFormat: multi
-            description: Breed code
+            description: Breed code (case insensitive)
           - name: search
             in: query
             type: string
@@ -108,6 +118,7 @@ class BreedListApi(ListView):
 
 class BreedApi(ModelView):
     model = Breed
+    raw = True
 
     def get(self, id_):
         """
@@ -132,3 +143,90 @@ class BreedApi(ModelView):
         """
         breed = self.get_object(id_)
         return jsonify(breed)
+
+
+def check_limit(value) -> int:
+    value = int(value)
+
+    if not 1 <= value <= AUTOCOMPLETE_MAX_LIMIT:
+        raise ValueError(
+            f"limit must be between 1 and {AUTOCOMPLETE_MAX_LIMIT}")
+
+    return value
+
+
+class BreedAutocompleteApi(ConditionalView):
+    parser = reqparse.RequestParser()
+    parser.add_argument(
+        'q', required=True, help="The text to complete: {error_msg}")
+    parser.add_argument('species', help="Species name")
+    parser.add_argument(
+        'limit',
+        type=check_limit,
+        default=10,
+        help="Number of suggestions: {error_msg}")
+    parser.add_argument(
+        'fuzzy',
+        type=inputs.boolean,
+        default=True,
+        help="Suggest similar names: {error_msg}")
+
+    def get_index(self):
+        """Return the breed index, built again after a data import"""
+
+        version = smarter_info.last_updated
+
+        if not breed_index.is_valid(version):
+            current_app.logger.info("Indexing breeds")
+            breed_index.build(Breed.objects.as_pymongo(), version)
+
+        return breed_index
+
+    def get(self):
+        """
+        Suggest breeds while typing
+        ---
+        tags:
+          - Breeds
+        description: >
+          Return the breeds having a name, code or alias starting with the
+          provided text (or a similar name). Best matches come first
+        parameters:
+          - name: q
+            in: query
+            type: string
+            required: true
+            description: The text to complete
+          - name: species
+            in: query
+            type: string
+            enum: ['Sheep', 'Goat']
+            description: The desired species
+          - name: limit
+            in: query
+            type: integer
+            minimum: 1
+            maximum: 50
+            description: Number of suggestions (default 10)
+          - name: fuzzy
+            in: query
+            type: boolean
+            description: Suggest similar names (default true)
+        responses:
+            '200':
+              description: Breeds suggestions
+              content:
+                application/json:
+                  schema:
+                    type: object
+        """
+
+        kwargs = self.parser.parse_args(strict=True)
+
+        items = self.get_index().search(
+            kwargs['q'],
+            species=kwargs['species'],
+            limit=kwargs['limit'],
+            fuzzy=kwargs['fuzzy'])
+
+        return jsonify(items=items)
@@ -15,6 +15,7 @@ from common.views import ListView, ModelView
 
 class SupportedChipApi(ModelView):
     model = SupportedChip
+    raw = True
 
     def get(self, id_):
         """
@@ -43,6 +44,7 @@ class SupportedChipApi(ModelView):
 
 class SupportedChipListApi(ListView):
     model = SupportedChip
+    raw = True
     endpoint = "supportedchiplistapi"
 
     parser = reqparse.RequestParser()
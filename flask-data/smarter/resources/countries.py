@@ -19,6 +19,7 @@ from common.views import ListView, ModelView
 class CountryListApi(ListView):
     endpoint = 'countrylistapi'
     model = Country
+    raw = True
 
     def check_alpha2(value):
         if len(value) != 2:
@@ -121,6 +122,7 @@ class CountryListApi(ListView):
 
 class CountryApi(ModelView):
     model = Country
+    raw = True
 
     def get(self, id_):
         """
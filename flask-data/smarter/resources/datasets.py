@@ -6,19 +6,21 @@ Created on Mon May 24 15:50:50 2021
 @author: Paolo Cozzi <paolo.cozzi@ibba.cnr.it>
 """
 
-import re
-
+from bson import ObjectId
 from mongoengine.queryset import Q
 from flask import jsonify, current_app
 from flask_restful import reqparse
 
 from database.models import Dataset
+from common.info import smarter_info
+from common.search import dataset_index
 from common.views import ListView, ModelView
 
 
 class DatasetListApi(ListView):
     endpoint = 'datasetlistapi'
     model = Dataset
+    raw = True
 
     parser = reqparse.RequestParser()
     parser.add_argument('species', help="Species name")
@@ -34,6 +36,22 @@ class DatasetListApi(ListView):
         action='append',
         help="Chip name")
 
+    # the matched contents by dataset ObjectId of a search
+    search_matches = None
+
+    def get_index(self):
+        """Return the dataset index, built again after a data import"""
+
+        version = smarter_info.last_updated
+
+        if not dataset_index.is_valid(version):
+            current_app.logger.info("Indexing datasets")
+            dataset_index.build(
+                Dataset.objects.only('file', 'contents').as_pymongo(),
+                version)
+
+        return dataset_index
+
     def get_queryset(self):
         # parse request arguments and deal with generic arguments
         args, kwargs = self.parse_args()
@@ -53,9 +71,9 @@ class DatasetListApi(ListView):
 
         # deal with search fields
         if 'search' in kwargs:
-            pattern = kwargs.pop("search")
-            pattern = re.compile(pattern, re.IGNORECASE)
-            args = [Q(file=pattern) | Q(contents=pattern)]
+            query = kwargs.pop("search")
+            self.search_matches = self.get_index().search(query)
+            args = [Q(id__in=list(self.search_matches))]
 
         current_app.logger.info(f"{args}, {kwargs}")
 
@@ -70,6 +88,18 @@ class DatasetListApi(ListView):
 
         return queryset
 
+    def get_items(self, items) -> list:
+        """Add the matched contents to searched datasets"""
+
+        items = super().get_items(items)
+
+        if self.search_matches is not None:
+            for item in items:
+                item['matches'] = self.search_matches[
+                    ObjectId(item['_id']['$oid'])]
+
+        return items
+
     def get(self):
         """
         Get information on datasets
@@ -94,7 +124,10 @@ class DatasetListApi(ListView):
           - name: search
             in: query
             type: string
-            description: Search dataset or content using this pattern
+            description: >
+              Search datasets by file name or contents. Every word must
+              match the beginning of a file name or content word: matched
+              contents are returned in the 'matches' attribute
           - name: chip_name
             in: query
             type: array
@@ -117,6 +150,7 @@ class DatasetListApi(ListView):
 
 class DatasetApi(ModelView):
     model = Dataset
+    raw = True
 
     def get(self, id_):
         """
@@ -25,6 +25,10 @@ class ObjectsNotExistsError(HTTPException):
     pass
 
 
+class InvalidCursorError(HTTPException):
+    pass
+
+
 errors = {
     "InternalServerError": {
         "message": "Something went wrong",
@@ -46,5 +50,9 @@ errors = {
     "ObjectsNotExistsError": {
         "message": "Object does not exist",
         "status": 404
+    },
+    "InvalidCursorError": {
+        "message": "Invalid pagination cursor",
+        "status": 400
     }
 }
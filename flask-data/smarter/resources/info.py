@@ -2,7 +2,9 @@
 from flask import jsonify
 
 from database.models import SmarterInfo
+from common.info import smarter_info
 from common.views import ModelView
+from resources.errors import ObjectsNotExistsError
 
 
 class SmarterInfoApi(ModelView):
@@ -18,5 +20,9 @@ class SmarterInfoApi(ModelView):
           200:
             description: SMARTER Database status
         """
-        info = self.get_object(pk='smarter')
+        info = smarter_info.get()
+
+        if info is None:
+            raise ObjectsNotExistsError
+
         return jsonify(info)
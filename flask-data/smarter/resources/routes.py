@@ -7,19 +7,26 @@ Created on Mon May 24 11:22:59 2021
 """
 
 from .auth import LoginApi
-from .breeds import BreedListApi, BreedApi
+from .breeds import BreedListApi, BreedApi, BreedAutocompleteApi
 from .chips import SupportedChipApi, SupportedChipListApi
 from .countries import CountryListApi, CountryApi
 from .datasets import DatasetListApi, DatasetApi
 from .info import SmarterInfoApi
 from .samples import (
-    SampleSheepApi, SampleSheepListApi, SampleGoatApi, SampleGoatListApi)
+    SampleSheepApi, SampleSheepListApi, SampleGoatApi, SampleGoatListApi,
+    SampleSheepStatsApi, SampleGoatStatsApi, SampleSheepPedigreeApi,
+    SampleGoatPedigreeApi, SampleSheepBatchApi, SampleGoatBatchApi)
 from .GeoJSON import (
     SampleSheepGeoJSONApi, SampleGoatGeoJSONApi, SampleSheepGeoJSONListApi,
-    SampleGoatGeoJSONListApi)
+    SampleGoatGeoJSONListApi, SampleSheepGeoJSONClusterApi,
+    SampleGoatGeoJSONClusterApi)
+from .tiles import SampleSheepTileApi, SampleGoatTileApi
 from .variants import (
     VariantSheepApi, VariantGoatApi, VariantSheepOAR3Api, VariantSheepOAR4Api,
-    VariantGoatCHI1Api, VariantGoatARS1Api)
+    VariantGoatCHI1Api, VariantGoatARS1Api, VariantSheepOAR3ExportApi,
+    VariantSheepOAR4ExportApi, VariantGoatCHI1ExportApi,
+    VariantGoatARS1ExportApi, VariantSheepOAR3BatchApi,
+    VariantSheepOAR4BatchApi, VariantGoatCHI1BatchApi, VariantGoatARS1BatchApi)
 
 
 def initialize_routes(api):
@@ -28,6 +35,8 @@ def initialize_routes(api):
     api.add_resource(SmarterInfoApi, '/smarter-api/info')
 
     api.add_resource(BreedListApi, '/smarter-api/breeds')
+    api.add_resource(
+        BreedAutocompleteApi, '/smarter-api/breeds/autocomplete')
     api.add_resource(BreedApi, '/smarter-api/breeds/<string:id_>')
 
     api.add_resource(SupportedChipListApi, '/smarter-api/supported-chips')
@@ -41,7 +50,12 @@ def initialize_routes(api):
     api.add_resource(DatasetApi, '/smarter-api/datasets/<string:id_>')
 
     api.add_resource(SampleSheepListApi, '/smarter-api/samples/sheep')
+    api.add_resource(SampleSheepStatsApi, '/smarter-api/samples/sheep/stats')
+    api.add_resource(SampleSheepBatchApi, '/smarter-api/samples/sheep/batch')
     api.add_resource(SampleSheepApi, '/smarter-api/samples/sheep/<string:id_>')
+    api.add_resource(
+        SampleSheepPedigreeApi,
+        '/smarter-api/samples/sheep/<string:id_>/pedigree')
 
     api.add_resource(
         SampleSheepGeoJSONListApi,
@@ -49,9 +63,20 @@ def initialize_routes(api):
     api.add_resource(
         SampleSheepGeoJSONApi,
         '/smarter-api/samples.geojson/sheep/<string:id_>')
+    api.add_resource(
+        SampleSheepGeoJSONClusterApi,
+        '/smarter-api/samples.clusters/sheep')
+    api.add_resource(
+        SampleSheepTileApi,
+        '/smarter-api/samples.mvt/sheep/<int:z>/<int:x>/<int:y>')
 
     api.add_resource(SampleGoatListApi, '/smarter-api/samples/goat')
+    api.add_resource(SampleGoatStatsApi, '/smarter-api/samples/goat/stats')
+    api.add_resource(SampleGoatBatchApi, '/smarter-api/samples/goat/batch')
     api.add_resource(SampleGoatApi, '/smarter-api/samples/goat/<string:id_>')
+    api.add_resource(
+        SampleGoatPedigreeApi,
+        '/smarter-api/samples/goat/<string:id_>/pedigree')
 
     api.add_resource(
         SampleGoatGeoJSONListApi,
@@ -59,12 +84,34 @@ def initialize_routes(api):
     api.add_resource(
         SampleGoatGeoJSONApi,
         '/smarter-api/samples.geojson/goat/<string:id_>')
+    api.add_resource(
+        SampleGoatGeoJSONClusterApi,
+        '/smarter-api/samples.clusters/goat')
+    api.add_resource(
+        SampleGoatTileApi,
+        '/smarter-api/samples.mvt/goat/<int:z>/<int:x>/<int:y>')
 
     api.add_resource(VariantSheepOAR3Api, '/smarter-api/variants/sheep/OAR3')
     api.add_resource(VariantSheepOAR4Api, '/smarter-api/variants/sheep/OAR4')
+    api.add_resource(
+        VariantSheepOAR3ExportApi, '/smarter-api/variants/sheep/OAR3/export')
+    api.add_resource(
+        VariantSheepOAR3BatchApi, '/smarter-api/variants/sheep/OAR3/batch')
+    api.add_resource(
+        VariantSheepOAR4ExportApi, '/smarter-api/variants/sheep/OAR4/export')
+    api.add_resource(
+        VariantSheepOAR4BatchApi, '/smarter-api/variants/sheep/OAR4/batch')
     api.add_resource(
         VariantSheepApi, '/smarter-api/variants/sheep/<string:id_>')
 
     api.add_resource(VariantGoatCHI1Api, '/smarter-api/variants/goat/CHI1')
     api.add_resource(VariantGoatARS1Api, '/smarter-api/variants/goat/ARS1')
+    api.add_resource(
+        VariantGoatCHI1ExportApi, '/smarter-api/variants/goat/CHI1/export')
+    api.add_resource(
+        VariantGoatCHI1BatchApi, '/smarter-api/variants/goat/CHI1/batch')
+    api.add_resource(
+        VariantGoatARS1ExportApi, '/smarter-api/variants/goat/ARS1/export')
+    api.add_resource(
+        VariantGoatARS1BatchApi, '/smarter-api/variants/goat/ARS1/batch')
     api.add_resource(VariantGoatApi, '/smarter-api/variants/goat/<string:id_>')
@@ -6,11 +6,51 @@ Created on Fri Jun 18 16:04:11 2021
 @author: Paolo Cozzi <paolo.cozzi@ibba.cnr.it>
 """
 
-from flask import jsonify, current_app
-from flask_restful import reqparse
+from bson import json_util, ObjectId
+from flask import jsonify, current_app, json, Response, stream_with_context
+from flask_restful import reqparse, inputs
 
 from database.models import SampleGoat, SampleSheep
-from common.views import ListView, ModelView
+from common.cache import VersionedCache
+from common.info import smarter_info
+from common.views import ListView, ModelView, ConditionalView, serialize_raw
+from common.streaming import iter_chunks
+from resources.errors import ObjectsNotExistsError, MongoEngineValidationError
+
+# the facets of sample statistics and the counted fields
+STATS_FACETS = {
+    'breed': '$breed',
+    'breed_code': '$breed_code',
+    'country': '$country',
+    'chip_name': '$chip_name',
+    'dataset': '$dataset_id',
+    'sex': '$sex',
+    'type': '$type'
+}
+
+# statistics are the same until the next data import
+stats_cache = VersionedCache(maxsize=256)
+
+# the parent fields of samples and the relation they describe
+PARENT_FIELDS = {
+    'father_id': 'father',
+    'mother_id': 'mother'
+}
+
+# the sample fields returned in pedigree nodes
+PEDIGREE_FIELDS = ('smarter_id', 'original_id', 'breed', 'breed_code', 'sex')
+
+# the maximum number of generations of a pedigree
+MAX_PEDIGREE_DEPTH = 10
+
+# the sample keys of a batch request
+BATCH_KEYS = ('smarter_id', 'original_id', 'alias')
+
+# the maximum number of values of a batch request
+BATCH_MAX_VALUES = 50000
+
+# search samples with $in queries of this size
+BATCH_CHUNK_SIZE = 1000
 
 
 class SampleListMixin():
@@ -115,6 +155,7 @@ class SampleListMixin():
 
 class SampleSheepApi(ModelView):
     model = SampleSheep
+    raw = True
 
     def get(self, id_):
         """
@@ -144,6 +185,7 @@ class SampleSheepApi(ModelView):
 class SampleSheepListApi(SampleListMixin, ListView):
     endpoint = 'samplesheeplistapi'
     model = SampleSheep
+    raw = True
 
     def get(self):
         """
@@ -273,6 +315,7 @@ class SampleSheepListApi(SampleListMixin, ListView):
 
 class SampleGoatApi(ModelView):
     model = SampleGoat
+    raw = True
 
     def get(self, id_):
         """
@@ -302,6 +345,7 @@ class SampleGoatApi(ModelView):
 class SampleGoatListApi(SampleListMixin, ListView):
     endpoint = 'samplegoatlistapi'
     model = SampleGoat
+    raw = True
 
     def get(self):
         """
@@ -427,3 +471,677 @@ class SampleGoatListApi(SampleListMixin, ListView):
         self.object_list = self.get_queryset()
         data = self.get_context_data()
         return jsonify(**data)
+
+
+class SampleStatsMixin(SampleListMixin):
+    """Count samples by breed, country, chip, dataset, sex and type with a
+    single aggregation"""
+
+    order_by = None
+
+    # don't add the ListView pagination arguments
+    parser = SampleListMixin.parser.copy()
+
+    def parse_args(self) -> list:
+        # reading request parameters
+        kwargs = self.parser.parse_args(strict=True)
+
+        # filter args
+        kwargs = {key: val for key, val in kwargs.items() if val}
+
+        return [], kwargs
+
+    def get_pipeline(self, query: dict) -> list:
+        facets = {
+            name: [
+                {"$group": {"_id": field, "count": {"$sum": 1}}},
+                {"$sort": {"count": -1, "_id": 1}},
+                {"$project": {"_id": 0, "value": "$_id", "count": 1}}
+            ]
+            for name, field in STATS_FACETS.items()
+        }
+
+        facets["total"] = [{"$count": "count"}]
+
+        return [
+            {"$match": query},
+            {"$facet": facets}
+        ]
+
+    def get_stats(self, query: dict) -> dict:
+        result = next(self.model.objects().aggregate(
+            self.get_pipeline(query)))
+
+        total = result.pop("total")
+        result["total"] = total[0]["count"] if total else 0
+
+        return result
+
+    def get_context_data(self):
+        # the mongodb filter of the sample list endpoint
+        query = self.get_queryset()._query
+
+        current_app.logger.debug(f"Got query: {query}")
+
+        key = (
+            self.model._get_collection_name(),
+            json_util.dumps(query, sort_keys=True)
+        )
+
+        result = stats_cache.get(
+            key,
+            smarter_info.last_updated,
+            lambda: self.get_stats(query))
+
+        return jsonify(result)
+
+
+class SampleSheepStatsApi(SampleStatsMixin, ConditionalView):
+    model = SampleSheep
+
+    def get(self):
+        """
+        Get statistics on Sheep samples
+        ---
+        tags:
+          - Samples
+        description: >
+          Count the Sheep samples matching a query by breed, breed code,
+          country, chip, dataset, sex and type
+        parameters:
+          - name: breed
+            in: query
+            type: array
+            items:
+              type: string
+            collectionFormat: multi
+            description: Breed name
+          - name: breed_code
+            in: query
+            type: array
+            items:
+              type: string
+            collectionFormat: multi
+            description: Breed code
+          - name: chip_name
+            in: query
+            type: array
+            items:
+              type: string
+            collectionFormat: multi
+            description: Chip name
+          - name: country
+            in: query
+            type: array
+            items:
+              type: string
+            collectionFormat: multi
+            description: Country where sample was collected
+          - name: original_id
+            in: query
+            type: string
+            description: The original sample name in source dataset
+          - name: alias
+            in: query
+            type: string
+            description: The sample alias in source dataset
+          - name: smarter_id
+            in: query
+            type: string
+            description: The smarter sample ID
+          - name: dataset
+            in: query
+            type: array
+            items:
+              type: string
+            collectionFormat: multi
+            description: The dataset ObjectID
+          - name: type
+            in: query
+            type: string
+            enum: ['foreground', 'background']
+            description: Dataset type
+          - name: locations__exists
+            in: query
+            type: bool
+            description: Filter samples with a physical location
+              (GPS coordinates)
+          - name: phenotype__exists
+            in: query
+            type: bool
+            description: Filter samples with a phenotype (any)
+        responses:
+            '200':
+              description: The number of samples for each facet value
+              content:
+                application/json:
+                  schema:
+                    type: object
+        """
+
+        return self.get_context_data()
+
+    def post(self):
+        """
+        Get statistics on Sheep samples
+        ---
+        tags:
+          - Samples
+
+        description: Count Sheep samples in a given area
+
+        parameters:
+          - in: body
+            name: body
+            description: Execute a gis query
+            schema:
+              properties:
+                geo_within_polygon:
+                  type: object
+                  description: A Polygon feature
+                  properties:
+                    type:
+                      type: string
+                    properties:
+                      type: object
+                    geometry:
+                      type: object
+                geo_within_sphere:
+                  type: array
+                  description:
+                    A list with coordinates and radius in Km
+                    like [[9.18, 45.46], 10]
+                  items: []
+
+        responses:
+          200:
+            description: The number of samples for each facet value
+            content:
+              application/json:
+                schema:
+                  type: object
+        """
+
+        return self.get_context_data()
+
+
+class SampleGoatStatsApi(SampleStatsMixin, ConditionalView):
+    model = SampleGoat
+
+    def get(self):
+        """
+        Get statistics on Goat samples
+        ---
+        tags:
+          - Samples
+        description: >
+          Count the Goat samples matching a query by breed, breed code,
+          country, chip, dataset, sex and type
+        parameters:
+          - name: breed
+            in: query
+            type: array
+            items:
+              type: string
+            collectionFormat: multi
+            description: Breed name
+          - name: breed_code
+            in: query
+            type: array
+            items:
+              type: string
+            collectionFormat: multi
+            description: Breed code
+          - name: chip_name
+            in: query
+            type: array
+            items:
+              type: string
+            collectionFormat: multi
+            description: Chip name
+          - name: country
+            in: query
+            type: array
+            items:
+              type: string
+            collectionFormat: multi
+            description: Country where sample was collected
+          - name: original_id
+            in: query
+            type: string
+            description: The original sample name in source dataset
+          - name: alias
+            in: query
+            type: string
+            description: The sample alias in source dataset
+          - name: smarter_id
+            in: query
+            type: string
+            description: The smarter sample ID
+          - name: dataset
+            in: query
+            type: array
+            items:
+              type: string
+            collectionFormat: multi
+            description: The dataset ObjectID
+          - name: type
+            in: query
+            type: string
+            enum: ['foreground', 'background']
+            description: Dataset type
+          - name: locations__exists
+            in: query
+            type: bool
+            description: Filter samples with a physical location
+              (GPS coordinates)
+          - name: phenotype__exists
+            in: query
+            type: bool
+            description: Filter samples with a phenotype (any)
+        responses:
+            '200':
+              description: The number of samples for each facet value
+              content:
+                application/json:
+                  schema:
+                    type: object
+        """
+
+        return self.get_context_data()
+
+    def post(self):
+        """
+        Get statistics on Goat samples
+        ---
+        tags:
+          - Samples
+
+        description: Count Goat samples in a given area
+
+        parameters:
+          - in: body
+            name: body
+            description: Execute a gis query
+            schema:
+              properties:
+                geo_within_polygon:
+                  type: object
+                  description: A Polygon feature
+                  properties:
+                    type:
+                      type: string
+                    properties:
+                      type: object
+                    geometry:
+                      type: object
+                geo_within_sphere:
+                  type: array
+                  description:
+                    A list with coordinates and radius in Km
+                    like [[9.18, 45.46], 10]
+                  items: []
+
+        responses:
+          200:
+            description: The number of samples for each facet value
+            content:
+              application/json:
+                schema:
+                  type: object
+        """
+
+        return self.get_context_data()
+
+
+class SamplePedigreeMixin():
+    """Return the ancestors or the descendants of a sample as nodes and
+    edges. Samples have two parent fields, while ``$graphLookup`` follows a
+    single one: pedigrees are traversed one generation at a time, with a
+    query for each generation using the indexes of the parent fields"""
+
+    model = None
+
+    parser = reqparse.RequestParser()
+    parser.add_argument(
+        'depth',
+        type=inputs.int_range(1, MAX_PEDIGREE_DEPTH),
+        default=3,
+        help="The number of generations to traverse: {error_msg}")
+    parser.add_argument(
+        'direction',
+        choices=('ancestors', 'descendants'),
+        default='ancestors',
+        help="Traverse ancestors or descendants: {error_msg}")
+
+    def get_generation(self, query: dict) -> list:
+        """Return the raw samples matching query (only the pedigree
+        fields)"""
+
+        return list(
+            self.model.objects(__raw__=query).fields(
+                **{field: 1 for field in [*PEDIGREE_FIELDS, *PARENT_FIELDS]}
+            ).as_pymongo()
+        )
+
+    def get_pedigree(self, id_: str, direction: str, depth: int) -> dict:
+        if not ObjectId.is_valid(id_):
+            raise MongoEngineValidationError
+
+        root = self.get_generation({'_id': ObjectId(id_)})
+
+        if not root:
+            raise ObjectsNotExistsError
+
+        # sample documents and their generation by sample id
+        nodes = {root[0]['_id']: (0, root[0])}
+        generation = root
+
+        for level in range(1, depth + 1):
+            if direction == 'ancestors':
+                ids = [
+                    sample[field] for sample in generation
+                    for field in PARENT_FIELDS
+                    if sample.get(field) and sample[field] not in nodes
+                ]
+                query = {'_id': {'$in': ids}}
+
+            else:
+                ids = [sample['_id'] for sample in generation]
+                query = {
+                    '$or': [
+                        {field: {'$in': ids}} for field in PARENT_FIELDS]
+                }
+
+            if not ids:
+                break
+
+            generation = [
+                sample for sample in self.get_generation(query)
+                if sample['_id'] not in nodes
+            ]
+
+            current_app.logger.debug(
+                f"Got {len(generation)} samples at depth {level}")
+
+            for sample in generation:
+                nodes[sample['_id']] = (level, sample)
+
+        # link the samples with a parent in the pedigree
+        edges = [
+            {
+                'child': sample['_id'],
+                'parent': sample[field],
+                'relation': relation
+            }
+            for _, sample in nodes.values()
+            for field, relation in PARENT_FIELDS.items()
+            if sample.get(field) in nodes
+        ]
+
+        ordered = sorted(
+            nodes.values(), key=lambda item: (item[0], item[1]['smarter_id']))
+
+        items = serialize_raw(
+            self.model,
+            [
+                {
+                    key: value for key, value in sample.items()
+                    if key not in PARENT_FIELDS
+                }
+                for _, sample in ordered
+            ]
+        )
+
+        for (level, _), item in zip(ordered, items):
+            item['depth'] = level
+
+        return {
+            'root': json_util._json_convert(root[0]['_id']),
+            'direction': direction,
+            'depth': depth,
+            'nodes': items,
+            'edges': json_util._json_convert(edges)
+        }
+
+    def get_context_data(self, id_: str):
+        kwargs = self.parser.parse_args(strict=True)
+
+        return jsonify(
+            self.get_pedigree(id_, kwargs['direction'], kwargs['depth']))
+
+
+class SampleSheepPedigreeApi(SamplePedigreeMixin, ConditionalView):
+    model = SampleSheep
+
+    def get(self, id_):
+        """
+        Get the pedigree of a Sheep sample
+        ---
+        tags:
+          - Samples
+        description: >
+          Return the ancestors (or the descendants) of a Sheep sample
+          as a list of samples (nodes) and of child-parent relations (edges)
+        parameters:
+          - in: path
+            name: id_
+            type: string
+            description: The sample ObjectID
+            required: true
+          - name: depth
+            in: query
+            type: integer
+            minimum: 1
+            maximum: 10
+            default: 3
+            description: The number of generations to traverse
+          - name: direction
+            in: query
+            type: string
+            enum: ['ancestors', 'descendants']
+            default: ancestors
+            description: Traverse the parents or the children of the sample
+        responses:
+            '200':
+              description: The nodes and the edges of the pedigree
+              content:
+                application/json:
+                  schema:
+                    type: object
+        """
+
+        return self.get_context_data(id_)
+
+
+class SampleGoatPedigreeApi(SamplePedigreeMixin, ConditionalView):
+    model = SampleGoat
+
+    def get(self, id_):
+        """
+        Get the pedigree of a Goat sample
+        ---
+        tags:
+          - Samples
+        description: >
+          Return the ancestors (or the descendants) of a Goat sample
+          as a list of samples (nodes) and of child-parent relations (edges)
+        parameters:
+          - in: path
+            name: id_
+            type: string
+            description: The sample ObjectID
+            required: true
+          - name: depth
+            in: query
+            type: integer
+            minimum: 1
+            maximum: 10
+            default: 3
+            description: The number of generations to traverse
+          - name: direction
+            in: query
+            type: string
+            enum: ['ancestors', 'descendants']
+            default: ancestors
+            description: Traverse the parents or the children of the sample
+        responses:
+            '200':
+              description: The nodes and the edges of the pedigree
+              content:
+                application/json:
+                  schema:
+                    type: object
+        """
+
+        return self.get_context_data(id_)
+
+
+class SampleBatchMixin():
+    """Resolve a list of sample identifiers (ex. the individuals of a PLINK
+    .fam file) and return a result for each value in the same order"""
+
+    model = None
+
+    # searches are read requests: cache their responses
+    cache_methods = ('POST', )
+
+    def check_values(value):
+        if not isinstance(value, list):
+            raise ValueError("a list of values is required")
+
+        if len(value) > BATCH_MAX_VALUES:
+            raise ValueError(
+                f"too many values (max {BATCH_MAX_VALUES} are allowed)")
+
+        for item in value:
+            if not isinstance(item, str):
+                raise ValueError(f"'{item}' is not a string")
+
+        return value
+
+    parser = reqparse.RequestParser()
+    parser.add_argument(
+        'key',
+        choices=BATCH_KEYS,
+        default='smarter_id',
+        location='json',
+        help="The sample key to search: {error_msg}")
+    parser.add_argument(
+        'values',
+        type=check_values,
+        required=True,
+        location='json',
+        help="The sample keys: {error_msg}")
+
+    def iter_results(self, key, values):
+        for start in range(0, len(values), BATCH_CHUNK_SIZE):
+            chunk = values[start:start + BATCH_CHUNK_SIZE]
+
+            queryset = self.model.objects.filter(
+                **{f"{key}__in": list(set(chunk))}).no_cache()
+            found = {}
+
+            for sample in serialize_raw(
+                    queryset._document, queryset.as_pymongo()):
+                # the same original_id could be used in different datasets
+                found.setdefault(sample.get(key), []).append(sample)
+
+            for value in chunk:
+                items = found.get(value, [])
+
+                yield json.dumps({
+                    "query": value,
+                    "found": len(items) > 0,
+                    "items": items
+                }) + "\n"
+
+    def post(self):
+        kwargs = self.parser.parse_args(strict=True)
+
+        current_app.logger.debug(
+            f"Search {len(kwargs['values'])} samples by {kwargs['key']}")
+
+        return Response(
+            stream_with_context(iter_chunks(
+                self.iter_results(kwargs['key'], kwargs['values']))),
+            mimetype='application/x-ndjson'
+        )
+
+
+class SampleSheepBatchApi(SampleBatchMixin, ConditionalView):
+    model = SampleSheep
+
+    def post(self):
+        """
+        Search a list of Sheep samples
+        ---
+        tags:
+          - Samples
+        description: >
+          Search Sheep samples by a list of SMARTER ids, original ids or
+          aliases
+        parameters:
+          - in: body
+            name: body
+            description: The keys to search
+            schema:
+              required:
+                - values
+              properties:
+                key:
+                  type: string
+                  enum: ['smarter_id', 'original_id', 'alias']
+                  default: smarter_id
+                  description: The sample attribute to search
+                values:
+                  type: array
+                  items:
+                    type: string
+                  description: The values to search
+        responses:
+            '200':
+              description:
+                One JSON object per line for each requested value, in the
+                same order, with the samples found
+        """
+        return super().post()
+
+
+class SampleGoatBatchApi(SampleBatchMixin, ConditionalView):
+    model = SampleGoat
+
+    def post(self):
+        """
+        Search a list of Goat samples
+        ---
+        tags:
+          - Samples
+        description: >
+          Search Goat samples by a list of SMARTER ids, original ids or
+          aliases
+        parameters:
+          - in: body
+            name: body
+            description: The keys to search
+            schema:
+              required:
+                - values
+              properties:
+                key:
+                  type: string
+                  enum: ['smarter_id', 'original_id', 'alias']
+                  default: smarter_id
+                  description: The sample attribute to search
+                values:
+                  type: array
+                  items:
+                    type: string
+                  description: The values to search
+        responses:
+            '200':
+              description:
+                One JSON object per line for each requested value, in the
+                same order, with the samples found
+        """
+        return super().post()
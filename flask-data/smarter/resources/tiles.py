@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 21:38:19 2026
+
+@author: Paolo Cozzi <bunop@libero.it>
+"""
+
+from bson import json_util
+
+from decouple import config
+from flask import current_app, Response, abort
+
+from database.models import SampleSheep, SampleGoat
+from common.cache import DiskCache
+from common.info import smarter_info
+from common.mvt import Layer, encode_tile, tile_bounds
+from common.views import ConditionalView
+from resources.GeoJSON import GeoJSONListMixin, MAX_ZOOM, add_bbox_filter
+
+# the maximum number of samples in a tile
+TILE_MAX_FEATURES = 5000
+
+# the properties of sample features
+TILE_PROPERTIES = [
+    'smarter_id', 'original_id', 'species', 'breed', 'breed_code', 'country',
+    'type', 'chip_name', 'dataset_id'
+]
+
+MVT_MIMETYPE = "application/vnd.mapbox-vector-tile"
+
+# tiles of higher zoom levels are cheap to compute (and they are a lot)
+TILE_CACHE_MAX_ZOOM = 12
+
+tile_cache = DiskCache(
+    config('SMARTER_TILE_CACHE', default='/tmp/smarter-tiles'),
+    max_bytes=config(
+        'SMARTER_TILE_CACHE_SIZE', cast=int, default=256 * 1024 ** 2))
+
+
+class SampleTileMixin(GeoJSONListMixin):
+    """Return sample locations as Mapbox Vector Tiles, with a 'samples'
+    layer"""
+
+    def get_samples(self, matches: dict):
+        projection = {"locations": 1}
+        projection.update({key: 1 for key in TILE_PROPERTIES})
+
+        return self.model.objects().aggregate([
+            {"$match": matches},
+            {"$project": projection}
+        ])
+
+    def get_layer(self, matches: dict, zoom: int, x: int, y: int) -> Layer:
+        layer = Layer("samples", zoom, x, y)
+
+        # samples could have locations outside the tile: count only the
+        # features added to the tile
+        for sample in self.get_samples(matches):
+            if len(layer) >= TILE_MAX_FEATURES:
+                break
+
+            properties = {}
+
+            for key in TILE_PROPERTIES:
+                value = sample.get(key)
+
+                if key == 'dataset_id' and value is not None:
+                    key, value = 'dataset', str(value)
+
+                properties[key] = value
+
+            layer.add_feature(sample["locations"]["coordinates"], properties)
+
+        current_app.logger.debug(
+            f"Got {len(layer)} features in tile {zoom}/{x}/{y}")
+
+        return layer
+
+    def get_context_data(self, zoom: int, x: int, y: int):
+        if not (0 <= zoom <= MAX_ZOOM and 0 <= x < 2 ** zoom and
+                0 <= y < 2 ** zoom):
+            abort(404)
+
+        matches = self.get_matches()
+
+        if "$geoWithin" not in matches["locations"]:
+            # locations outside the tile are clipped by the layer
+            matches = add_bbox_filter(matches, tile_bounds(zoom, x, y))
+
+        key = json_util.dumps(
+            [self.model._get_collection_name(), matches, zoom, x, y],
+            sort_keys=True)
+
+        version = smarter_info.last_updated
+        cached = zoom <= TILE_CACHE_MAX_ZOOM
+        tile = tile_cache.lookup(key, version) if cached else None
+
+        if tile is None:
+            layer = self.get_layer(matches, zoom, x, y)
+            tile = encode_tile([layer])
+
+            # don't fill the cache with empty tiles
+            if cached and len(layer):
+                tile_cache.store(key, version, tile)
+
+        return Response(tile, mimetype=MVT_MIMETYPE)
+
+
+class SampleSheepTileApi(SampleTileMixin, ConditionalView):
+    model = SampleSheep
+
+    def get(self, z, x, y):
+        """
+        Get a vector tile of Sheep sample locations
+        ---
+        tags:
+          - GeoJSON
+        description: >
+          Return the Sheep sample locations in a Mapbox Vector Tile, with a
+          'samples' layer
+        produces:
+          - application/vnd.mapbox-vector-tile
+        parameters:
+          - in: path
+            name: z
+            type: integer
+            required: true
+            description: Zoom level
+          - in: path
+            name: x
+            type: integer
+            required: true
+            description: Tile column
+          - in: path
+            name: y
+            type: integer
+            required: true
+            description: Tile row
+          - name: breed
+            in: query
+            type: array
+            items:
+              type: string
+            collectionFormat: multi
+            description: Breed name
+          - name: breed_code
+            in: query
+            type: array
+            items:
+              type: string
+            collectionFormat: multi
+            description: Breed code
+          - name: chip_name
+            in: query
+            type: array
+            items:
+              type: string
+            collectionFormat: multi
+            description: Chip name
+          - name: country
+            in: query
+            type: array
+            items:
+              type: string
+            collectionFormat: multi
+            description: Country where sample was collected
+          - name: dataset
+            in: query
+            type: array
+            items:
+              type: string
+            collectionFormat: multi
+            description: The dataset ObjectID
+          - name: type
+            in: query
+            type: string
+            enum: ['foreground', 'background']
+            description: Dataset type
+        responses:
+            '200':
+              description: A vector tile
+        """
+
+        return self.get_context_data(z, x, y)
+
+
+class SampleGoatTileApi(SampleTileMixin, ConditionalView):
+    model = SampleGoat
+
+    def get(self, z, x, y):
+        """
+        Get a vector tile of Goat sample locations
+        ---
+        tags:
+          - GeoJSON
+        description: >
+          Return the Goat sample locations in a Mapbox Vector Tile, with a
+          'samples' layer
+        produces:
+          - application/vnd.mapbox-vector-tile
+        parameters:
+          - in: path
+            name: z
+            type: integer
+            required: true
+            description: Zoom level
+          - in: path
+            name: x
+            type: integer
+            required: true
+            description: Tile column
+          - in: path
+            name: y
+            type: integer
+            required: true
+            description: Tile row
+          - name: breed
+            in: query
+            type: array
+            items:
+              type: string
+            collectionFormat: multi
+            description: Breed name
+          - name: breed_code
+            in: query
+            type: array
+            items:
+              type: string
+            collectionFormat: multi
+            description: Breed code
+          - name: chip_name
+            in: query
+            type: array
+            items:
+              type: string
+            collectionFormat: multi
+            description: Chip name
+          - name: country
+            in: query
+            type: array
+            items:
+              type: string
+            collectionFormat: multi
+            description: Country where sample was collected
+          - name: dataset
+            in: query
+            type: array
+            items:
+              type: string
+            collectionFormat: multi
+            description: The dataset ObjectID
+          - name: type
+            in: query
+            type: string
+            enum: ['foreground', 'background']
+            description: Dataset type
+        responses:
+            '200':
+              description: A vector tile
+        """
+
+        return self.get_context_data(z, x, y)
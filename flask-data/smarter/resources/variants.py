@@ -6,23 +6,111 @@ Created on Mon Jun 21 15:10:51 2021
 @author: Paolo Cozzi <paolo.cozzi@ibba.cnr.it>
 """
 
+import io
 import re
+import csv
 
+from types import MappingProxyType
 from urllib.parse import unquote
 
-from flask import jsonify, current_app
-from flask_restful import reqparse
+from flask import (
+    jsonify, current_app, json, Response, stream_with_context)
+from flask_restful import reqparse, abort
+from decouple import config
+from bson import json_util
 
-from database.models import VariantGoat, VariantSheep, SmarterInfo
-from common.views import ListView, ModelView
+from database.models import (
+    VariantGoat, VariantSheep, VariantGoatFlat, VariantSheepFlat,
+    FlatVariantsInfo, bulk_to_mongo)
+from common.info import smarter_info
+from common.views import (
+    ListView, ModelView, ConditionalView, serialize_raw)
+from common.streaming import iter_chunks
 
 location_pattern = re.compile(r'(?P<chrom>\w+):(?P<start>\d+)-(?P<end>\d+)')
 chrom_pattern = re.compile(r'^(?P<chrom>\w+)$')
 
+# the columns of a CSV/TSV variant export
+EXPORT_COLUMNS = [
+    'name', 'rs_id', 'chip_name', 'probeset_id', 'affy_snp_id', 'cust_id',
+    'chrom', 'position', 'alleles', 'illumina', 'illumina_strand',
+    'illumina_top', 'affymetrix_ab', 'strand'
+]
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+    'tsv': 'text/tab-separated-values'
+}
+
+# read variants from database in batches of this size
+EXPORT_BATCH_SIZE = 1000
+
+# the keys which can be used to search variants in batch and their fields
+BATCH_KEYS = {
+    'name': 'name',
+    'rs_id': 'rs_id',
+    'probeset_id': 'probesets__probeset_id',
+    'affy_snp_id': 'affy_snp_id'
+}
+
+# the maximum number of values of a batch request
+BATCH_MAX_VALUES = 50000
+
+# search variants with $in queries of this size
+BATCH_CHUNK_SIZE = 1000
+
+
+# the fields returned by variant lists (database names)
+LIST_FIELDS = (
+    'name', 'rs_id', 'chip_name', 'probesets', 'affy_snp_id', 'sequence',
+    'cust_id', 'locations'
+)
+
+# the flat collections derived from variant collections
+FLAT_MODELS = {
+    VariantSheep: VariantSheepFlat,
+    VariantGoat: VariantGoatFlat
+}
+
+# the flat collections derived from the current data import (and its
+# last_updated value): they are current until the next data import
+flat_versions = {}
+
+
+def is_flat_current(flat_model) -> bool:
+    """True if a flat collection was derived from the current data import
+    (the last_updated value of database status)"""
+
+    name = flat_model._meta['collection']
+    last_updated = smarter_info.last_updated
+
+    if name in flat_versions and flat_versions[name] == last_updated:
+        return True
+
+    info = FlatVariantsInfo.objects.filter(pk=name).first()
+
+    if info is None or info.last_updated != last_updated:
+        return False
+
+    flat_versions[name] = last_updated
+
+    return True
+
 
 class VariantListMixin():
     assembly = None
-    coordinate_system = {}
+
+    # the location version of assembly, read-only (copy it to add filters)
+    coordinate_system = MappingProxyType({})
+
+    # read variants from flat collections (need to be derived with
+    # 'flask variants rebuild-flat' after each data import)
+    use_flat_collection = config(
+        'SMARTER_FLAT_VARIANTS', cast=bool, default=False)
+
+    # the fields selected by the user (all list fields if None)
+    selected_fields = None
 
     def check_region(value):
         if not re.search(location_pattern, unquote(value)) and not re.search(
@@ -51,15 +139,25 @@ class VariantListMixin():
     def __init__(self) -> None:
         super().__init__()
 
-        # get supported assemblies from database
-        info = SmarterInfo.objects.get(pk="smarter")
-        working_assemblies = info["working_assemblies"]
-        self.coordinate_system = {
+        # get supported assemblies from database status
+        working_assemblies = smarter_info.working_assemblies
+        self.coordinate_system = MappingProxyType({
             'version': working_assemblies[self.assembly][0],
             'imported_from': working_assemblies[self.assembly][1]
-        }
+        })
 
     def get_queryset(self):
+        if (self.use_flat_collection and
+                not is_flat_current(FLAT_MODELS[self.model])):
+            current_app.logger.warning(
+                f"{FLAT_MODELS[self.model]._meta['collection']} is missing "
+                f"or was derived from a previous data import: reading "
+                f"{self.model._meta['collection']} instead. Run 'flask "
+                f"variants rebuild-flat'")
+
+            # don't serve stale variants with the validators of new data
+            self.use_flat_collection = False
+
         # parse request arguments and deal with generic arguments
         args, kwargs = self.parse_args()
 
@@ -74,6 +172,9 @@ class VariantListMixin():
             probeset_id = kwargs.pop('probeset_id')
             kwargs['probesets__probeset_id'] = probeset_id
 
+        if self.use_flat_collection:
+            return self.get_flat_queryset(args, kwargs)
+
         # add the $elemMatch clause if necessary
         kwargs = self.__prepare_match(kwargs)
 
@@ -88,17 +189,93 @@ class VariantListMixin():
         if self.order_by:
             queryset = queryset.order_by(self.order_by)
 
-        # limit to certain fields
-        return queryset.fields(
-            elemMatch__locations=self.coordinate_system.copy(),
-            name=1,
-            rs_id=1,
-            chip_name=1,
-            probesets=1,
-            affy_snp_id=1,
-            sequence=1,
-            cust_id=1
-        )
+        return self.limit_fields(queryset)
+
+    def get_flat_queryset(self, args, kwargs):
+        """Search variants in the flat collection, which has a document for
+        each variant and assembly with scalar coordinates"""
+
+        kwargs['assembly'] = self.assembly
+
+        if 'region' in kwargs:
+            kwargs = self.__search_pattern(
+                unquote(kwargs.pop('region')),
+                kwargs
+            )
+
+        current_app.logger.info(f"{args}, {kwargs}")
+
+        queryset = FLAT_MODELS[self.model].objects.filter(*args, **kwargs)
+
+        if self.order_by:
+            queryset = queryset.order_by(self.order_by)
+
+        return queryset
+
+    def get_default_fields(self) -> tuple:
+        return LIST_FIELDS
+
+    def limit_fields(self, queryset, extra: list = None):
+        """Return only the location of the selected assembly and the
+        variant (selected) fields"""
+
+        fields = self.selected_fields
+
+        if fields is None:
+            fields = LIST_FIELDS
+
+        projection = {
+            field: 1 for field in [*fields, *(extra or [])]
+            if field != 'locations'}
+
+        if 'locations' in fields:
+            projection['elemMatch__locations'] = self.coordinate_system.copy()
+
+        if not projection:
+            # return only the object ids if no field is selected
+            return queryset.only('id')
+
+        return queryset.fields(**projection)
+
+    def set_selected_fields(self, kwargs: dict):
+        super().set_selected_fields(kwargs)
+
+        if not self.use_flat_collection or self.selected_fields is None:
+            return
+
+        # flat variants have only the list fields ('illumina_top' is the
+        # one of the location)
+        unknown = [
+            field for field in self.selected_fields
+            if field not in LIST_FIELDS]
+
+        if unknown:
+            abort(400, message={
+                'fields': (
+                    f"'{unknown[0]}' is not a selectable field of flat "
+                    f"variants (choose between {', '.join(LIST_FIELDS)})")
+            })
+
+    def select_fields(self, queryset, extra: list = None):
+        """Merge the selected fields with the projection of limit_fields
+        (or select the fields of flat variants)"""
+
+        if self.selected_fields is None:
+            return queryset
+
+        if not self.use_flat_collection:
+            # projections are intersected: replace the one of limit_fields
+            if extra:
+                queryset = self.limit_fields(queryset.all_fields(), extra)
+
+            return queryset
+
+        fields = [
+            'location' if field == 'locations' else field
+            for field in self.selected_fields]
+
+        # variant_id is the id of flat variants
+        return queryset.only('variant_id', *fields, *(extra or []))
 
     def __search_pattern(self, region, elemMatch):
         """Search for a region or for a whole chromosome"""
@@ -142,8 +319,205 @@ class VariantListMixin():
         return kwargs
 
 
+def variant_to_row(variant: dict) -> list:
+    """Flatten a serialized variant with a single location in a CSV row"""
+
+    location = variant['locations'][0]
+
+    row = [
+        variant.get('name'),
+        ";".join(variant.get('rs_id') or []),
+        ";".join(variant.get('chip_name') or []),
+        ";".join(
+            probeset_id for probeset in variant.get('probesets') or []
+            for probeset_id in probeset.get('probeset_id', [])),
+        variant.get('affy_snp_id'),
+        variant.get('cust_id')
+    ]
+
+    for key in EXPORT_COLUMNS[len(row):]:
+        row.append(location.get(key))
+
+    return row
+
+
+class VariantExportMixin(VariantListMixin):
+    """Stream all the variants matching a query in a single response"""
+
+    format = 'ndjson'
+
+    parser = VariantListMixin.parser.copy()
+    parser.add_argument(
+        'format',
+        choices=tuple(EXPORT_FORMATS.keys()),
+        help="Export format: {error_msg}")
+
+    def parse_args(self) -> list:
+        # reading request parameters
+        kwargs = self.parser.parse_args(strict=True)
+        args = []
+
+        # filter args
+        kwargs = {key: val for key, val in kwargs.items() if val}
+
+        if 'format' in kwargs:
+            self.format = kwargs.pop('format')
+
+        # exported variants are sorted by their primary key
+        self.order_by = None
+
+        return args, kwargs
+
+    def iter_variants(self, queryset):
+        """Serialize raw variants in bulk, skipping document creation"""
+
+        return bulk_to_mongo(queryset._document, queryset.as_pymongo())
+
+    def iter_ndjson(self, queryset):
+        for variant in self.iter_variants(queryset):
+            yield json.dumps(json_util._json_convert(variant)) + "\n"
+
+    def iter_rows(self, queryset):
+        delimiter = "\t" if self.format == 'tsv' else ","
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, delimiter=delimiter, lineterminator="\n")
+        writer.writerow(EXPORT_COLUMNS)
+
+        for variant in self.iter_variants(queryset):
+            writer.writerow(variant_to_row(variant))
+            yield buffer.getvalue()
+
+            # reset buffer
+            buffer.seek(0)
+            buffer.truncate(0)
+
+        yield buffer.getvalue()
+
+    def get(self):
+        # don't cache results in queryset: read a batch at a time
+        queryset = self.get_queryset().no_cache().batch_size(
+            EXPORT_BATCH_SIZE)
+
+        if self.format == 'ndjson':
+            lines = self.iter_ndjson(queryset)
+
+        else:
+            lines = self.iter_rows(queryset)
+
+        filename = (
+            f"{self.model._meta['collection']}_{self.assembly}.{self.format}")
+
+        # the worker serving a long export can be killed by uwsgi (see
+        # harakiri in smarter_uwsgi.ini): clients can detect a truncated
+        # file by comparing its records with this count
+        total = queryset.count()
+
+        return Response(
+            stream_with_context(iter_chunks(lines)),
+            mimetype=EXPORT_FORMATS[self.format],
+            headers={
+                "Content-Disposition": f"attachment; filename={filename}",
+                "X-Total-Count": str(total)
+            }
+        )
+
+
+def get_variant_keys(variant: dict, key: str) -> list:
+    """Return the values of a batch key for a serialized variant"""
+
+    if key == 'probeset_id':
+        return [
+            probeset_id for probeset in variant.get('probesets') or []
+            for probeset_id in probeset.get('probeset_id', [])]
+
+    value = variant.get(key)
+
+    if isinstance(value, list):
+        return value
+
+    return [value]
+
+
+class VariantBatchMixin(VariantListMixin):
+    """Search a list of variants by name, rs_id, probeset_id or affy_snp_id
+    and return a result for each value in the same order"""
+
+    # searches are read requests: cache their responses
+    cache_methods = ('POST', )
+
+    def check_values(value):
+        if not isinstance(value, list):
+            raise ValueError("a list of values is required")
+
+        if len(value) > BATCH_MAX_VALUES:
+            raise ValueError(
+                f"too many values (max {BATCH_MAX_VALUES} are allowed)")
+
+        for item in value:
+            if not isinstance(item, str):
+                raise ValueError(f"'{item}' is not a string")
+
+        return value
+
+    parser = reqparse.RequestParser()
+    parser.add_argument(
+        'key',
+        choices=tuple(BATCH_KEYS.keys()),
+        default='name',
+        location='json',
+        help="The variant key to search: {error_msg}")
+    parser.add_argument(
+        'values',
+        type=check_values,
+        required=True,
+        location='json',
+        help="The variant keys: {error_msg}")
+
+    def iter_results(self, key, values):
+        field = BATCH_KEYS[key]
+
+        for start in range(0, len(values), BATCH_CHUNK_SIZE):
+            chunk = values[start:start + BATCH_CHUNK_SIZE]
+
+            queryset = self.model.objects.filter(**{
+                f"{field}__in": list(set(chunk)),
+                "locations__match": self.coordinate_system.copy()
+            })
+
+            queryset = self.limit_fields(queryset).no_cache()
+            found = {}
+
+            for variant in serialize_raw(
+                    queryset._document, queryset.as_pymongo()):
+                for value in get_variant_keys(variant, key):
+                    found.setdefault(value, []).append(variant)
+
+            for value in chunk:
+                items = found.get(value, [])
+
+                yield json.dumps({
+                    "query": value,
+                    "found": len(items) > 0,
+                    "items": items
+                }) + "\n"
+
+    def post(self):
+        kwargs = self.parser.parse_args(strict=True)
+
+        current_app.logger.debug(
+            f"Search {len(kwargs['values'])} variants by {kwargs['key']}")
+
+        return Response(
+            stream_with_context(iter_chunks(
+                self.iter_results(kwargs['key'], kwargs['values']))),
+            mimetype=EXPORT_FORMATS['ndjson']
+        )
+
+
 class VariantSheepApi(ModelView):
     model = VariantSheep
+    raw = True
 
     def get(self, id_):
         """
@@ -173,6 +547,7 @@ class VariantSheepApi(ModelView):
 class VariantSheepOAR3Api(VariantListMixin, ListView):
     endpoint = 'variantsheepoar3api'
     model = VariantSheep
+    raw = True
     assembly = "OAR3"
 
     def get(self):
@@ -227,6 +602,7 @@ class VariantSheepOAR3Api(VariantListMixin, ListView):
 class VariantSheepOAR4Api(VariantListMixin, ListView):
     endpoint = 'variantsheepoar4api'
     model = VariantSheep
+    raw = True
     assembly = "OAR4"
 
     def get(self):
@@ -280,6 +656,7 @@ class VariantSheepOAR4Api(VariantListMixin, ListView):
 
 class VariantGoatApi(ModelView):
     model = VariantGoat
+    raw = True
 
     def get(self, id_):
         """
@@ -309,6 +686,7 @@ class VariantGoatApi(ModelView):
 class VariantGoatCHI1Api(VariantListMixin, ListView):
     endpoint = 'variantgoatchi1api'
     model = VariantGoat
+    raw = True
     assembly = "CHI1"
 
     def get(self):
@@ -363,6 +741,7 @@ class VariantGoatCHI1Api(VariantListMixin, ListView):
 class VariantGoatARS1Api(VariantListMixin, ListView):
     endpoint = 'variantgoatars1api'
     model = VariantGoat
+    raw = True
     assembly = "ARS1"
 
     def get(self):
@@ -412,3 +791,367 @@ class VariantGoatARS1Api(VariantListMixin, ListView):
         self.object_list = self.get_queryset()
         data = self.get_context_data()
         return jsonify(**data)
+
+
+class VariantSheepOAR3ExportApi(VariantExportMixin, ConditionalView):
+    model = VariantSheep
+    assembly = "OAR3"
+
+    def get(self):
+        """
+        Export SNPs on Sheep OAR3 Assembly
+        ---
+        tags:
+          - Variants
+        description: Stream all the SMARTER SNPs on Sheep OAR3 Assembly
+        parameters:
+          - name: format
+            in: query
+            type: string
+            enum: ['ndjson', 'csv', 'tsv']
+            default: ndjson
+            description: Export format
+          - name: name
+            in: query
+            type: string
+            description: The SNP name
+          - name: rs_id
+            in: query
+            type: string
+            description: The SNP rsID identifier
+          - name: chip_name
+            in: query
+            type: array
+            items:
+              type: string
+            collectionFormat: multi
+            description: Chip name
+          - name: probeset_id
+            in: query
+            type: string
+            description: Affymetrix probeset id
+          - name: cust_id
+            in: query
+            type: string
+            description: Affymetrix cust_id (illumina name)
+          - name: region
+            in: query
+            type: string
+            description: Filter SNPs by position (
+                chrom:start-end or only chrom)
+        responses:
+            '200':
+              description: SNPs to be returned, one per line
+        """
+        return super().get()
+
+
+class VariantSheepOAR4ExportApi(VariantExportMixin, ConditionalView):
+    model = VariantSheep
+    assembly = "OAR4"
+
+    def get(self):
+        """
+        Export SNPs on Sheep OAR4 Assembly
+        ---
+        tags:
+          - Variants
+        description: Stream all the SMARTER SNPs on Sheep OAR4 Assembly
+        parameters:
+          - name: format
+            in: query
+            type: string
+            enum: ['ndjson', 'csv', 'tsv']
+            default: ndjson
+            description: Export format
+          - name: name
+            in: query
+            type: string
+            description: The SNP name
+          - name: rs_id
+            in: query
+            type: string
+            description: The SNP rsID identifier
+          - name: chip_name
+            in: query
+            type: array
+            items:
+              type: string
+            collectionFormat: multi
+            description: Chip name
+          - name: probeset_id
+            in: query
+            type: string
+            description: Affymetrix probeset id
+          - name: cust_id
+            in: query
+            type: string
+            description: Affymetrix cust_id (illumina name)
+          - name: region
+            in: query
+            type: string
+            description: Filter SNPs by position (
+                chrom:start-end or only chrom)
+        responses:
+            '200':
+              description: SNPs to be returned, one per line
+        """
+        return super().get()
+
+
+class VariantGoatCHI1ExportApi(VariantExportMixin, ConditionalView):
+    model = VariantGoat
+    assembly = "CHI1"
+
+    def get(self):
+        """
+        Export SNPs on Goat CHI1 Assembly
+        ---
+        tags:
+          - Variants
+        description: Stream all the SMARTER SNPs on Goat CHI1 Assembly
+        parameters:
+          - name: format
+            in: query
+            type: string
+            enum: ['ndjson', 'csv', 'tsv']
+            default: ndjson
+            description: Export format
+          - name: name
+            in: query
+            type: string
+            description: The SNP name
+          - name: rs_id
+            in: query
+            type: string
+            description: The SNP rsID identifier
+          - name: chip_name
+            in: query
+            type: array
+            items:
+              type: string
+            collectionFormat: multi
+            description: Chip name
+          - name: probeset_id
+            in: query
+            type: string
+            description: Affymetrix probeset id
+          - name: cust_id
+            in: query
+            type: string
+            description: Affymetrix cust_id (illumina name)
+          - name: region
+            in: query
+            type: string
+            description: Filter SNPs by position (
+                chrom:start-end or only chrom)
+        responses:
+            '200':
+              description: SNPs to be returned, one per line
+        """
+        return super().get()
+
+
+class VariantGoatARS1ExportApi(VariantExportMixin, ConditionalView):
+    model = VariantGoat
+    assembly = "ARS1"
+
+    def get(self):
+        """
+        Export SNPs on Goat ARS1 Assembly
+        ---
+        tags:
+          - Variants
+        description: Stream all the SMARTER SNPs on Goat ARS1 Assembly
+        parameters:
+          - name: format
+            in: query
+            type: string
+            enum: ['ndjson', 'csv', 'tsv']
+            default: ndjson
+            description: Export format
+          - name: name
+            in: query
+            type: string
+            description: The SNP name
+          - name: rs_id
+            in: query
+            type: string
+            description: The SNP rsID identifier
+          - name: chip_name
+            in: query
+            type: array
+            items:
+              type: string
+            collectionFormat: multi
+            description: Chip name
+          - name: probeset_id
+            in: query
+            type: string
+            description: Affymetrix probeset id
+          - name: cust_id
+            in: query
+            type: string
+            description: Affymetrix cust_id (illumina name)
+          - name: region
+            in: query
+            type: string
+            description: Filter SNPs by position (
+                chrom:start-end or only chrom)
+        responses:
+            '200':
+              description: SNPs to be returned, one per line
+        """
+        return super().get()
+
+
+class VariantSheepOAR3BatchApi(VariantBatchMixin, ConditionalView):
+    model = VariantSheep
+    assembly = "OAR3"
+
+    def post(self):
+        """
+        Search a list of SNPs on Sheep OAR3 Assembly
+        ---
+        tags:
+          - Variants
+        description: Search Sheep SNPs on OAR3 Assembly by a list of keys
+        parameters:
+          - in: body
+            name: body
+            description: The keys to search
+            schema:
+              required:
+                - values
+              properties:
+                key:
+                  type: string
+                  enum: ['name', 'rs_id', 'probeset_id', 'affy_snp_id']
+                  default: name
+                  description: The SNP attribute to search
+                values:
+                  type: array
+                  items:
+                    type: string
+                  description: The values to search
+        responses:
+            '200':
+              description:
+                One JSON object per line for each requested value, in the
+                same order, with the SNPs found
+        """
+        return super().post()
+
+
+class VariantSheepOAR4BatchApi(VariantBatchMixin, ConditionalView):
+    model = VariantSheep
+    assembly = "OAR4"
+
+    def post(self):
+        """
+        Search a list of SNPs on Sheep OAR4 Assembly
+        ---
+        tags:
+          - Variants
+        description: Search Sheep SNPs on OAR4 Assembly by a list of keys
+        parameters:
+          - in: body
+            name: body
+            description: The keys to search
+            schema:
+              required:
+                - values
+              properties:
+                key:
+                  type: string
+                  enum: ['name', 'rs_id', 'probeset_id', 'affy_snp_id']
+                  default: name
+                  description: The SNP attribute to search
+                values:
+                  type: array
+                  items:
+                    type: string
+                  description: The values to search
+        responses:
+            '200':
+              description:
+                One JSON object per line for each requested value, in the
+                same order, with the SNPs found
+        """
+        return super().post()
+
+
+class VariantGoatCHI1BatchApi(VariantBatchMixin, ConditionalView):
+    model = VariantGoat
+    assembly = "CHI1"
+
+    def post(self):
+        """
+        Search a list of SNPs on Goat CHI1 Assembly
+        ---
+        tags:
+          - Variants
+        description: Search Goat SNPs on CHI1 Assembly by a list of keys
+        parameters:
+          - in: body
+            name: body
+            description: The keys to search
+            schema:
+              required:
+                - values
+              properties:
+                key:
+                  type: string
+                  enum: ['name', 'rs_id', 'probeset_id', 'affy_snp_id']
+                  default: name
+                  description: The SNP attribute to search
+                values:
+                  type: array
+                  items:
+                    type: string
+                  description: The values to search
+        responses:
+            '200':
+              description:
+                One JSON object per line for each requested value, in the
+                same order, with the SNPs found
+        """
+        return super().post()
+
+
+class VariantGoatARS1BatchApi(VariantBatchMixin, ConditionalView):
+    model = VariantGoat
+    assembly = "ARS1"
+
+    def post(self):
+        """
+        Search a list of SNPs on Goat ARS1 Assembly
+        ---
+        tags:
+          - Variants
+        description: Search Goat SNPs on ARS1 Assembly by a list of keys
+        parameters:
+          - in: body
+            name: body
+            description: The keys to search
+            schema:
+              required:
+                - values
+              properties:
+                key:
+                  type: string
+                  enum: ['name', 'rs_id', 'probeset_id', 'affy_snp_id']
+                  default: name
+                  description: The SNP attribute to search
+                values:
+                  type: array
+                  items:
+                    type: string
+                  description: The values to search
+        responses:
+            '200':
+              description:
+                One JSON object per line for each requested value, in the
+                same order, with the SNPs found
+        """
+        return super().post()
@@ -18,6 +18,11 @@ from dateutil.parser import parse as parse_date
 
 from app import create_app
 from database.db import db, DB_ALIAS
+from common.counts import count_cache
+from common.autocomplete import breed_index
+from common.search import dataset_index
+from common.info import smarter_info
+from resources.variants import flat_versions
 
 # start application an override the default configuration
 os.environ['MONGODB_SMARTER_DB'] = 'mongodb://mongo/test'
@@ -73,6 +78,13 @@ class BaseCase(unittest.TestCase):
         cls.client = app.test_client()
         cls.db = db.get_db(alias=DB_ALIAS)
 
+        # forget about data counted or read by other tests
+        count_cache.clear()
+        breed_index.clear()
+        dataset_index.clear()
+        smarter_info.invalidate()
+        flat_versions.clear()
+
         if cls.db.list_collection_names():
             logger.error(
                 f"Database has data: {cls.db.list_collection_names()}")
@@ -7,13 +7,80 @@ Created on Thu Dec 16 12:43:33 2021
 """
 
 import json
+import math
 import pathlib
+import unittest
+
+from resources.GeoJSON import (
+    cluster_cache, bbox_to_polygons, BBOX_MAX_WIDTH)
 
 from .base import BaseCase
 
 FIXTURES_DIR = pathlib.Path(__file__).parent / "fixtures"
 
 
+def get_midpoint_lat(start: list, end: list) -> float:
+    """Return the latitude in the middle of a great circle arc"""
+
+    vectors = []
+
+    for lon, lat in [start, end]:
+        lon, lat = math.radians(lon), math.radians(lat)
+        vectors.append((
+            math.cos(lat) * math.cos(lon),
+            math.cos(lat) * math.sin(lon),
+            math.sin(lat)))
+
+    x, y, z = [a + b for a, b in zip(*vectors)]
+
+    return math.degrees(math.atan2(z, math.hypot(x, y)))
+
+
+class BBoxToPolygonsTest(unittest.TestCase):
+    def test_edges(self):
+        # the tile 3/4/2: a great circle between the corners reaches 43.24
+        west, south, east, north = [0, 40.979898, 45, 66.513260]
+        polygons = bbox_to_polygons([west, south, east, north])
+
+        self.assertEqual(len(polygons), 1)
+
+        ring = polygons[0]['coordinates'][0]
+        self.assertEqual(ring[0], ring[-1])
+
+        for start, end in zip(ring, ring[1:]):
+            lat = get_midpoint_lat(start, end)
+
+            # arcs of the south and the north edges stay outside the box
+            if start[1] < south and end[1] < south:
+                self.assertLess(lat, south)
+
+            if start[1] > north and end[1] > north:
+                self.assertGreater(lat, north)
+
+        lons = [lon for lon, _ in ring]
+        self.assertLess(min(lons), west)
+        self.assertGreater(max(lons), east)
+
+    def test_split(self):
+        polygons = bbox_to_polygons([-180, -85.05, 180, 85.05])
+
+        self.assertEqual(len(polygons), 3)
+
+        for polygon in polygons:
+            lons = [lon for lon, _ in polygon['coordinates'][0]]
+            self.assertLess(max(lons) - min(lons), BBOX_MAX_WIDTH + 1)
+
+    def test_poles(self):
+        polygons = bbox_to_polygons([-60, -90, 60, 90])
+        ring = polygons[0]['coordinates'][0]
+
+        # poles are single vertices
+        self.assertEqual(
+            ring,
+            [[-60.01, -90], [60.01, 0], [60.01, 90], [-60.01, 0],
+             [-60.01, -90]])
+
+
 class SampleSheepTest(BaseCase):
     fixtures = [
         'user',
@@ -360,6 +427,26 @@ class SampleGoatListTest(BaseCase):
 
         self.check_both_results(response)
 
+    def test_get_samples_streamed(self):
+        response = self.client.get(
+            self.test_endpoint,
+            headers=self.headers
+        )
+
+        self.assertTrue(response.is_streamed)
+        self.check_both_results(response)
+
+        test = response.json
+
+        # features are the same of a single sample
+        for feature in test['features']:
+            sample = self.client.get(
+                f"{self.test_endpoint}/{feature['_id']['$oid']}",
+                headers=self.headers
+            )
+
+            self.assertEqual(feature, sample.json)
+
     def test_get_samples_by_breed(self):
         response = self.client.get(
             self.test_endpoint,
@@ -516,3 +603,116 @@ class SampleGoatListTest(BaseCase):
         )
 
         self.check_second_result(response)
+
+
+class SampleGoatClusterTest(BaseCase):
+    fixtures = [
+        'user',
+        'sampleGoat'
+    ]
+
+    test_endpoint = '/smarter-api/samples.clusters/goat'
+
+    def setUp(self):
+        cluster_cache.clear()
+
+    def check_clusters(self, response, n_of_clusters):
+        test = response.json
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(test['type'], "FeatureCollection")
+        self.assertEqual(len(test['features']), n_of_clusters)
+
+        return test['features']
+
+    def test_get_clusters(self):
+        response = self.client.get(
+            self.test_endpoint,
+            headers=self.headers
+        )
+
+        features = self.check_clusters(response, 2)
+
+        self.assertEqual(
+            features[0]['geometry'],
+            {"type": "Point", "coordinates": [3.19558, 39.4603]})
+        self.assertEqual(
+            features[0]['properties'],
+            {
+                "count": 1,
+                "cell": [4, 2],
+                "breeds": {"Cashmere": 1},
+                "countries": {"France": 1}
+            }
+        )
+
+    def test_get_clusters_world(self):
+        response = self.client.get(
+            self.test_endpoint,
+            headers=self.headers,
+            query_string={
+                'bbox': '-180,-90,180,90',
+                'zoom': 1
+            }
+        )
+
+        features = self.check_clusters(response, 2)
+
+        self.assertEqual(
+            [feature['properties']['cell'] for feature in features],
+            [[8, 5], [8, 6]]
+        )
+
+    def test_get_clusters_by_breed(self):
+        response = self.client.get(
+            self.test_endpoint,
+            headers=self.headers,
+            query_string={'breed': 'Bari'}
+        )
+
+        features = self.check_clusters(response, 1)
+
+        self.assertEqual(features[0]['properties']['breeds'], {"Bari": 1})
+
+    def test_get_clusters_bbox(self):
+        response = self.client.get(
+            self.test_endpoint,
+            headers=self.headers,
+            query_string={
+                'bbox': '0,30,5,42',
+                'zoom': 3
+            }
+        )
+
+        features = self.check_clusters(response, 1)
+
+        self.assertEqual(
+            features[0]['properties']['breeds'], {"Cashmere": 1})
+
+    def test_get_clusters_cached(self):
+        self.client.get(self.test_endpoint, headers=self.headers)
+        hits = cluster_cache.hits
+
+        response = self.client.get(self.test_endpoint, headers=self.headers)
+
+        self.check_clusters(response, 2)
+        self.assertEqual(cluster_cache.hits, hits + 1)
+
+    def test_get_clusters_invalid_bbox(self):
+        for bbox in ['foo', '10,10,0,0', '-200,0,10,10']:
+            response = self.client.get(
+                self.test_endpoint,
+                headers=self.headers,
+                query_string={'bbox': bbox}
+            )
+
+            self.assertEqual(response.status_code, 400)
+
+    def test_get_clusters_invalid_zoom(self):
+        response = self.client.get(
+            self.test_endpoint,
+            headers=self.headers,
+            query_string={'zoom': 99}
+        )
+
+        self.assertEqual(response.status_code, 400)
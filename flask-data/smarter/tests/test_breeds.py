@@ -7,10 +7,14 @@ Created on Tue May 25 14:47:24 2021
 """
 
 import json
+import base64
 import pathlib
 
 from werkzeug.urls import url_encode
 
+from common.counts import count_cache
+from database.models import Breed, BREED_COLLATION
+
 from .base import BaseCase
 
 FIXTURES_DIR = pathlib.Path(__file__).parent / "fixtures"
@@ -86,6 +90,168 @@ class TestGetBreedList(BaseCase):
         self.assertIsNotNone(test['prev'])
         self.assertEqual(response.status_code, 200)
 
+    def test_get_breeds_count_none(self):
+        payload = {'count': 'none', 'size': 2}
+
+        response = self.client.get(
+            "?".join([self.test_endpoint, url_encode(payload)]),
+            headers=self.headers
+        )
+
+        test = response.json
+
+        self.assertIsNone(test['total'])
+        self.assertIsNone(test['pages'])
+        self.assertListEqual(test['items'], self.data[:2])
+        self.assertIsNotNone(test['next'])
+        self.assertEqual(response.status_code, 200)
+
+        # get next page
+        response = self.client.get(
+            test['next'],
+            headers=self.headers
+        )
+
+        test = response.json
+
+        self.assertListEqual(test['items'], self.data[2:])
+        self.assertIsNone(test['next'])
+        self.assertIsNotNone(test['prev'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_get_breeds_count_estimated(self):
+        response = self.client.get(
+            self.test_endpoint,
+            headers=self.headers,
+            query_string={'count': 'estimated'}
+        )
+
+        test = response.json
+
+        self.assertEqual(test['total'], 4)
+        self.assertEqual(test['pages'], 1)
+        self.assertEqual(response.status_code, 200)
+
+    def test_get_breeds_count_cached(self):
+        payload = {'species': 'Goat', 'size': 1}
+
+        response = self.client.get(
+            "?".join([self.test_endpoint, url_encode(payload)]),
+            headers=self.headers
+        )
+
+        self.assertEqual(response.json['total'], 2)
+
+        hits = count_cache.hits
+
+        # get next page
+        response = self.client.get(
+            response.json['next'],
+            headers=self.headers
+        )
+
+        self.assertEqual(response.json['total'], 2)
+        self.assertEqual(count_cache.hits, hits + 1)
+
+    def test_get_breeds_count_invalid(self):
+        response = self.client.get(
+            self.test_endpoint,
+            headers=self.headers,
+            query_string={'count': 'foo'}
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("count", response.json['message'])
+
+    def test_get_breeds_cursor_pagination(self):
+        payload = {'cursor': '*', 'size': 3}
+
+        # keyset pagination sort objects by id
+        expected = sorted(self.data, key=lambda breed: breed['_id']['$oid'])
+
+        response = self.client.get(
+            "?".join([self.test_endpoint, url_encode(payload)]),
+            headers=self.headers
+        )
+
+        test = response.json
+
+        self.assertIsNone(test['total'])
+        self.assertIsInstance(test['items'], list)
+        self.assertEqual(len(test['items']), 3)
+        self.assertListEqual(test['items'], expected[:3])
+        self.assertIsNone(test['prev'])
+        self.assertIsNotNone(test['next'])
+        self.assertIsNotNone(test['cursor'])
+        self.assertEqual(response.status_code, 200)
+
+        # get next page
+        response = self.client.get(
+            test['next'],
+            headers=self.headers
+        )
+
+        test = response.json
+
+        self.assertIsInstance(test['items'], list)
+        self.assertEqual(len(test['items']), 1)
+        self.assertListEqual(test['items'], expected[3:])
+        self.assertIsNone(test['next'])
+        self.assertIsNone(test['cursor'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_get_breeds_cursor_pagination_sort(self):
+        payload = {'cursor': '*', 'size': 2, 'sort': 'name', 'order': 'desc'}
+        expected = sorted(
+            self.data, key=lambda breed: breed['name'], reverse=True)
+
+        response = self.client.get(
+            "?".join([self.test_endpoint, url_encode(payload)]),
+            headers=self.headers
+        )
+
+        test = response.json
+
+        self.assertListEqual(test['items'], expected[:2])
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(
+            test['next'],
+            headers=self.headers
+        )
+
+        test = response.json
+
+        self.assertListEqual(test['items'], expected[2:])
+        self.assertIsNone(test['next'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_get_breeds_invalid_cursor(self):
+        response = self.client.get(
+            self.test_endpoint,
+            headers=self.headers,
+            query_string={'cursor': 'foo'}
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            "Invalid pagination cursor", response.json['message'])
+
+    def test_get_breeds_invalid_cursor_oid(self):
+        # a well formed token with an invalid object id
+        token = base64.urlsafe_b64encode(
+            b'{"s": "", "v": [{"$oid": "zz"}]}').decode()
+
+        response = self.client.get(
+            self.test_endpoint,
+            headers=self.headers,
+            query_string={'cursor': token}
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            "Invalid pagination cursor", response.json['message'])
+
     def test_get_breeds_by_species(self):
         payload = {'species': 'Goat'}
 
@@ -198,6 +364,55 @@ class TestGetBreedList(BaseCase):
         self.assertListEqual(test['items'], self.data[:2])
         self.assertEqual(response.status_code, 200)
 
+    def test_get_breeds_ignore_case(self):
+        for query_string in [
+                {'name': 'texel'}, {'code': 'tex'}, {'species': 'sheep'},
+                {'name': 'TEXEL', 'species': 'SHEEP'}]:
+            response = self.client.get(
+                self.test_endpoint,
+                headers=self.headers,
+                query_string=query_string
+            )
+
+            test = response.json
+
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(self.data[0], test['items'])
+
+    def get_index_names(self, queryset):
+        """Return the indexes used by the winning plan of a query"""
+
+        names = []
+        plan = queryset.explain()["queryPlanner"]["winningPlan"]
+
+        # slot based execution engine plans are nested
+        stages = [plan.get("queryPlan", plan)]
+
+        while stages:
+            stage = stages.pop()
+            names += [stage["indexName"]] if "indexName" in stage else []
+            stages += stage.get("inputStages", [])
+            stages += [stage["inputStage"]] if "inputStage" in stage else []
+
+        return names
+
+    def test_get_breeds_use_indexes(self):
+        Breed.ensure_indexes()
+
+        for kwargs, index in [
+                ({'species': 'Sheep', 'name__in': ['texel']},
+                 'species_1_name_1'),
+                ({'species': 'Sheep', 'code__in': ['TEX', 'mer']},
+                 'species_1_code_1')]:
+            queryset = Breed.objects.filter(**kwargs)
+
+            self.assertIn(
+                index,
+                self.get_index_names(queryset.collation(BREED_COLLATION)))
+
+            # without collation, the indexes can't be used
+            self.assertNotIn(index, self.get_index_names(queryset))
+
     def test_get_breed_by_species(self):
         response = self.client.get(
             self.test_endpoint,
@@ -339,3 +554,85 @@ class TestGetBreed(BaseCase):
         self.assertIsInstance(test, dict)
         self.assertIn("Object does not exist", test["message"])
         self.assertEqual(response.status_code, 404)
+
+
+class TestBreedAutocomplete(BaseCase):
+    fixtures = [
+        'user',
+        'breeds'
+    ]
+
+    test_endpoint = '/smarter-api/breeds/autocomplete'
+
+    def get_names(self, **kwargs):
+        response = self.client.get(
+            self.test_endpoint,
+            headers=self.headers,
+            query_string=kwargs
+        )
+
+        self.assertEqual(response.status_code, 200)
+
+        return [item['name'] for item in response.json['items']]
+
+    def test_prefix(self):
+        response = self.client.get(
+            self.test_endpoint,
+            headers=self.headers,
+            query_string={'q': 'mer'}
+        )
+
+        test = response.json
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(test['items']), 1)
+        self.assertEqual(test['items'][0]['name'], 'Merino')
+        self.assertEqual(test['items'][0]['code'], 'MER')
+        self.assertEqual(test['items'][0]['species'], 'Sheep')
+        self.assertIn('$oid', test['items'][0]['_id'])
+
+    def test_case_and_accents(self):
+        self.assertEqual(self.get_names(q='TÉX'), ['Texel'])
+
+    def test_alias(self):
+        response = self.client.get(
+            self.test_endpoint,
+            headers=self.headers,
+            query_string={'q': 'merino_u', 'fuzzy': False}
+        )
+
+        test = response.json
+
+        self.assertEqual(len(test['items']), 1)
+        self.assertEqual(test['items'][0]['match'], 'MERINO_UY')
+
+    def test_fuzzy(self):
+        self.assertEqual(self.get_names(q='cashmire'), ['Cashmere'])
+        self.assertEqual(self.get_names(q='cashmire', fuzzy=False), [])
+
+    def test_species(self):
+        self.assertEqual(self.get_names(q='b', species='Goat'), ['Bari'])
+        self.assertEqual(self.get_names(q='b', species='Sheep'), [])
+
+    def test_ranking(self):
+        # exact code matches come before other matches
+        self.assertEqual(self.get_names(q='tex')[0], 'Texel')
+
+    def test_limit(self):
+        self.assertEqual(len(self.get_names(q='mer', limit=1)), 1)
+
+        response = self.client.get(
+            self.test_endpoint,
+            headers=self.headers,
+            query_string={'q': 'e', 'limit': 1000}
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_missing_query(self):
+        response = self.client.get(
+            self.test_endpoint,
+            headers=self.headers
+        )
+
+        self.assertEqual(response.status_code, 400)
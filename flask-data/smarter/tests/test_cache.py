@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 00:12:37 2026
+
+@author: Paolo Cozzi <bunop@libero.it>
+"""
+
+import fnmatch
+import tempfile
+import unittest
+
+from unittest.mock import patch
+
+from common.cache import (
+    MemoryResponseCache, SQLiteResponseCache, RedisResponseCache,
+    create_response_cache)
+
+
+class LocalRedis():
+    """A local stand-in of a redis client"""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def scan_iter(self, match="*"):
+        return [key for key in self.data if fnmatch.fnmatch(key, match)]
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def incr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+
+    def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+
+class ResponseCacheMixin():
+    def test_lookup(self):
+        self.assertIsNone(self.cache.lookup("key", 1))
+
+        self.cache.store("key", 1, b"value")
+        self.assertEqual(self.cache.lookup("key", 1), b"value")
+
+        stats = self.cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["hit_ratio"], 0.5)
+
+    def test_version(self):
+        self.cache.store("key", 1, b"value")
+        self.cache.store("other", 2, b"other")
+
+        self.assertIsNone(self.cache.lookup("key", 2))
+        self.assertEqual(self.cache.lookup("other", 2), b"other")
+
+    def test_max_item_bytes(self):
+        self.cache.store("key", 1, b"x" * 101)
+        self.assertIsNone(self.cache.lookup("key", 1))
+
+    def test_version_removed(self):
+        if isinstance(self.cache, RedisResponseCache):
+            self.skipTest("values of previous versions expire")
+
+        self.cache.store("key", 1, b"value")
+        self.cache.store("other", 2, b"other")
+
+        self.assertIsNone(self.cache.lookup("key", 1))
+
+    def test_clear(self):
+        self.cache.store("key", 1, b"value")
+        self.cache.clear()
+
+        self.assertIsNone(self.cache.lookup("key", 1))
+
+
+class MemoryResponseCacheTest(ResponseCacheMixin, unittest.TestCase):
+    def setUp(self):
+        self.cache = MemoryResponseCache(max_bytes=200, max_item_bytes=100)
+
+    def test_evict(self):
+        for key in ["a", "b", "c"]:
+            self.cache.store(key, 1, b"x" * 80)
+
+            # this is the most recently used value
+            self.cache.lookup("a", 1)
+
+        self.assertIsNotNone(self.cache.lookup("a", 1))
+        self.assertIsNone(self.cache.lookup("b", 1))
+        self.assertEqual(self.cache.stats()["bytes"], 160)
+
+
+class SQLiteResponseCacheTest(ResponseCacheMixin, unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = SQLiteResponseCache(
+            f"{self.tmpdir.name}/responses.sqlite3", max_bytes=200,
+            max_item_bytes=100)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_shared(self):
+        self.cache.store("key", 1, b"value")
+
+        # another worker
+        other = SQLiteResponseCache(self.cache.path)
+        self.assertEqual(other.lookup("key", 1), b"value")
+        self.assertIsNone(other.lookup("other", 1))
+
+        # counters are shared by workers
+        for cache in [self.cache, other]:
+            stats = cache.stats()
+            self.assertEqual(stats["hits"], 1)
+            self.assertEqual(stats["misses"], 1)
+
+    def test_size(self):
+        self.cache.store("key", 1, b"x" * 80)
+        self.cache.store("key", 1, b"x" * 50)
+        self.cache.store("other", 1, b"x" * 30)
+
+        self.assertEqual(self.cache.stats()["bytes"], 80)
+        self.assertEqual(self.cache.stats()["items"], 2)
+
+        # a new version replaces all the values
+        self.cache.store("key", 2, b"x" * 10)
+        self.assertEqual(self.cache.stats()["bytes"], 10)
+
+        self.cache.clear()
+        self.assertEqual(self.cache.stats()["bytes"], 0)
+
+    def test_evict(self):
+        with patch('common.cache.time.time', side_effect=range(10)):
+            for key in ["a", "b", "c"]:
+                self.cache.store(key, 1, b"x" * 80)
+
+        self.assertIsNone(self.cache.lookup("a", 1))
+        self.assertIsNotNone(self.cache.lookup("c", 1))
+        self.assertEqual(self.cache.stats()["bytes"], 160)
+
+
+class RedisResponseCacheTest(ResponseCacheMixin, unittest.TestCase):
+    def setUp(self):
+        self.cache = RedisResponseCache(LocalRedis(), max_item_bytes=100)
+
+    def test_shared(self):
+        self.cache.store("key", 1, b"value")
+
+        # another worker
+        other = RedisResponseCache(self.cache.client)
+        self.assertEqual(other.lookup("key", 1), b"value")
+        self.assertIsNone(other.lookup("other", 1))
+
+        # counters are shared by workers (and kept by clear)
+        self.cache.clear()
+        stats = self.cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+
+
+class CreateResponseCacheTest(unittest.TestCase):
+    def test_create(self):
+        self.assertIsNone(create_response_cache("none"))
+        self.assertIsInstance(
+            create_response_cache("memory"), MemoryResponseCache)
+        self.assertIsInstance(
+            create_response_cache("sqlite"), SQLiteResponseCache)
+        self.assertRaises(ValueError, create_response_cache, "foo")
+
+    def test_create_redis_missing(self):
+        with patch('common.cache.redis', None):
+            self.assertRaises(ValueError, create_response_cache, "redis")
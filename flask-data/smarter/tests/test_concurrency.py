@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 00:58:14 2026
+
+@author: Paolo Cozzi <bunop@libero.it>
+
+Send the same requests from many threads at the same time: responses need
+to be the same of the ones returned one request at a time
+"""
+
+import random
+
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from common.cache import MemoryResponseCache
+
+from .base import BaseCase
+
+# the number of threads sending requests
+THREADS = 8
+
+# the number of times each request is sent
+REPEAT = 10
+
+# requests with different arguments for the same views
+REQUESTS = [
+    ('/smarter-api/breeds', {'size': 1, 'page': 1}),
+    ('/smarter-api/breeds', {'size': 1, 'page': 2}),
+    ('/smarter-api/breeds', {'sort': 'name', 'order': 'desc'}),
+    ('/smarter-api/breeds', {'species': 'Goat', 'count': 'none'}),
+    ('/smarter-api/breeds', {'cursor': '*', 'size': 1, 'sort': 'code'}),
+    ('/smarter-api/breeds/autocomplete', {'q': 'me'}),
+    ('/smarter-api/countries', {'sort': 'name'}),
+    ('/smarter-api/datasets', {'search': 'test.map'}),
+    ('/smarter-api/datasets', {'species': 'Goat'}),
+    ('/smarter-api/samples/goat', {'breed': 'Bari'}),
+    ('/smarter-api/samples/goat', {'size': 1, 'page': 2}),
+    ('/smarter-api/samples/sheep', {'sort': 'smarter_id'}),
+    ('/smarter-api/samples/goat/stats', {}),
+    ('/smarter-api/variants/sheep/OAR3', {}),
+    ('/smarter-api/variants/sheep/OAR4', {'region': '23:26298007-26298027'}),
+    ('/smarter-api/variants/sheep/OAR4', {'size': 1, 'page': 2}),
+    ('/smarter-api/variants/goat/ARS1', {}),
+    ('/smarter-api/variants/goat/CHI1', {}),
+    ('/smarter-api/variants/sheep/OAR4/export', {'format': 'csv'}),
+    ('/smarter-api/info', {}),
+]
+
+
+class ConcurrencyTest(BaseCase):
+    fixtures = [
+        'user',
+        'breeds',
+        'countries',
+        'dataset',
+        'sampleGoat',
+        'sampleSheep',
+        'smarterInfo',
+        'variantGoat',
+        'variantSheep'
+    ]
+
+    def send(self, index: int):
+        endpoint, query_string = REQUESTS[index]
+
+        # every thread needs its own client
+        client = self.app.test_client()
+        response = client.get(
+            endpoint, headers=self.headers, query_string=query_string)
+
+        return response.status_code, response.get_data()
+
+    def get_references(self) -> list:
+        """Send each request, one at a time"""
+
+        references = []
+
+        for index, request in enumerate(REQUESTS):
+            status_code, data = self.send(index)
+
+            self.assertEqual(status_code, 200, request)
+            references.append(data)
+
+        return references
+
+    def hammer(self, references: list):
+        indexes = list(range(len(REQUESTS))) * REPEAT
+        random.Random(42).shuffle(indexes)
+
+        with ThreadPoolExecutor(max_workers=THREADS) as executor:
+            responses = executor.map(self.send, indexes)
+
+            for index, (status_code, data) in zip(indexes, responses):
+                self.assertEqual(status_code, 200, REQUESTS[index])
+                self.assertEqual(data, references[index], REQUESTS[index])
+
+    def test_concurrent_requests(self):
+        self.hammer(self.get_references())
+
+    def test_concurrent_cached_requests(self):
+        references = self.get_references()
+        cache = MemoryResponseCache()
+
+        with patch('common.views.response_cache', cache):
+            self.hammer(references)
+
+        self.assertEqual(cache.hits + cache.misses, len(REQUESTS) * REPEAT)
+        self.assertGreaterEqual(cache.misses, len(REQUESTS))
@@ -164,9 +164,51 @@ class TestGetDatasetList(BaseCase):
         self.assertEqual(test['total'], 1)
         self.assertIsInstance(test['items'], list)
         self.assertEqual(len(test['items']), 1)
-        self.assertListEqual(test['items'], [self.data[0]])
+
+        item = test['items'][0]
+        self.assertEqual(item.pop('matches'), ['archive/test.map'])
+        self.assertEqual(item, self.data[0])
+        self.assertEqual(response.status_code, 200)
+
+    def search(self, query):
+        response = self.client.get(
+            self.test_endpoint,
+            headers=self.headers,
+            query_string={'search': query, 'sort': 'file'}
+        )
+
         self.assertEqual(response.status_code, 200)
 
+        return {
+            item['file']: item['matches']
+            for item in response.json['items']
+        }
+
+    def test_get_datasets_by_search_prefix(self):
+        self.assertEqual(
+            self.search('final'), {'another_file.zip': ['finalreport.txt']})
+        self.assertEqual(
+            self.search('FILE'),
+            {'another_file.zip': [], 'test_file.zip': []})
+
+    def test_get_datasets_by_search_terms(self):
+        # all terms need to match
+        self.assertEqual(
+            self.search('archive ped'),
+            {'test_file.zip': [
+                'archive/', 'archive/test.map', 'archive/test.ped']})
+        self.assertEqual(
+            self.search('test_file snplist'), {})
+
+        # tokens of a term need to match the same content
+        self.assertEqual(
+            self.search('archive/test.p'),
+            {'test_file.zip': ['archive/test.ped']})
+
+    def test_get_datasets_by_search_no_matches(self):
+        self.assertEqual(self.search('foo'), {})
+        self.assertEqual(self.search('./'), {})
+
     def test_get_datasets_sort_by_file(self):
         response = self.client.get(
             self.test_endpoint,
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 19:40:52 2026
+
+@author: Paolo Cozzi <bunop@libero.it>
+"""
+
+import json
+import datetime
+
+from unittest.mock import patch
+
+from bson import ObjectId
+
+from common.encoders import (
+    CustomJSONEncoder, OrjsonJSONEncoder, get_json_encoder)
+from database.models import (
+    SampleGoat, VariantSheep, Dataset, SmarterInfo, SEX, SAMPLETYPE)
+
+from .base import BaseCase
+
+
+def dumps(obj, encoder, **kwargs):
+    kwargs.setdefault("separators", (",", ":"))
+
+    return json.dumps(
+        obj, cls=encoder, sort_keys=True, ensure_ascii=False, **kwargs)
+
+
+class EncoderTest(BaseCase):
+    fixtures = [
+        'user',
+        'dataset',
+        'sampleGoat',
+        'smarterInfo',
+        'variantSheep'
+    ]
+
+    def assertSameJSON(self, obj):
+        reference = dumps(obj, CustomJSONEncoder)
+        test = dumps(obj, OrjsonJSONEncoder)
+
+        self.assertEqual(test, reference)
+
+    def test_documents(self):
+        for model in [SampleGoat, VariantSheep, Dataset, SmarterInfo]:
+            for document in model.objects.all():
+                self.assertSameJSON(document)
+
+    def test_queryset(self):
+        self.assertSameJSON(SampleGoat.objects.all())
+
+    def test_objects(self):
+        self.assertSameJSON({
+            "_id": ObjectId("6092940199215a3814492195"),
+            "date": datetime.datetime(2021, 11, 19, 18, 59, 5),
+            "sex": SEX.MALE,
+            "type": SAMPLETYPE.FOREGROUND,
+            "values": [1, 2.5, None, True, "köppen"]
+        })
+
+    def test_indent(self):
+        data = list(SampleGoat.objects.all())
+
+        reference = dumps(data, CustomJSONEncoder, indent=2)
+        test = dumps(data, OrjsonJSONEncoder, indent=2)
+
+        self.assertEqual(json.loads(test), json.loads(reference))
+
+    def test_big_integer(self):
+        self.assertSameJSON({"value": 2 ** 70})
+
+    def test_unsupported(self):
+        self.assertRaises(TypeError, dumps, object(), CustomJSONEncoder)
+        self.assertRaises(TypeError, dumps, object(), OrjsonJSONEncoder)
+
+    def test_get_json_encoder(self):
+        self.assertEqual(get_json_encoder('stdlib'), CustomJSONEncoder)
+        self.assertEqual(get_json_encoder('orjson'), OrjsonJSONEncoder)
+        self.assertRaises(ValueError, get_json_encoder, 'foo')
+
+    def test_get_json_encoder_missing(self):
+        with patch('common.encoders.orjson', None):
+            self.assertRaises(ValueError, get_json_encoder, 'orjson')
+
+    def test_responses(self):
+        endpoints = [
+            '/smarter-api/datasets',
+            '/smarter-api/samples/goat',
+            '/smarter-api/samples/goat/6092940199215a3814492195',
+            '/smarter-api/variants/sheep/OAR4',
+            '/smarter-api/info'
+        ]
+
+        for endpoint in endpoints:
+            reference = self.client.get(endpoint, headers=self.headers)
+
+            with patch.object(self.app, 'json_encoder', OrjsonJSONEncoder):
+                test = self.client.get(endpoint, headers=self.headers)
+
+            self.assertEqual(test.status_code, 200)
+            self.assertEqual(test.json, reference.json)
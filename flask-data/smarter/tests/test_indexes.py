@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 17:20:41 2026
+
+@author: Paolo Cozzi <bunop@libero.it>
+"""
+
+import tempfile
+
+from unittest.mock import patch
+
+from database.models import VariantSheep
+from common.views import QUERY_LOG_PREFIX
+from database.models import BREED_COLLATION
+from commands.indexes import (
+    read_queries, suggest_index, get_plan_stages, has_prefix)
+
+from .base import BaseCase
+
+
+class IndexesCommandTest(BaseCase):
+    fixtures = [
+        'user',
+        'smarterInfo',
+        'variantSheep'
+    ]
+
+    def setUp(self):
+        self.runner = self.app.test_cli_runner()
+
+    def test_create_indexes(self):
+        result = self.runner.invoke(
+            args=["indexes", "create", "--collection", "variantSheep"])
+
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn(
+            "locations_assembly_position",
+            self.db['variantSheep'].index_information())
+        self.assertListEqual(VariantSheep.compare_indexes()["missing"], [])
+
+    def test_list_indexes(self):
+        result = self.runner.invoke(
+            args=["indexes", "list", "--collection", "variantSheep"])
+
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("variantSheep:", result.output)
+        self.assertIn("_id_", result.output)
+
+    def test_list_indexes_unknown_collection(self):
+        result = self.runner.invoke(
+            args=["indexes", "list", "--collection", "foo"])
+
+        self.assertNotEqual(result.exit_code, 0)
+        self.assertIn("Unknown collection", result.output)
+
+    def test_benchmark_region(self):
+        result = self.runner.invoke(
+            args=["indexes", "create", "--collection", "variantSheep"])
+
+        self.assertEqual(result.exit_code, 0)
+
+        result = self.runner.invoke(
+            args=[
+                "indexes", "benchmark-region", "sheep", "OAR4",
+                "23:26243210-26243220", "--repeat", "1"])
+
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("assembly_position", result.output)
+        self.assertIn("1 variants", result.output)
+
+
+class IndexAdvisorTest(BaseCase):
+    fixtures = [
+        'user',
+        'breeds',
+        'sampleSheep'
+    ]
+
+    def get_log_lines(
+            self, query_string: dict,
+            endpoint: str = '/smarter-api/samples/sheep') -> list:
+        with self.assertLogs(self.app.logger, 'INFO') as logs:
+            response = self.client.get(
+                endpoint,
+                headers=self.headers,
+                query_string=query_string
+            )
+
+        self.assertEqual(response.status_code, 200)
+
+        return [line for line in logs.output if QUERY_LOG_PREFIX in line]
+
+    def test_read_queries(self):
+        lines = self.get_log_lines({'breed': 'Texel'})
+        lines += self.get_log_lines({'breed': 'Merino'})
+        lines += self.get_log_lines({'country': 'Italy', 'sort': 'breed'})
+
+        queries = read_queries(lines)
+
+        # queries with the same shape are grouped
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(queries[0]['collection'], 'sampleSheep')
+        self.assertEqual(queries[0]['count'], 2)
+        self.assertDictEqual(
+            queries[0]['filter'], {'breed': {'$in': ['Merino']}})
+        self.assertListEqual(queries[1]['sort'], [['breed', 1]])
+
+        self.assertListEqual(read_queries(lines, 'sampleGoat'), [])
+
+    def test_read_queries_collation(self):
+        lines = self.get_log_lines({'breed': 'Texel'})
+        lines += self.get_log_lines(
+            {'species': 'Sheep'}, '/smarter-api/breeds')
+
+        queries = read_queries(lines)
+
+        # breed queries are replayed with their collation
+        self.assertEqual(len(queries), 2)
+        self.assertIsNone(queries[0]['collation'])
+        self.assertDictEqual(queries[1]['collation'], BREED_COLLATION)
+
+    def test_has_prefix(self):
+        keys = [('species', 1), ('name', 1)]
+
+        # collations are reported by the server with all their defaults
+        index_collation = {
+            **BREED_COLLATION, 'caseLevel': False, 'numericOrdering': False}
+
+        self.assertTrue(
+            has_prefix([(keys, index_collation)], keys[:1], BREED_COLLATION))
+        self.assertFalse(has_prefix([(keys, index_collation)], keys[:1]))
+        self.assertFalse(has_prefix([(keys, None)], keys, BREED_COLLATION))
+        self.assertTrue(has_prefix([(keys, None)], keys))
+        self.assertTrue(
+            has_prefix([(keys, {'locale': 'simple'})], keys))
+
+    def test_suggest_index(self):
+        for query, sort, keys in [
+                ({'breed': 'Texel', 'country': {'$in': ['Italy']}}, [],
+                 [('breed', 1), ('country', 1)]),
+                ({'country': {'$in': ['Italy']}}, [['breed', -1]],
+                 [('breed', -1), ('country', 1)]),
+                ({'phenotype': {'$exists': True}, 'type': 'background'},
+                 [['smarter_id', 1]],
+                 [('type', 1), ('smarter_id', 1), ('phenotype', 1)]),
+                ({'locations': {'$geoWithin': {}}}, [], [])]:
+            self.assertListEqual(suggest_index(query, sort), keys)
+
+    def test_get_plan_stages(self):
+        plan = {
+            'stage': 'FETCH',
+            'inputStage': {
+                'stage': 'OR',
+                'inputStages': [
+                    {'stage': 'IXSCAN', 'indexName': 'father_id_1'},
+                    {'stage': 'IXSCAN', 'indexName': 'mother_id_1'}
+                ]
+            }
+        }
+
+        self.assertListEqual(
+            get_plan_stages({'queryPlan': plan}),
+            [('FETCH', None), ('OR', None), ('IXSCAN', 'father_id_1'),
+             ('IXSCAN', 'mother_id_1')]
+        )
+
+    def test_advise(self):
+        lines = self.get_log_lines({'breed': 'Texel'})
+        lines += self.get_log_lines({'smarter_id': 'ITOA-TEX-000000001'})
+        lines += self.get_log_lines({'chip_name': 'IlluminaOvineSNP50'})
+        lines += self.get_log_lines({'original_id': 'sheep1', 'sort': 'sex'})
+
+        def explain_query(model, query):
+            if 'smarter_id' in query['filter']:
+                return {
+                    'stage': 'FETCH',
+                    'inputStage': {
+                        'stage': 'IXSCAN', 'indexName': 'smarter_id_1'}
+                }
+
+            return {'stage': 'COLLSCAN'}
+
+        with tempfile.NamedTemporaryFile('w', suffix='.log') as handle:
+            handle.write("\n".join(lines))
+            handle.flush()
+
+            with patch(
+                    'commands.indexes.explain_query',
+                    side_effect=explain_query):
+                # create the declared indexes but the chip_name one
+                self.app.test_cli_runner().invoke(
+                    args=["indexes", "create", "--collection", "sampleSheep"])
+                self.db['sampleSheep'].drop_index("chip_name_1_breed_1")
+
+                result = self.app.test_cli_runner().invoke(
+                    args=[
+                        "indexes", "advise", handle.name, "--collection",
+                        "sampleSheep"])
+
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("OK: smarter_id_1", result.output)
+        self.assertIn(
+            "COLLSCAN: index [('breed', 1)] exists", result.output)
+        self.assertIn(
+            "index [('chip_name', 1)] is declared but missing",
+            result.output)
+        self.assertIn(
+            "COLLSCAN: MISSING index [('original_id', 1), ('sex', 1)]",
+            result.output)
@@ -1,6 +1,11 @@
 # -*- coding: utf-8 -*-
 import json
 import pathlib
+import tempfile
+
+from unittest.mock import patch
+
+from common.info import smarter_info
 
 from .base import BaseCase
 
@@ -34,3 +39,55 @@ class TestSmarterInfo(BaseCase):
         self.assertIsInstance(test, dict)
         self.assertEqual(test, self.data)
         self.assertEqual(response.status_code, 200)
+
+
+class TestSmarterInfoCache(BaseCase):
+    fixtures = [
+        'user',
+        'smarterInfo'
+    ]
+
+    test_endpoint = '/smarter-api/info'
+
+    def setUp(self):
+        smarter_info.invalidate()
+
+    def tearDown(self):
+        self.db['smarterInfo'].update_one(
+            {"_id": "smarter"}, {"$set": {"version": "0.4.4.dev0"}})
+
+    def test_get_info_cached(self):
+        self.assertEqual(smarter_info.version, "0.4.4.dev0")
+
+        self.db['smarterInfo'].update_one(
+            {"_id": "smarter"}, {"$set": {"version": "0.4.5"}})
+
+        # database is not read again
+        response = self.client.get(self.test_endpoint, headers=self.headers)
+        self.assertEqual(response.json['version'], "0.4.4.dev0")
+
+        # read database status after invalidation
+        smarter_info.invalidate()
+
+        response = self.client.get(self.test_endpoint, headers=self.headers)
+        self.assertEqual(response.json['version'], "0.4.5")
+
+    def test_refresh_by_stamp(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with patch.object(
+                    smarter_info, "stamp", f"{tmpdir}/smarter.stamp"):
+                self.assertEqual(smarter_info.version, "0.4.4.dev0")
+
+                self.db['smarterInfo'].update_one(
+                    {"_id": "smarter"}, {"$set": {"version": "0.4.5"}})
+
+                runner = self.app.test_cli_runner()
+                result = runner.invoke(args=["smarter-info", "refresh"])
+
+                self.assertEqual(result.exit_code, 0)
+                self.assertEqual(smarter_info.version, "0.4.5")
+
+    def test_working_assemblies(self):
+        self.assertEqual(
+            smarter_info.working_assemblies["OAR4"],
+            ["Oar_v4.0", "SNPchiMp v.3"])
@@ -9,6 +9,16 @@ Created on Fri Jun 18 16:26:29 2021
 import json
 import pathlib
 
+from unittest.mock import patch
+
+from bson import ObjectId
+from flask import json as flask_json
+from werkzeug.urls import url_encode
+
+from database.models import SampleGoat
+from common.views import serialize_raw
+from resources.samples import stats_cache
+
 from .base import BaseCase
 
 FIXTURES_DIR = pathlib.Path(__file__).parent / "fixtures"
@@ -64,6 +74,18 @@ class SampleSheepTest(BaseCase):
         self.assertIn("Object does not exist", test["message"])
         self.assertEqual(response.status_code, 404)
 
+    def test_get_sample_fields(self):
+        response = self.client.get(
+            self.test_endpoint,
+            headers=self.headers,
+            query_string={'fields': 'smarter_id,breed'}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json,
+            {key: self.data[key] for key in ['_id', 'smarter_id', 'breed']})
+
 
 class SampleSheepListTest(BaseCase):
     fixtures = [
@@ -94,6 +116,50 @@ class SampleSheepListTest(BaseCase):
         self.assertListEqual(test['items'], self.data)
         self.assertEqual(response.status_code, 200)
 
+    def test_get_samples_fields(self):
+        response = self.client.get(
+            self.test_endpoint,
+            headers=self.headers,
+            query_string={'fields': ['smarter_id', 'breed,country']}
+        )
+
+        test = response.json
+        reference = [
+            {key: sample[key] for key in [
+                '_id', 'smarter_id', 'breed', 'country']}
+            for sample in self.data
+        ]
+
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual(test['items'], reference)
+
+    def test_get_samples_exclude(self):
+        response = self.client.get(
+            self.test_endpoint,
+            headers=self.headers,
+            query_string={'exclude': 'locations,metadata'}
+        )
+
+        test = response.json
+        reference = [
+            {key: value for key, value in sample.items()
+             if key not in ['locations', 'metadata']}
+            for sample in self.data
+        ]
+
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual(test['items'], reference)
+
+    def test_get_samples_invalid_fields(self):
+        response = self.client.get(
+            self.test_endpoint,
+            headers=self.headers,
+            query_string={'fields': 'smarter_id,genotype'}
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("genotype", str(response.json['message']))
+
     def test_get_samples_by_breed(self):
         response = self.client.get(
             self.test_endpoint,
@@ -386,6 +452,30 @@ class SampleSheepListTest(BaseCase):
         self.assertEqual(test, self.data[0])
         self.assertEqual(response.status_code, 200)
 
+    def test_get_samples_cursor_pagination_sparse_sort(self):
+        # one sample has no alias: null values sort first when ascending
+        # and last when descending
+        for order in ['asc', 'desc']:
+            payload = {'cursor': '*', 'size': 1, 'sort': 'alias',
+                       'order': order}
+            url = "?".join([self.test_endpoint, url_encode(payload)])
+            aliases = []
+
+            while url:
+                response = self.client.get(url, headers=self.headers)
+                self.assertEqual(response.status_code, 200)
+
+                test = response.json
+                aliases += [item.get('alias') for item in test['items']]
+                url = test['next']
+
+            expected = [None, 'sheep-one']
+
+            if order == 'desc':
+                expected.reverse()
+
+            self.assertListEqual(aliases, expected)
+
     def test_get_samples_unknown_arguments(self):
         response = self.client.get(
             self.test_endpoint,
@@ -432,6 +522,320 @@ class SampleSheepListTest(BaseCase):
         self.assertListEqual(test['items'], [])
 
 
+class SampleSheepStatsTest(BaseCase):
+    fixtures = [
+        'user',
+        'sampleSheep'
+    ]
+
+    test_endpoint = '/smarter-api/samples/sheep/stats'
+
+    def setUp(self):
+        stats_cache.clear()
+
+    def test_get_stats(self):
+        response = self.client.get(
+            self.test_endpoint,
+            headers=self.headers
+        )
+
+        test = response.json
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(test['total'], 2)
+        self.assertEqual(
+            test['country'],
+            [{"value": "France", "count": 1}, {"value": "Italy", "count": 1}]
+        )
+        self.assertEqual(
+            test['dataset'],
+            [
+                {"value": {"$oid": "604f75a61a08c53cebd09b58"}, "count": 1},
+                {"value": {"$oid": "604f75a61a08c53cebd09b5b"}, "count": 1}
+            ]
+        )
+        self.assertEqual(test['sex'], [{"value": None, "count": 2}])
+        self.assertEqual(
+            sorted(test.keys()),
+            ['breed', 'breed_code', 'chip_name', 'country', 'dataset', 'sex',
+             'total', 'type']
+        )
+
+    def test_get_stats_by_breed(self):
+        response = self.client.get(
+            self.test_endpoint,
+            headers=self.headers,
+            query_string={'breed': 'Texel'}
+        )
+
+        test = response.json
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(test['total'], 1)
+        self.assertEqual(test['breed'], [{"value": "Texel", "count": 1}])
+        self.assertEqual(
+            test['type'], [{"value": "background", "count": 1}])
+
+    def test_get_stats_no_results(self):
+        response = self.client.get(
+            self.test_endpoint,
+            headers=self.headers,
+            query_string={'breed': 'foo'}
+        )
+
+        test = response.json
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(test['total'], 0)
+        self.assertEqual(test['breed'], [])
+
+    def test_get_stats_cached(self):
+        self.client.get(self.test_endpoint, headers=self.headers)
+        hits = stats_cache.hits
+
+        response = self.client.get(self.test_endpoint, headers=self.headers)
+
+        self.assertEqual(response.json['total'], 2)
+        self.assertEqual(stats_cache.hits, hits + 1)
+
+    def test_get_stats_pagination_args(self):
+        response = self.client.get(
+            self.test_endpoint,
+            headers=self.headers,
+            query_string={'page': 2}
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_get_stats_geo_within_sphere(self):
+        response = self.client.post(
+            self.test_endpoint,
+            headers=self.headers,
+            json={
+                "geo_within_sphere": [
+                    [9.18, 45.46],
+                    10  # Km
+                ]
+            }
+        )
+
+        test = response.json
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(test['total'], 0)
+
+
+class SampleSheepBatchTest(BaseCase):
+    fixtures = [
+        'user',
+        'sampleSheep'
+    ]
+
+    test_endpoint = '/smarter-api/samples/sheep/batch'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        with open(f"{FIXTURES_DIR}/sampleSheep.json") as handle:
+            cls.data = json.load(handle)
+
+    def post(self, payload):
+        response = self.client.post(
+            self.test_endpoint,
+            headers=self.headers,
+            json=payload
+        )
+
+        if response.status_code != 200:
+            return response, None
+
+        return response, [
+            json.loads(line) for line in response.data.splitlines()]
+
+    def test_batch_samples(self):
+        # values are returned in the requested order, with duplicates
+        values = [
+            "ITOA-MER-000000002", "foo", "ITOA-TEX-000000001",
+            "ITOA-MER-000000002"
+        ]
+
+        for chunk_size in [1000, 1]:
+            with patch('resources.samples.BATCH_CHUNK_SIZE', chunk_size):
+                response, test = self.post({"values": values})
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.mimetype, "application/x-ndjson")
+            self.assertListEqual([item['query'] for item in test], values)
+            self.assertListEqual(
+                [item['found'] for item in test], [True, False, True, True])
+            self.assertListEqual(test[0]['items'], [self.data[1]])
+            self.assertListEqual(test[1]['items'], [])
+            self.assertListEqual(test[2]['items'], [self.data[0]])
+            self.assertListEqual(test[3]['items'], [self.data[1]])
+
+    def test_batch_samples_by_key(self):
+        for key, value, index in [
+                ('original_id', 'sheep2', 1),
+                ('alias', 'sheep-one', 0)]:
+            response, test = self.post({"key": key, "values": [value]})
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(test), 1)
+            self.assertTrue(test[0]['found'])
+            self.assertListEqual(test[0]['items'], [self.data[index]])
+
+    def test_batch_samples_errors(self):
+        for payload in [
+                {},
+                {"values": "ITOA-TEX-000000001"},
+                {"values": [1]},
+                {"key": "breed", "values": ["Texel"]}]:
+            response, _ = self.post(payload)
+            self.assertEqual(response.status_code, 400, payload)
+
+        with patch('resources.samples.BATCH_MAX_VALUES', 1):
+            response, _ = self.post({"values": ["foo", "bar"]})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("too many values", response.json['message']['values'])
+
+
+class SampleSheepPedigreeTest(BaseCase):
+    fixtures = [
+        'user',
+        'sampleSheep'
+    ]
+
+    test_endpoint = '/smarter-api/samples/sheep/{}/pedigree'
+
+    # grandparents, parents, a child and a grandchild
+    pedigree = {
+        'grandfather': {},
+        'grandmother': {},
+        'father': {'father_id': 'grandfather', 'mother_id': 'grandmother'},
+        'mother': {},
+        'child': {'father_id': 'father', 'mother_id': 'mother'},
+        'grandchild': {'father_id': 'child'},
+    }
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.ids = {name: ObjectId() for name in cls.pedigree}
+
+        cls.db['sampleSheep'].insert_many([
+            {
+                '_id': cls.ids[name],
+                'original_id': name,
+                'smarter_id': f"ITOA-TEX-{name}",
+                'country': 'Italy',
+                'species': 'Ovis aries',
+                'breed': 'Texel',
+                'breed_code': 'TEX',
+                'type': 'background',
+                **{
+                    field: cls.ids[parent]
+                    for field, parent in parents.items()
+                }
+            }
+            for name, parents in cls.pedigree.items()
+        ])
+
+    def get(self, name, **query_string):
+        return self.client.get(
+            self.test_endpoint.format(self.ids.get(name, name)),
+            headers=self.headers,
+            query_string=query_string
+        )
+
+    def get_names(self, test):
+        return {node['original_id']: node['depth'] for node in test['nodes']}
+
+    def get_edges(self, test):
+        names = {node['_id']['$oid']: node['original_id']
+                 for node in test['nodes']}
+
+        return {
+            (names[edge['child']['$oid']], names[edge['parent']['$oid']],
+             edge['relation'])
+            for edge in test['edges']
+        }
+
+    def test_get_ancestors(self):
+        response = self.get('child')
+        test = response.json
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(test['root'], {'$oid': str(self.ids['child'])})
+        self.assertEqual(test['direction'], 'ancestors')
+        self.assertDictEqual(
+            self.get_names(test),
+            {'child': 0, 'father': 1, 'mother': 1, 'grandfather': 2,
+             'grandmother': 2}
+        )
+        self.assertSetEqual(
+            self.get_edges(test),
+            {
+                ('child', 'father', 'father'),
+                ('child', 'mother', 'mother'),
+                ('father', 'grandfather', 'father'),
+                ('father', 'grandmother', 'mother')
+            }
+        )
+
+    def test_get_ancestors_depth(self):
+        response = self.get('grandchild', depth=1)
+        test = response.json
+
+        self.assertEqual(response.status_code, 200)
+        self.assertDictEqual(
+            self.get_names(test), {'grandchild': 0, 'child': 1})
+        self.assertSetEqual(
+            self.get_edges(test), {('grandchild', 'child', 'father')})
+
+    def test_get_descendants(self):
+        response = self.get('grandmother', direction='descendants')
+        test = response.json
+
+        self.assertEqual(response.status_code, 200)
+        self.assertDictEqual(
+            self.get_names(test),
+            {'grandmother': 0, 'father': 1, 'child': 2, 'grandchild': 3}
+        )
+
+        # the other parents aren't descendants
+        self.assertSetEqual(
+            self.get_edges(test),
+            {
+                ('father', 'grandmother', 'mother'),
+                ('child', 'father', 'father'),
+                ('grandchild', 'child', 'father')
+            }
+        )
+
+    def test_get_no_parents(self):
+        response = self.get('608ab4b191a0d06725bc0938')
+        test = response.json
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(test['nodes']), 1)
+        self.assertEqual(test['nodes'][0]['smarter_id'], 'ITOA-TEX-000000001')
+        self.assertListEqual(test['edges'], [])
+
+    def test_get_pedigree_errors(self):
+        for name, query_string, status_code in [
+                ('foo', {}, 400),
+                ('604f75a61a08c53cebd09b58', {}, 404),
+                ('child', {'depth': 0}, 400),
+                ('child', {'depth': 11}, 400),
+                ('child', {'direction': 'foo'}, 400),
+                ('child', {'foo': 'bar'}, 400)]:
+            response = self.get(name, **query_string)
+            self.assertEqual(response.status_code, status_code, query_string)
+
+
 class SampleGoatTest(BaseCase):
     fixtures = [
         'user',
@@ -482,6 +886,20 @@ class SampleGoatTest(BaseCase):
         self.assertIn("Object does not exist", test["message"])
         self.assertEqual(response.status_code, 404)
 
+    def test_serialize_raw(self):
+        queryset = SampleGoat.objects.all()
+
+        with self.app.app_context():
+            reference = [
+                flask_json.dumps(sample) for sample in queryset]
+            test = [
+                flask_json.dumps(sample)
+                for sample in serialize_raw(
+                    SampleGoat, queryset.as_pymongo())
+            ]
+
+        self.assertEqual(test, reference)
+
 
 class SampleGoatListTest(BaseCase):
     fixtures = [
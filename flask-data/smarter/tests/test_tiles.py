@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 21:52:07 2026
+
+@author: Paolo Cozzi <bunop@libero.it>
+"""
+
+import os
+import pathlib
+import tempfile
+import unittest
+
+from unittest.mock import patch
+
+from common.cache import DiskCache
+from common.mvt import lonlat_to_tile, tile_bounds
+from resources.tiles import TILE_CACHE_MAX_ZOOM
+
+from .base import BaseCase
+
+
+def read_varint(data: bytes, pos: int) -> tuple:
+    result = shift = 0
+
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        shift += 7
+
+        if not byte & 0x80:
+            return result, pos
+
+
+def read_fields(data: bytes):
+    """Read (field, value) from a protobuf message"""
+
+    pos = 0
+
+    while pos < len(data):
+        key, pos = read_varint(data, pos)
+        field, wire_type = key >> 3, key & 0x7
+
+        if wire_type == 0:
+            value, pos = read_varint(data, pos)
+
+        elif wire_type == 1:
+            value, pos = data[pos:pos + 8], pos + 8
+
+        else:
+            length, pos = read_varint(data, pos)
+            value, pos = data[pos:pos + length], pos + length
+
+        yield field, value
+
+
+def read_packed(data: bytes) -> list:
+    values, pos = [], 0
+
+    while pos < len(data):
+        value, pos = read_varint(data, pos)
+        values.append(value)
+
+    return values
+
+
+def decode_tile(data: bytes) -> dict:
+    """Decode the string properties of vector tile features"""
+
+    layers = {}
+
+    for _, layer_data in read_fields(data):
+        name, features, keys, values = None, [], [], []
+
+        for field, value in read_fields(layer_data):
+            if field == 1:
+                name = value.decode()
+
+            elif field == 2:
+                features.append(dict(read_fields(value)))
+
+            elif field == 3:
+                keys.append(value.decode())
+
+            elif field == 4:
+                values.append(dict(read_fields(value)).get(1, b"").decode())
+
+        layers[name] = []
+
+        for feature in features:
+            tags = read_packed(feature[2])
+
+            layers[name].append({
+                keys[tags[i]]: values[tags[i + 1]]
+                for i in range(0, len(tags), 2)
+            })
+
+    return layers
+
+
+class MVTTest(unittest.TestCase):
+    def test_lonlat_to_tile(self):
+        x, y = lonlat_to_tile(9.1859243, 45.4654219, 5)
+
+        self.assertEqual((int(x), int(y)), (16, 11))
+
+    def test_tile_bounds(self):
+        west, south, east, north = tile_bounds(0, 0, 0)
+
+        self.assertEqual((west, east), (-180, 180))
+        self.assertAlmostEqual(north, 85.0511287798)
+        self.assertAlmostEqual(south, -85.0511287798)
+
+
+class DiskCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = DiskCache(self.tmpdir.name)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_get(self):
+        self.assertEqual(self.cache.get("key", 1, lambda: b"value"), b"value")
+        self.assertEqual(self.cache.get("key", 1, lambda: b"other"), b"value")
+        self.assertEqual(self.cache.hits, 1)
+        self.assertEqual(self.cache.misses, 1)
+
+    def test_version(self):
+        self.cache.get("key", 1, lambda: b"value")
+        self.assertEqual(self.cache.get("key", 2, lambda: b"other"), b"other")
+
+        # values of previous version are removed
+        self.assertFalse(self.cache.get_version_dir(1).exists())
+
+    def test_evict(self):
+        cache = DiskCache(self.tmpdir.name, max_bytes=200)
+
+        for key in ["a", "b"]:
+            cache.store(key, 1, b"x" * 80)
+
+        # 'b' is the least recently used value
+        os.utime(cache.get_path("b", 1), (0, 0))
+
+        cache.store("c", 1, b"x" * 80)
+
+        self.assertIsNotNone(cache.lookup("a", 1))
+        self.assertIsNone(cache.lookup("b", 1))
+        self.assertIsNotNone(cache.lookup("c", 1))
+
+
+class SampleGoatTileTest(BaseCase):
+    fixtures = [
+        'user',
+        'sampleGoat'
+    ]
+
+    test_endpoint = '/smarter-api/samples.mvt/goat'
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.tmpdir_path = pathlib.Path(self.tmpdir.name)
+        self.cache = DiskCache(self.tmpdir.name)
+
+        patcher = patch('resources.tiles.tile_cache', self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def get_tile(self, tile, **kwargs):
+        response = self.client.get(
+            f"{self.test_endpoint}/{tile}",
+            headers=self.headers,
+            **kwargs
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.mimetype, "application/vnd.mapbox-vector-tile")
+
+        return decode_tile(response.data)['samples']
+
+    def test_get_tile(self):
+        features = self.get_tile("0/0/0")
+
+        self.assertEqual(
+            sorted(feature['smarter_id'] for feature in features),
+            ["ESCH-MAL-000000001", "ESCH-MAL-000000002"])
+        self.assertEqual(features[0]['country'], "France")
+
+    def test_get_tile_by_breed(self):
+        features = self.get_tile("0/0/0", query_string={'breed': 'Bari'})
+
+        self.assertEqual(len(features), 1)
+        self.assertEqual(features[0]['breed'], "Bari")
+
+    def test_get_tile_zoom(self):
+        features = self.get_tile("5/16/11")
+
+        self.assertEqual(len(features), 1)
+        self.assertEqual(features[0]['smarter_id'], "ESCH-MAL-000000002")
+
+    def test_get_tile_max_features(self):
+        # the whole collection is a superset of the tile samples: the first
+        # sample is outside the tile and doesn't count
+        with patch('resources.tiles.TILE_MAX_FEATURES', 1), patch(
+                'resources.tiles.add_bbox_filter',
+                side_effect=lambda matches, bbox: matches):
+            features = self.get_tile("5/16/11")
+
+        self.assertEqual(len(features), 1)
+        self.assertEqual(features[0]['smarter_id'], "ESCH-MAL-000000002")
+
+    def test_get_tile_cached(self):
+        self.get_tile("0/0/0")
+        self.get_tile("0/0/0")
+
+        self.assertEqual(self.cache.misses, 1)
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_get_tile_not_cached(self):
+        x, y = lonlat_to_tile(9.1859243, 45.4654219, TILE_CACHE_MAX_ZOOM + 1)
+
+        with patch(
+                'resources.tiles.add_bbox_filter',
+                side_effect=lambda matches, bbox: matches):
+            # an empty tile
+            self.assertEqual(self.get_tile("5/0/0"), [])
+
+            # a tile with a high zoom level
+            features = self.get_tile(
+                f"{TILE_CACHE_MAX_ZOOM + 1}/{int(x)}/{int(y)}")
+            self.assertEqual(len(features), 1)
+
+        self.assertListEqual(list(self.tmpdir_path.glob("*/*/*")), [])
+        self.assertEqual(self.cache.misses, 1)
+
+    def test_get_tile_not_found(self):
+        response = self.client.get(
+            f"{self.test_endpoint}/0/1/0",
+            headers=self.headers
+        )
+
+        self.assertEqual(response.status_code, 404)
@@ -8,10 +8,21 @@ Created on Mon Jun 21 15:53:51 2021
 
 import json
 import pathlib
+import datetime
+
+from unittest.mock import patch
 
 from dateutil.parser import parse as parse_date
 from bson import json_util
 
+from flask import json as flask_json
+
+from database.models import (
+    VariantSheep, FlatVariantsInfo, bulk_to_mongo, complement,
+    get_illumina_top)
+from common.info import smarter_info
+from resources.variants import VariantListMixin, flat_versions
+
 from .base import BaseCase
 
 FIXTURES_DIR = pathlib.Path(__file__).parent / "fixtures"
@@ -88,6 +99,26 @@ class VariantSheepTest(DateMixin, BaseCase):
         self.assertIn("Object does not exist", test["message"])
         self.assertEqual(response.status_code, 404)
 
+    def test_bulk_to_mongo(self):
+        queryset = VariantSheep.objects.all()
+
+        with self.app.app_context():
+            reference = [
+                flask_json.dumps(variant) for variant in queryset]
+            test = [
+                flask_json.dumps(json_util._json_convert(variant))
+                for variant in bulk_to_mongo(
+                    VariantSheep, queryset.as_pymongo())
+            ]
+
+        self.assertEqual(test, reference)
+
+    def test_complement(self):
+        self.assertEqual(complement("A/G"), "T/C")
+        self.assertEqual(get_illumina_top("A/G", "BOT"), "T/C")
+        self.assertEqual(get_illumina_top("A/G", "TOP"), "A/G")
+        self.assertRaises(KeyError, complement, "A/N")
+
 
 class VariantSheepListMixin(DateMixin):
     # print out all the differences
@@ -266,6 +297,34 @@ class VariantSheepListMixin(DateMixin):
         self.assertIsNotNone(test['next'])
         self.assertEqual(response.status_code, 200)
 
+    def test_get_variant_cursor_pagination(self):
+        payload = {'cursor': '*', 'size': 1}
+
+        response = self.client.get(
+            self.test_endpoint,
+            headers=self.headers,
+            query_string=payload,
+        )
+
+        test = response.json
+
+        self.assertIsNone(test['total'])
+        self.assertListEqual(test['items'], self.data[:1])
+        self.assertIsNone(test['prev'])
+        self.assertIsNotNone(test['next'])
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(
+            test['next'],
+            headers=self.headers
+        )
+
+        test = response.json
+
+        self.assertListEqual(test['items'], self.data[1:])
+        self.assertIsNone(test['next'])
+        self.assertEqual(response.status_code, 200)
+
     def test_get_variant_sort_by_name(self):
         response = self.client.get(
             self.test_endpoint,
@@ -409,6 +468,354 @@ class VariantSheepOAR4Test(DateMixin, BaseCase):
         self.assertListEqual(test['items'], self.data)
         self.assertEqual(response.status_code, 200)
 
+    def test_export_variants(self):
+        response = self.client.get(
+            self.test_endpoint + "/export",
+            headers=self.headers
+        )
+
+        test = [json.loads(line) for line in response.data.splitlines()]
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        self.assertEqual(response.headers['X-Total-Count'], "2")
+        self.assertListEqual(test, self.data)
+
+    def test_export_variants_by_name(self):
+        response = self.client.get(
+            self.test_endpoint + "/export",
+            headers=self.headers,
+            query_string={'name': '250506CS3900140500001_312.1'}
+        )
+
+        test = [json.loads(line) for line in response.data.splitlines()]
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['X-Total-Count'], "1")
+        self.assertListEqual(test, [self.data[1]])
+
+    def test_export_variants_csv(self):
+        response = self.client.get(
+            self.test_endpoint + "/export",
+            headers=self.headers,
+            query_string={'format': 'csv', 'region': '23'}
+        )
+
+        lines = response.data.decode().splitlines()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "text/csv")
+        self.assertIn(
+            "variantSheep_OAR4.csv", response.headers['Content-Disposition'])
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].startswith("name,rs_id,chip_name"))
+        self.assertEqual(
+            lines[1],
+            "250506CS3900140500001_312.1,rs55630642,"
+            "IlluminaOvineSNP50;IlluminaOvineHDSNP;AffymetrixAxiomBGovisNP,"
+            "AX-123240316,Affx-122809524,250506CS3900140500001_312_01,"
+            "23,26243215,C/T,T/C,bottom,A/G,,forward")
+
+    def test_export_variants_tsv(self):
+        response = self.client.get(
+            self.test_endpoint + "/export",
+            headers=self.headers,
+            query_string={'format': 'tsv'}
+        )
+
+        lines = response.data.decode().splitlines()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "text/tab-separated-values")
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(len(lines[1].split("\t")), 14)
+
+    def test_export_variants_wrong_format(self):
+        response = self.client.get(
+            self.test_endpoint + "/export",
+            headers=self.headers,
+            query_string={'format': 'xlsx'}
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("format", response.json['message'])
+
+    def test_batch_variants(self):
+        response = self.client.post(
+            self.test_endpoint + "/batch",
+            headers=self.headers,
+            json={
+                "values": [
+                    "250506CS3900140500001_312.1",
+                    "foo",
+                    self.data[0]['name']
+                ]
+            }
+        )
+
+        test = [json.loads(line) for line in response.data.splitlines()]
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        self.assertEqual(len(test), 3)
+
+        self.assertEqual(test[0]['query'], "250506CS3900140500001_312.1")
+        self.assertTrue(test[0]['found'])
+        self.assertListEqual(test[0]['items'], [self.data[1]])
+
+        self.assertEqual(test[1]['query'], "foo")
+        self.assertFalse(test[1]['found'])
+        self.assertListEqual(test[1]['items'], [])
+
+        self.assertListEqual(test[2]['items'], [self.data[0]])
+
+    def test_batch_variants_by_probeset_id(self):
+        response = self.client.post(
+            self.test_endpoint + "/batch",
+            headers=self.headers,
+            json={
+                "key": "probeset_id",
+                "values": ["AX-123240316"]
+            }
+        )
+
+        test = [json.loads(line) for line in response.data.splitlines()]
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(test), 1)
+        self.assertListEqual(test[0]['items'], [self.data[1]])
+
+    def test_batch_variants_wrong_key(self):
+        response = self.client.post(
+            self.test_endpoint + "/batch",
+            headers=self.headers,
+            json={
+                "key": "foo",
+                "values": ["rs55630642"]
+            }
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("key", response.json['message'])
+
+    def test_batch_variants_wrong_values(self):
+        response = self.client.post(
+            self.test_endpoint + "/batch",
+            headers=self.headers,
+            json={
+                "key": "rs_id",
+                "values": "rs55630642"
+            }
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("values", response.json['message'])
+
+    def test_get_variants_fields(self):
+        response = self.client.get(
+            self.test_endpoint,
+            headers=self.headers,
+            query_string={'fields': 'name,locations'}
+        )
+
+        test = response.json
+        reference = [
+            {key: variant[key] for key in ['_id', 'name', 'locations']}
+            for variant in self.data
+        ]
+
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual(test['items'], reference)
+
+    def test_get_variants_exclude(self):
+        response = self.client.get(
+            self.test_endpoint,
+            headers=self.headers,
+            query_string={'exclude': ['locations', 'sequence']}
+        )
+
+        test = response.json
+
+        self.assertEqual(response.status_code, 200)
+
+        for variant, item in zip(self.data, test['items']):
+            self.assertNotIn('locations', item)
+            self.assertNotIn('sequence', item)
+            self.assertEqual(item['name'], variant['name'])
+            self.assertEqual(item['rs_id'], variant['rs_id'])
+
+    def test_get_variants_fields_cursor(self):
+        response = self.client.get(
+            self.test_endpoint,
+            headers=self.headers,
+            query_string={
+                'fields': 'rs_id', 'cursor': '*', 'size': 1,
+                'sort': 'name'}
+        )
+
+        test = response.json
+
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual(
+            test['items'],
+            [{'_id': self.data[0]['_id'], 'rs_id': self.data[0]['rs_id']}])
+
+        response = self.client.get(test['next'], headers=self.headers)
+        test = response.json
+
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual(
+            test['items'],
+            [{'_id': self.data[1]['_id'], 'rs_id': self.data[1]['rs_id']}])
+
+    def test_get_variants_fields_all(self):
+        response = self.client.get(
+            self.test_endpoint,
+            headers=self.headers,
+            query_string={'fields': 'name,sender,illumina_top'}
+        )
+
+        test = response.json
+
+        self.assertEqual(response.status_code, 200)
+
+        for item in test['items']:
+            self.assertListEqual(
+                sorted(item.keys()),
+                ['_id', 'illumina_top', 'name', 'sender'])
+
+    def test_get_variants_invalid_fields(self):
+        for query_string in [{'fields': 'foo'}, {'exclude': 'name,foo'}]:
+            response = self.client.get(
+                self.test_endpoint,
+                headers=self.headers,
+                query_string=query_string
+            )
+
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("foo", str(response.json['message']))
+
+
+class VariantSheepOAR4FlatTest(VariantSheepOAR4Test):
+    """Read the same data from the flat variant collection"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        runner = cls.app.test_cli_runner()
+        result = runner.invoke(args=["variants", "rebuild-flat"])
+
+        if result.exit_code != 0:
+            raise result.exception
+
+        cls.patcher = patch.object(
+            VariantListMixin, "use_flat_collection", True)
+        cls.patcher.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.patcher.stop()
+        super().tearDownClass()
+
+    def test_rebuild_flat(self):
+        # a document for each variant and sheep assembly
+        self.assertEqual(self.db['variantSheepFlat'].count_documents({}), 4)
+        self.assertEqual(
+            self.db['variantSheepFlat'].count_documents(
+                {"assembly": "OAR4", "chrom": "23"}),
+            1)
+
+        # the temporary collection is indexed, then renamed
+        self.assertNotIn(
+            'variantSheepFlat_tmp', self.db.list_collection_names())
+        self.assertIn(
+            "assembly_1_chrom_1_position_1",
+            self.db['variantSheepFlat'].index_information())
+
+        # the data import flat variants were derived from
+        self.assertEqual(
+            FlatVariantsInfo.objects.get(pk='variantSheepFlat').last_updated,
+            smarter_info.last_updated)
+
+    def test_get_variants_stale_flat(self):
+        info = FlatVariantsInfo.objects.get(pk='variantSheepFlat')
+        last_updated = info.last_updated
+
+        # simulate a data import after rebuilding flat variants
+        info.last_updated = last_updated - datetime.timedelta(days=1)
+        info.save()
+        flat_versions.clear()
+
+        try:
+            with self.assertLogs(self.app.logger, 'WARNING') as logs:
+                response = self.client.get(
+                    self.test_endpoint,
+                    headers=self.headers,
+                    query_string={'region': '23:26243210-26243220'}
+                )
+
+        finally:
+            info.last_updated = last_updated
+            info.save()
+
+        # variants are read from their collection
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual(response.json['items'], [self.data[1]])
+        self.assertTrue(any("rebuild-flat" in line for line in logs.output))
+
+    def test_get_variant_by_region(self):
+        response = self.client.get(
+            self.test_endpoint,
+            headers=self.headers,
+            query_string={
+                'region': '23:26243210-26243220'
+            }
+        )
+
+        test = response.json
+
+        self.assertEqual(test['total'], 1)
+        self.assertListEqual(test['items'], [self.data[1]])
+        self.assertEqual(response.status_code, 200)
+
+    def test_get_variants_fields_all(self):
+        # those fields aren't stored in flat variants
+        for fields in ['sender', 'illumina_top', 'name,sender']:
+            response = self.client.get(
+                self.test_endpoint,
+                headers=self.headers,
+                query_string={'fields': fields}
+            )
+
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("flat variants", response.json['message']['fields'])
+
+        # other fields are selected like variants
+        response = self.client.get(
+            self.test_endpoint,
+            headers=self.headers,
+            query_string={'fields': 'name', 'exclude': 'name'}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual(
+            response.json['items'],
+            [{'_id': variant['_id']} for variant in self.data])
+
+    def test_get_variant_by_probeset_id(self):
+        response = self.client.get(
+            self.test_endpoint,
+            headers=self.headers,
+            query_string={'probeset_id': 'AX-123240316'}
+        )
+
+        test = response.json
+
+        self.assertEqual(test['total'], 1)
+        self.assertListEqual(test['items'], [self.data[1]])
+        self.assertEqual(response.status_code, 200)
+
 
 class VariantGoatTest(DateMixin, BaseCase):
     fixtures = [
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 23:41:26 2026
+
+@author: Paolo Cozzi <bunop@libero.it>
+"""
+
+import datetime
+import tempfile
+
+from unittest.mock import patch
+
+from flask_restful import reqparse
+
+from common.cache import MemoryResponseCache, SQLiteResponseCache
+from resources.breeds import BreedListApi
+from resources.samples import SampleListMixin, SampleGoatListApi
+from resources.variants import VariantSheepOAR4Api
+
+from .base import BaseCase
+
+
+class ConditionalViewTest(BaseCase):
+    fixtures = [
+        'user',
+        'breeds',
+        'smarterInfo'
+    ]
+
+    test_endpoint = '/smarter-api/breeds'
+
+    def get(self, endpoint=None, query_string=None, **headers):
+        return self.client.get(
+            endpoint or self.test_endpoint,
+            headers={**self.headers, **headers},
+            query_string=query_string
+        )
+
+    def test_validators(self):
+        response = self.get()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(response.get_etag()[0])
+        self.assertTrue(response.get_etag()[1])
+        self.assertEqual(
+            response.headers['Last-Modified'],
+            "Fri, 19 Nov 2021 18:59:05 GMT")
+        self.assertIn("no-cache", response.headers['Cache-Control'])
+
+    def test_if_none_match(self):
+        etag = self.get().headers['ETag']
+
+        with patch('resources.breeds.BreedListApi.get_queryset') as mocked:
+            response = self.get(If_None_Match=etag)
+
+            # no query was made
+            mocked.assert_not_called()
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b"")
+        self.assertEqual(response.headers['ETag'], etag)
+
+    def test_if_none_match_query(self):
+        # query arguments are normalized
+        etag = self.get(
+            self.test_endpoint + "?code=TEX&code=MER&species=Sheep"
+        ).headers['ETag']
+
+        response = self.get(
+            self.test_endpoint + "?species=Sheep&code=MER&code=TEX",
+            If_None_Match=etag)
+        self.assertEqual(response.status_code, 304)
+
+        response = self.get(
+            query_string={'species': 'Goat'}, If_None_Match=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_modified_since(self):
+        response = self.get(
+            If_Modified_Since="Fri, 19 Nov 2021 18:59:05 GMT")
+        self.assertEqual(response.status_code, 304)
+
+        response = self.get(
+            If_Modified_Since="Fri, 19 Nov 2021 18:00:00 GMT")
+        self.assertEqual(response.status_code, 200)
+
+    def test_data_version(self):
+        etag = self.get().headers['ETag']
+
+        with patch(
+                'common.views.ConditionalView.get_data_version',
+                return_value=None):
+            response = self.get(If_None_Match=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response.headers)
+
+    def test_errors(self):
+        response = self.get(
+            self.test_endpoint + "/606c3c2e0fbb6a31aedab4a9",
+            If_Modified_Since="Fri, 19 Nov 2021 18:00:00 GMT")
+
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('ETag', response.headers)
+
+    def test_other_endpoints(self):
+        for endpoint in [
+                '/smarter-api/info',
+                '/smarter-api/breeds/autocomplete?q=tex']:
+            etag = self.get(endpoint).headers['ETag']
+            response = self.get(endpoint, If_None_Match=etag)
+
+            self.assertEqual(response.status_code, 304)
+
+
+class ResponseCacheTest(BaseCase):
+    fixtures = [
+        'user',
+        'breeds',
+        'sampleGoat',
+        'smarterInfo',
+        'variantSheep'
+    ]
+
+    def setUp(self):
+        self.cache = MemoryResponseCache()
+
+        patcher = patch('common.views.response_cache', self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self, endpoint, **kwargs):
+        response = self.client.get(endpoint, headers=self.headers, **kwargs)
+        self.assertEqual(response.status_code, 200)
+
+        return response
+
+    def test_cached(self):
+        endpoint = '/smarter-api/breeds'
+        reference = self.get(endpoint, query_string={'species': 'Sheep'})
+        self.assertEqual(reference.headers['X-Cache'], 'MISS')
+
+        with patch('resources.breeds.BreedListApi.get_queryset') as mocked:
+            test = self.get(endpoint, query_string={'species': 'Sheep'})
+            mocked.assert_not_called()
+
+        self.assertEqual(test.headers['X-Cache'], 'HIT')
+        self.assertEqual(test.json, reference.json)
+        self.assertEqual(test.mimetype, "application/json")
+        self.assertEqual(test.headers['ETag'], reference.headers['ETag'])
+
+        # a different query
+        test = self.get(endpoint, query_string={'species': 'Goat'})
+        self.assertEqual(test.headers['X-Cache'], 'MISS')
+
+        self.assertEqual(self.cache.hits, 1)
+        self.assertEqual(self.cache.misses, 2)
+
+    def test_data_version(self):
+        endpoint = '/smarter-api/samples/goat'
+        self.get(endpoint)
+
+        with patch(
+                'common.views.ConditionalView.get_data_version',
+                return_value=datetime.datetime(2026, 10, 18)):
+            test = self.get(endpoint)
+
+        self.assertEqual(test.headers['X-Cache'], 'MISS')
+
+    def test_streamed(self):
+        endpoint = '/smarter-api/variants/sheep/OAR4/export'
+        reference = self.get(endpoint, query_string={'format': 'csv'})
+
+        # streamed responses are stored once sent
+        self.assertEqual(reference.headers['X-Cache'], 'MISS')
+        self.assertEqual(len(self.cache), 0)
+        self.assertTrue(reference.data)
+
+        test = self.get(endpoint, query_string={'format': 'csv'})
+
+        self.assertEqual(test.headers['X-Cache'], 'HIT')
+        self.assertEqual(test.data, reference.data)
+        self.assertEqual(
+            test.headers['Content-Disposition'],
+            reference.headers['Content-Disposition'])
+
+    def test_post(self):
+        endpoint = '/smarter-api/variants/sheep/OAR4/batch'
+
+        for values, status in [
+                (['250506CS3900065000002_1238.1'], 'MISS'),
+                (['250506CS3900065000002_1238.1'], 'HIT'),
+                (['foo'], 'MISS')]:
+            response = self.client.post(
+                endpoint, headers=self.headers, json={'values': values})
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.headers['X-Cache'], status)
+            self.assertTrue(response.data)
+
+    def test_errors(self):
+        for _ in range(2):
+            response = self.client.get(
+                '/smarter-api/breeds/606c3c2e0fbb6a31aedab4a9',
+                headers=self.headers)
+
+            self.assertEqual(response.status_code, 404)
+
+        self.assertEqual(len(self.cache), 0)
+
+    def test_stats_command(self):
+        runner = self.app.test_cli_runner()
+
+        # workers don't share memory caches
+        result = runner.invoke(args=["cache", "stats"])
+        self.assertNotEqual(result.exit_code, 0)
+        self.assertIn("memory", result.output)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = SQLiteResponseCache(f"{tmpdir}/responses.sqlite3")
+
+            with patch('common.views.response_cache', cache):
+                for _ in range(2):
+                    self.get('/smarter-api/breeds')
+
+                result = runner.invoke(args=["cache", "stats"])
+
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("backend: sqlite", result.output)
+        self.assertIn("hits: 1", result.output)
+        self.assertIn("misses: 1", result.output)
+
+
+class ListViewParserTest(BaseCase):
+    fixtures = [
+        'user',
+        'breeds'
+    ]
+
+    test_endpoint = '/smarter-api/breeds'
+
+    def get_names(self, view):
+        return [argument.name for argument in view.parser.args]
+
+    def test_arguments(self):
+        for view in [BreedListApi, SampleGoatListApi, VariantSheepOAR4Api]:
+            names = self.get_names(view)
+
+            self.assertEqual(len(names), len(set(names)))
+
+            for name in ['sort', 'order', 'page', 'size', 'cursor', 'count']:
+                self.assertIn(name, names)
+
+        # mixin parsers don't have list arguments
+        self.assertNotIn('page', self.get_names(SampleListMixin))
+
+    def test_parse_cost(self):
+        names = self.get_names(BreedListApi)
+
+        with patch.object(
+                reqparse.RequestParser, 'add_argument', autospec=True,
+                side_effect=reqparse.RequestParser.add_argument
+                ) as add_argument:
+            for _ in range(50):
+                response = self.client.get(
+                    self.test_endpoint, headers=self.headers)
+                self.assertEqual(response.status_code, 200)
+
+        # parsers are built once: requests don't add arguments to them
+        add_argument.assert_not_called()
+        self.assertEqual(self.get_names(BreedListApi), names)
+
+    def test_invalid_arguments(self):
+        for query_string in [
+                {'size': 0}, {'size': 'foo'}, {'page': 'foo'},
+                {'order': 'foo'}, {'count': 'foo'}]:
+            response = self.client.get(
+                self.test_endpoint,
+                headers=self.headers,
+                query_string=query_string
+            )
+
+            self.assertEqual(response.status_code, 400)